@@ -16,7 +16,11 @@
 # with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
 
 from __future__ import absolute_import
+import hashlib
+import time
 
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework import authentication
 from rest_framework import exceptions
 # Need to use tastypie's ApiKey, since that's what the apiv2 app uses.  Once
@@ -25,6 +29,51 @@ from rest_framework import exceptions
 from tastypie.models import ApiKey
 
 from auth.models import CustomUser as User
+from utils.metrics import Meter
+
+# We cache successful authentications to avoid hitting the DB on every API
+# request.  The cache maps a hash of (username, api key) to the user id.
+# ApiKey changes invalidate the cache entry for the old key (see the ApiKey
+# signal handlers in auth.models).  The timeout is a backup in case we miss
+# one of those.
+AUTH_CACHE_TIMEOUT = getattr(settings, 'API_AUTH_CACHE_TIMEOUT', 60)
+
+def _key_hash(username, api_key):
+    return hashlib.sha1(u'{}:{}'.format(username, api_key)
+                        .encode('utf-8')).hexdigest()
+
+def _auth_cache_key(username, api_key):
+    return 'api-auth:{}'.format(_key_hash(username, api_key))
+
+def _request_count_key(username, api_key, minute):
+    return 'api-requests:{}:{}'.format(_key_hash(username, api_key), minute)
+
+def invalidate_auth_cache(username, api_key):
+    cache.delete(_auth_cache_key(username, api_key))
+
+def record_request(username, api_key):
+    """Count an API request for an API key
+
+    We count requests per-minute.  Use get_request_count() to fetch the
+    counts.
+    """
+    key = _request_count_key(username, api_key, int(time.time() // 60))
+    cache.add(key, 0, 60 * 10)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # key expired or the cache was cleared
+        pass
+
+def get_request_count(username, api_key, minutes_ago=0):
+    """Get the number of requests for an API key in a one minute window
+
+    :param minutes_ago: which window to fetch.  0 is the current minute, 1 is
+        the previous minute, etc.  We only keep counts for the last 10
+        minutes.
+    """
+    minute = int(time.time() // 60) - minutes_ago
+    return cache.get(_request_count_key(username, api_key, minute), 0)
 
 class TokenAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
@@ -37,6 +86,31 @@ class TokenAuthentication(authentication.BaseAuthentication):
         if not username:
             return None
 
+        user = self.lookup_cached_user(username, api_key)
+        if user is None:
+            user = self.lookup_user(username, api_key)
+            cache.set(_auth_cache_key(username, api_key), user.id,
+                      AUTH_CACHE_TIMEOUT)
+        record_request(username, api_key)
+        return (user, None)
+
+    def lookup_cached_user(self, username, api_key):
+        user_id = cache.get(_auth_cache_key(username, api_key))
+        if user_id is None:
+            Meter('api.auth-cache.miss').inc()
+            return None
+        try:
+            user = User.cache.get_instance(user_id)
+        except User.DoesNotExist:
+            user = None
+        if user is None or user.username != username:
+            invalidate_auth_cache(username, api_key)
+            Meter('api.auth-cache.miss').inc()
+            return None
+        Meter('api.auth-cache.hit').inc()
+        return user
+
+    def lookup_user(self, username, api_key):
         try:
             user = User.objects.get(username=username)
         except User.DoesNotExist:
@@ -44,5 +118,4 @@ class TokenAuthentication(authentication.BaseAuthentication):
 
         if not ApiKey.objects.filter(user=user, key=api_key).exists():
             raise exceptions.AuthenticationFailed('Invalid API Key')
-
-        return (user, None)
+        return user
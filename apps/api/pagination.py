@@ -22,13 +22,25 @@ method to use offset/limit based pagination instead of page based pagination.
 
 This will get much simpler  once we switch to django-rest-framework 3.1 which
 has built-in support for this.
+
+Clients can also opt-in to cursor pagination by passing a ``cursor`` param
+(use an empty value for the first page).  In that case we filter the
+queryset using the sort key of the last object on the previous page rather
+than using OFFSET, and only calculate ``total_count`` if the client passes
+``total_count=true``.  This keeps deep pages of big listings fast.
 """
 
+import base64
+import json
 import urlparse
 
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
 from django.http import Http404, QueryDict
 from rest_framework import pagination
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
 
 class MetaSerializer(serializers.Serializer):
     previous = serializers.SerializerMethodField()
@@ -39,23 +51,23 @@ class MetaSerializer(serializers.Serializer):
 
     def get_next(self, page):
         if page.has_next():
-            return self._make_link(page.next_offset(), page.limit)
+            return self._make_link(page.next_params())
         else:
             return None
 
     def get_previous(self, page):
         if page.has_previous():
-            return self._make_link(page.previous_offset(), page.limit)
+            return self._make_link(page.previous_params())
         else:
             return None
 
-    def _make_link(self, offset, limit):
+    def _make_link(self, params):
         request = self.context.get('request')
         url = request and request.build_absolute_uri() or ''
         (scheme, netloc, path, query, fragment) = urlparse.urlsplit(url)
         query_dict = QueryDict(query).copy()
-        query_dict['offset'] = offset
-        query_dict['limit'] = limit
+        for name, value in params.items():
+            query_dict[name] = value
         query = query_dict.urlencode()
         return urlparse.urlunsplit((scheme, netloc, path, query, fragment))
 
@@ -74,14 +86,122 @@ class AmaraPage(object):
     def has_next(self):
         return self.offset + self.limit < self.total_count
 
-    def next_offset(self):
-        return self.offset + self.limit
+    def next_params(self):
+        return {
+            'offset': self.offset + self.limit,
+            'limit': self.limit,
+        }
 
     def has_previous(self):
         return self.offset > 0
 
-    def previous_offset(self):
-        return max(self.offset - self.limit, 0)
+    def previous_params(self):
+        return {
+            'offset': max(self.offset - self.limit, 0),
+            'limit': self.limit,
+        }
+
+class AmaraCursorPage(object):
+    """Page for cursor-based pagination
+
+    The cursor stores the sort key values of the last object on the previous
+    page.  We always add the primary key to the sort key so that it's
+    unique.  Only forward links are supported, so has_previous() is always
+    False.
+    """
+    def __init__(self, queryset, cursor, limit, include_total_count=False):
+        self.sort_key = self.calc_sort_key(queryset)
+        queryset = queryset.order_by(*[
+            ('-' if descending else '') + field.name
+            for field, descending in self.sort_key
+        ])
+        if include_total_count:
+            self.total_count = queryset.count()
+        else:
+            self.total_count = None
+        if cursor:
+            queryset = queryset.filter(self.cursor_filter(cursor))
+        # Fetch an extra object to know if there's a next page
+        object_list = list(queryset[:limit+1])
+        self.object_list = object_list[:limit]
+        self._has_next = len(object_list) > limit
+        self.offset = None
+        self.limit = limit
+
+    def calc_sort_key(self, queryset):
+        """Get the sort key for a queryset
+
+        Returns a list of (field, descending) tuples.
+        """
+        opts = queryset.model._meta
+        if queryset.query.extra_order_by:
+            raise ParseError('Cursor pagination not supported')
+        elif queryset.query.order_by:
+            ordering = queryset.query.order_by
+        elif queryset.query.default_ordering and opts.ordering:
+            ordering = opts.ordering
+        else:
+            ordering = []
+        sort_key = []
+        for name in ordering:
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            if name == 'pk':
+                name = opts.pk.name
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                raise ParseError(
+                    'Cursor pagination not supported when ordering by '
+                    '{}'.format(name))
+            sort_key.append((field, descending))
+            if field.primary_key:
+                break
+        else:
+            descending = sort_key[-1][1] if sort_key else False
+            sort_key.append((opts.pk, descending))
+        return sort_key
+
+    def cursor_filter(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+            if len(values) != len(self.sort_key):
+                raise ValueError()
+            values = [field.to_python(value)
+                      for (field, descending), value
+                      in zip(self.sort_key, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise ParseError('Invalid cursor')
+        # Build a filter for objects that sort after the cursor.  For a sort
+        # key of (a, b, pk), that's:
+        #   a > A OR (a = A AND b > B) OR (a = A AND b = B AND pk > PK)
+        q = Q()
+        for i, (field, descending) in enumerate(self.sort_key):
+            lookup = '{}__{}'.format(field.attname,
+                                     'lt' if descending else 'gt')
+            term = Q(**{lookup: values[i]})
+            for (prev_field, prev_descending), value in zip(self.sort_key[:i],
+                                                            values):
+                term &= Q(**{prev_field.attname: value})
+            q |= term
+        return q
+
+    def make_cursor(self, obj):
+        values = [field.value_to_string(obj) for field, descending
+                  in self.sort_key]
+        return base64.urlsafe_b64encode(json.dumps(values))
+
+    def has_next(self):
+        return self._has_next
+
+    def next_params(self):
+        return {
+            'cursor': self.make_cursor(self.object_list[-1]),
+            'limit': self.limit,
+        }
+
+    def has_previous(self):
+        return False
 
 class AmaraPaginationMixin(object):
     paginate_by_param = 'limit'
@@ -92,6 +212,13 @@ class AmaraPaginationMixin(object):
         if not limit:
             return None
 
+        if 'cursor' in self.request.query_params:
+            include_total_count = (self.request.query_params
+                                   .get('total_count') == 'true')
+            return AmaraCursorPage(queryset,
+                                   self.request.query_params['cursor'],
+                                   limit, include_total_count)
+
         offset = self.request.query_params.get('offset', 0)
         try:
             offset = int(offset)
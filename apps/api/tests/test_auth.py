@@ -20,8 +20,9 @@ from django.test import TestCase
 from django.http import HttpRequest
 from nose.tools import *
 from rest_framework.exceptions import AuthenticationFailed
+from tastypie.models import ApiKey
 
-from api.auth import TokenAuthentication
+from api.auth import TokenAuthentication, get_request_count
 from utils.factories import *
 
 class TestAPIAuth(TestCase):
@@ -48,3 +49,31 @@ class TestAPIAuth(TestCase):
     def test_no_token(self):
         request = self.make_request(None, None)
         assert_equal(self.auth.authenticate(request), None)
+
+    def test_cache(self):
+        request = self.make_request(self.user.username, self.api_key)
+        # The first call caches the user id, the second call caches the user
+        self.auth.authenticate(request)
+        self.auth.authenticate(request)
+        with self.assertNumQueries(0):
+            assert_equal(self.auth.authenticate(request), (self.user, None))
+
+    def test_regenerate_key_invalidates_cache(self):
+        request = self.make_request(self.user.username, self.api_key)
+        self.auth.authenticate(request)
+        self.user.regenerate_api_key()
+        with assert_raises(AuthenticationFailed):
+            self.auth.authenticate(request)
+
+    def test_delete_key_invalidates_cache(self):
+        request = self.make_request(self.user.username, self.api_key)
+        self.auth.authenticate(request)
+        ApiKey.objects.filter(user=self.user).delete()
+        with assert_raises(AuthenticationFailed):
+            self.auth.authenticate(request)
+
+    def test_request_count(self):
+        request = self.make_request(self.user.username, self.api_key)
+        self.auth.authenticate(request)
+        self.auth.authenticate(request)
+        assert_equal(get_request_count(self.user.username, self.api_key), 2)
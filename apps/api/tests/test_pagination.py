@@ -0,0 +1,98 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Affero General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Affero General Public License along
+# with this program.  If not, see http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from nose.tools import *
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from utils.factories import *
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.team = TeamFactory()
+        # use duplicate titles to test that we break ties correctly
+        self.videos = [
+            TeamVideoFactory(team=self.team,
+                             video__title='Video {}'.format(i % 3)).video
+            for i in range(7)
+        ]
+        self.url = reverse('api:video-list')
+
+    def fetch_all(self, url):
+        objects = []
+        while url is not None:
+            response = self.client.get(url)
+            assert_equal(response.status_code, status.HTTP_200_OK)
+            objects.extend(response.data['objects'])
+            url = response.data['meta']['next']
+        return objects
+
+    def check_walk(self, order_by, sort_field):
+        url = '{}?team={}&limit=2&cursor=&order_by={}'.format(
+            self.url, self.team.slug, order_by)
+        objects = self.fetch_all(url)
+        # We should see each video exactly once
+        assert_items_equal([o['id'] for o in objects],
+                           [v.video_id for v in self.videos])
+        # The videos should be in order
+        values = [o[sort_field] for o in objects]
+        assert_equal(values, sorted(values,
+                                    reverse=order_by.startswith('-')))
+
+    def test_walk_all_pages(self):
+        self.check_walk('title', 'title')
+
+    def test_walk_all_pages_descending(self):
+        self.check_walk('-title', 'title')
+
+    def test_walk_all_pages_datetime(self):
+        self.check_walk('created', 'created')
+
+    def test_meta(self):
+        response = self.client.get(self.url, {
+            'team': self.team.slug,
+            'limit': 2,
+            'cursor': '',
+        })
+        meta = response.data['meta']
+        assert_equal(meta['total_count'], None)
+        assert_equal(meta['offset'], None)
+        assert_equal(meta['previous'], None)
+        assert_not_equal(meta['next'], None)
+
+    def test_total_count(self):
+        response = self.client.get(self.url, {
+            'team': self.team.slug,
+            'limit': 2,
+            'cursor': '',
+            'total_count': 'true',
+        })
+        assert_equal(response.data['meta']['total_count'], len(self.videos))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {
+            'team': self.team.slug,
+            'cursor': 'invalid',
+        })
+        assert_equal(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -449,6 +449,87 @@ class SubtitlesSerializerTest(TestCase):
                 'description': 'test-description',
             })
 
+class BulkSubtitlesViewTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        self.video2 = VideoFactory()
+        self.user = UserFactory()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('api:subtitles-bulk')
+
+    def post(self, items):
+        response = self.client.post(self.url, {'items': items},
+                                    format='json')
+        assert_equal(response.status_code, status.HTTP_200_OK,
+                     response.content)
+        return response.data['results']
+
+    def test_bulk_add(self):
+        subtitles = SubtitleSetFactory(num_subs=2)
+        results = self.post([
+            {
+                'video_id': self.video.video_id,
+                'language_code': 'en',
+                'subtitles': subtitles.to_xml(),
+                'title': 'test-title',
+            },
+            {
+                'video_id': self.video2.video_id,
+                'language_code': 'fr',
+                'sub_format': 'vtt',
+                'subtitles': babelsubs.to(subtitles, 'vtt'),
+            },
+        ])
+        assert_equal([r['error'] for r in results], [None, None])
+        assert_equal([r['version_number'] for r in results], [1, 1])
+        version = self.video.subtitle_language('en').get_tip()
+        assert_equal(version.get_subtitles(), subtitles)
+        assert_equal(version.title, 'test-title')
+        assert_equal(version.author, self.user)
+        assert_equal(version.origin, ORIGIN_API)
+        version2 = self.video2.subtitle_language('fr').get_tip()
+        assert_equal(version2.get_subtitles(), subtitles)
+
+    def test_item_errors(self):
+        results = self.post([
+            {
+                'video_id': 'invalidvideoid',
+                'language_code': 'en',
+                'subtitles': SubtitleSetFactory().to_xml(),
+            },
+            {
+                'video_id': self.video.video_id,
+                'language_code': 'en',
+                'subtitles': 'bad-dfxp-data',
+            },
+            {
+                'video_id': self.video.video_id,
+                'language_code': 'fr',
+                'subtitles': SubtitleSetFactory().to_xml(),
+            },
+        ])
+        assert_not_equal(results[0]['error'], None)
+        assert_equal(results[0]['video_id'], 'invalidvideoid')
+        assert_not_equal(results[1]['error'], None)
+        assert_equal(results[2]['error'], None)
+        assert_equal(results[2]['version_number'], 1)
+
+    def test_check_user_can_edit_subtitles_permission(self):
+        with test_utils.patch_get_workflow() as workflow:
+            workflow.user_can_edit_subtitles.return_value = False
+            results = self.post([{
+                'video_id': self.video.video_id,
+                'language_code': 'en',
+                'subtitles': SubtitleSetFactory().to_xml(),
+            }])
+        assert_not_equal(results[0]['error'], None)
+        assert_equal(self.video.subtitle_language('en'), None)
+
+    def test_items_required(self):
+        response = self.client.post(self.url, {'items': []}, format='json')
+        assert_equal(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 class SubtitlesViewTest(TestCase):
     def setUp(self):
         self.video = VideoFactory()
@@ -474,6 +555,29 @@ class SubtitlesViewTest(TestCase):
         assert_equal(response.content,
                      babelsubs.to(self.version.get_subtitles(), 'dfxp'))
 
+    def test_etag(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt')
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt',
+                                   HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        assert_equal(response['ETag'], etag)
+
+    def test_etag_changes_with_new_version(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt')
+        etag = response['ETag']
+        pipeline.add_subtitles(self.video, 'en',
+                               SubtitleSetFactory(num_subs=2))
+        response = self.client.get(self.url, HTTP_ACCEPT='text/srt',
+                                   HTTP_IF_NONE_MATCH=etag)
+        assert_equal(response.status_code, status.HTTP_200_OK)
+        assert_not_equal(response['ETag'], etag)
+
+    def test_etag_depends_on_format(self):
+        srt_response = self.client.get(self.url, HTTP_ACCEPT='text/srt')
+        vtt_response = self.client.get(self.url, HTTP_ACCEPT='text/vtt')
+        assert_not_equal(srt_response['ETag'], vtt_response['ETag'])
+
     def test_normal_format(self):
         # if we're not using a raw subtitle format, we should just return json
         response = self.client.get(self.url)
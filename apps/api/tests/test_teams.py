@@ -675,6 +675,17 @@ class TasksAPITest(TeamAPITestBase):
             'video_id': self.team_video.video.video_id,
         })
 
+    def test_search_filter(self):
+        tasks = self.make_a_bunch_of_tasks()
+        correct_tasks = tasks[:2]
+        with mock.patch('api.views.teams.TaskIndex.search_ids') as search_ids:
+            search_ids.return_value = [t.id for t in correct_tasks]
+            self.check_list_results(correct_tasks, {
+                'q': 'search query',
+            })
+        assert_equal(search_ids.call_args,
+                     mock.call(self.team, 'search query', 1000))
+
     def test_video_id_filter_video_not_in_team(self):
         # if the video isn't in the team, we should return no tasks
         self.make_a_bunch_of_tasks()
@@ -50,6 +50,8 @@ urlpatterns = router.urls + patterns('',
     url(r'^videos/(?P<video_id>[\w\d]+)'
         '/languages/(?P<language_code>[\w-]+)/subtitles/notes/$',
         views.NotesList.as_view()),
+    url(r'^subtitles/bulk/$', views.BulkSubtitlesView.as_view(),
+        name='subtitles-bulk'),
     url(r'^languages/$', views.languages, name='languages'),
     url(r'^message/$', views.Messages.as_view(), name='messages'),
 )
@@ -3,8 +3,8 @@ from __future__ import absolute_import
 from .activity import ActivityViewSet
 from .languages import languages
 from .messages import Messages
-from .subtitles import (Actions, NotesList, SubtitleLanguageViewSet,
-                        SubtitlesView)
+from .subtitles import (Actions, BulkSubtitlesView, NotesList,
+                        SubtitleLanguageViewSet, SubtitlesView)
 from .teams import (TeamViewSet, TeamMemberViewSet, SafeTeamMemberViewSet,
                     ProjectViewSet, TaskViewSet, TeamApplicationViewSet)
 from .users import UserViewSet
@@ -151,6 +151,10 @@ Examples:
 
    :reqheader Accept: text/vtt
 
+These responses include an ``ETag`` header.  Send it back in the
+``If-None-Match`` header to get a ``304 Not Modified`` response if the
+subtitles haven't changed.
+
 
 Creating new subtitles
 ++++++++++++++++++++++
@@ -172,6 +176,29 @@ Creating new subtitles
         available for this language - optional, defaults to false.
         **(deprecated, use action instead)**
 
+Bulk subtitle import
+++++++++++++++++++++
+
+Add subtitles for many videos/languages in a single request.
+
+.. http:post:: /api/subtitles/bulk/
+
+    :<json items: List of subtitles to add (max 500).  Each item accepts the
+        same fields as the :ref:`subtitles-resource` POST, plus:
+    :<json items.video_id: Amara Video ID
+    :<json items.language_code: BCP-47 language code
+    :>json results: List of results, in the same order as items
+    :>json results.video_id: Amara Video ID for the item
+    :>json results.language_code: Language code for the item
+    :>json results.version_number: Version number of the new subtitles
+        (null if the item failed)
+    :>json results.resource_uri: API URI for the new subtitles (null if the
+        item failed)
+    :>json results.error: Error for the item (null if the item succeeded)
+
+    Each item is handled separately, so one item failing doesn't stop the
+    others from being imported.
+
 .. _subtitles-action-resource:
 
 Subtitles Action Resource
@@ -239,6 +266,7 @@ import json
 
 from django.db import IntegrityError
 from django.http import Http404
+from django.utils.http import parse_etags
 from django.shortcuts import get_object_or_404
 from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
@@ -252,7 +280,8 @@ from rest_framework import viewsets
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import (IsAuthenticated,
+                                        IsAuthenticatedOrReadOnly)
 
 from api.pagination import AmaraPaginationMixin
 from api.fields import LanguageCodeField
@@ -261,6 +290,7 @@ from videos.models import Video
 from subtitles import compat
 from subtitles import pipeline
 from subtitles import workflows
+from subtitles.cache import Rendition, get_rendition, rendition_etag
 from subtitles.models import (SubtitleLanguage, SubtitleVersion,
                               ORIGIN_WEB_EDITOR, ORIGIN_API)
 from subtitles.exceptions import ActionError
@@ -457,7 +487,9 @@ class SubtitleLanguageViewSet(AmaraPaginationMixin,
 class SubtitleRenderer(renderers.BaseRenderer):
     """Render SubtitleSets using babelsubs."""
     def render(self, data, media_type=None, renderer_context=None):
-        if isinstance(data, SubtitleSet):
+        if isinstance(data, Rendition):
+            return data.content
+        elif isinstance(data, SubtitleSet):
             return babelsubs.to(data, self.format)
         else:
             # Fall back to JSON renderer for other responses.  This handles
@@ -590,7 +622,8 @@ class SubtitlesSerializer(serializers.Serializer):
             self.context['sub_format'] = 'dfxp'
         return super(SubtitlesSerializer, self).to_internal_value(data)
 
-    def create(self, validated_data):
+    def add_subtitles_kwargs(self, validated_data):
+        """Get the keyword arguments to pass to pipeline.add_subtitles()"""
         if validated_data.get('from_editor'):
             origin = ORIGIN_WEB_EDITOR
         else:
@@ -601,16 +634,22 @@ class SubtitlesSerializer(serializers.Serializer):
         elif 'is_complete' in validated_data:
             complete = validated_data['is_complete']
 
+        return {
+            'action': action,
+            'complete': complete,
+            'title': validated_data.get('title'),
+            'description': validated_data.get('description'),
+            'metadata': validated_data.get('metadata'),
+            'author': self.context['user'],
+            'committer': self.context['user'],
+            'origin': origin,
+        }
+
+    def create(self, validated_data):
         return pipeline.add_subtitles(
             self.context['video'], self.context['language_code'],
             validated_data['subtitles'],
-            action=action, complete=complete,
-            title=validated_data.get('title'),
-            description=validated_data.get('description'),
-            metadata=validated_data.get('metadata'),
-            author=self.context['user'],
-            committer=self.context['user'],
-            origin=origin)
+            **self.add_subtitles_kwargs(validated_data))
 
 class SubtitlesView(generics.CreateAPIView):
     serializer_class = SubtitlesSerializer
@@ -644,10 +683,21 @@ class SubtitlesView(generics.CreateAPIView):
         # If we're rendering the subtitles directly, then we skip creating a
         # serializer and return the subtitles instead
         if isinstance(request.accepted_renderer, SubtitleRenderer):
-            return Response(version.get_subtitles())
+            return self.rendition_response(request, version)
         serializer = self.get_serializer(version)
         return Response(serializer.data)
 
+    def rendition_response(self, request, version):
+        # Renditions are immutable, so we can use them for conditional GETs
+        format = request.accepted_renderer.format
+        etag = rendition_etag(version, format)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(get_rendition(version, format))
+        response['ETag'] = etag
+        return response
+
     def get_object(self):
         video = self.get_video()
         workflow = workflows.get_workflow(video)
@@ -685,6 +735,107 @@ class SubtitlesView(generics.CreateAPIView):
         videos.tasks.video_changed_tasks.delay(video.pk)
         return super(SubtitlesView, self).create(request, *args, **kwargs)
 
+class BulkSubtitlesView(views.APIView):
+    permission_classes = (IsAuthenticated,)
+    max_items = 500
+
+    def post(self, request, format=None):
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({'items': 'List of subtitles required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response(
+                {'items': 'Too many items (max: {})'.format(self.max_items)},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        videos = self.fetch_videos(items)
+        results = [None] * len(items)
+        pipeline_items = []
+        pipeline_indexes = []
+        for i, data in enumerate(items):
+            try:
+                pipeline_items.append(self.validate_item(data, videos))
+            except (serializers.ValidationError, PermissionDenied), e:
+                results[i] = self.error_result(data, e.detail)
+            else:
+                pipeline_indexes.append(i)
+
+        bulk_results = pipeline.add_subtitles_bulk(pipeline_items)
+        for i, result in zip(pipeline_indexes, bulk_results):
+            if result.error is not None:
+                results[i] = self.error_result(items[i],
+                                               unicode(result.error))
+            else:
+                results[i] = self.success_result(result.version)
+        return Response({'results': results})
+
+    def fetch_videos(self, items):
+        video_ids = set(data.get('video_id') for data in items
+                        if isinstance(data, dict))
+        return dict((v.video_id, v) for v in
+                    Video.objects.select_related('teamvideo')
+                    .filter(video_id__in=video_ids))
+
+    def validate_item(self, data, videos):
+        """Validate an item and convert it for pipeline.add_subtitles_bulk()
+        """
+        if not isinstance(data, dict):
+            raise serializers.ValidationError('Invalid item')
+        video = videos.get(data.get('video_id'))
+        if video is None:
+            raise serializers.ValidationError({'video_id': 'Unknown video'})
+        language_code = data.get('language_code')
+        if not isinstance(language_code, basestring):
+            raise serializers.ValidationError(
+                {'language_code': 'Invalid language code'})
+        language_code = language_code.lower()
+        workflow = workflows.get_workflow(video)
+        if not workflow.user_can_edit_subtitles(self.request.user,
+                                                language_code):
+            raise PermissionDenied()
+        serializer = SubtitlesSerializer(data=data, context={
+            'video': video,
+            'language_code': language_code,
+            'user': self.request.user,
+            'request': self.request,
+            'version_number': None,
+        })
+        serializer.is_valid(raise_exception=True)
+        item = serializer.add_subtitles_kwargs(serializer.validated_data)
+        item.update({
+            'video': video,
+            'language_code': language_code,
+            'subtitles': serializer.validated_data['subtitles'],
+        })
+        return item
+
+    def success_result(self, version):
+        kwargs = {
+            'video_id': version.video.video_id,
+            'language_code': version.language_code,
+        }
+        uri = reverse('api:subtitles', kwargs=kwargs, request=self.request)
+        uri += '?version_number={}'.format(version.version_number)
+        return {
+            'video_id': version.video.video_id,
+            'language_code': version.language_code,
+            'version_number': version.version_number,
+            'resource_uri': uri,
+            'error': None,
+        }
+
+    def error_result(self, data, error):
+        if not isinstance(data, dict):
+            data = {}
+        return {
+            'video_id': data.get('video_id'),
+            'language_code': data.get('language_code'),
+            'version_number': None,
+            'resource_uri': None,
+            'error': error,
+        }
+
 class ActionsSerializer(serializers.Serializer):
     action = serializers.CharField(source='name')
     label = serializers.CharField(read_only=True)
@@ -177,6 +177,8 @@ List all tasks for a given team
     :query priority: Show only tasks with a given priority
     :query type: Show only tasks of a given type
     :query video_id: Show only tasks that pertain to a given video
+    :query q: Show only tasks for videos whose title or metadata match a
+        search query.  At most 1000 matching tasks are returned.
     :query order_by: Apply sorting to the task list.  Possible values:
 
         * ``created``   Creation date
@@ -292,6 +294,7 @@ Approve/Deny an application
 from __future__ import absolute_import
 from datetime import datetime
 
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.db import IntegrityError
 from django.http import Http404
@@ -306,10 +309,14 @@ from api.pagination import AmaraPaginationMixin
 from auth.models import CustomUser as User
 from teams.models import (Team, TeamMember, Project, Task, TeamVideo,
                           Application)
+from teams.search_indexes import TaskIndex
 import messages.tasks
 import teams.permissions as team_permissions
 import videos.tasks
 
+# Max number of search index matches for the task list q param
+TASK_SEARCH_LIMIT = getattr(settings, 'API_TASK_SEARCH_LIMIT', 1000)
+
 def timestamp_to_datetime(timestamp):
     return datetime.fromtimestamp(int(timestamp))
 
@@ -754,6 +761,9 @@ class TaskViewSet(AmaraPaginationMixin, TeamSubview):
                 qs = qs.none()
         if 'video_id' in params:
             qs = qs.filter(team_video__video__video_id=params['video_id'])
+        if params.get('q'):
+            qs = qs.filter(id__in=TaskIndex.search_ids(
+                self.team, params['q'], TASK_SEARCH_LIMIT))
         if 'completed' in params:
             qs = qs.filter(completed__isnull=False)
         if 'completed-after' in params:
@@ -778,10 +788,17 @@ class TaskViewSet(AmaraPaginationMixin, TeamSubview):
         else:
             return TaskUpdateSerializer
 
+    def get_permissions_evaluator(self):
+        if not hasattr(self, '_permissions_evaluator'):
+            self._permissions_evaluator = (
+                team_permissions.TaskPermissionEvaluator(self.request.user,
+                                                         self.team))
+        return self._permissions_evaluator
+
     def perform_create(self, serializer):
         team_video = serializer.validated_data['team_video']
-        if not team_permissions.can_assign_tasks(
-            self.team, self.request.user, team_video.project):
+        if not self.get_permissions_evaluator().can_assign_tasks(
+            team_video.project):
             raise PermissionDenied()
         self.task_was_assigned = False
         task = serializer.save()
@@ -789,17 +806,16 @@ class TaskViewSet(AmaraPaginationMixin, TeamSubview):
 
     def perform_update(self, serializer):
         team_video = serializer.instance.team_video
-        if not team_permissions.can_assign_tasks(
-            self.team, self.request.user, team_video.project):
+        if not self.get_permissions_evaluator().can_assign_tasks(
+            team_video.project):
             raise PermissionDenied()
         self.task_was_assigned = serializer.instance.assignee is not None
         task = serializer.save()
         self._post_save(task)
 
     def perform_destroy(self, instance):
-        if not team_permissions.can_delete_tasks(
-            self.team, self.request.user, instance.team_video.project,
-            instance.language):
+        if not self.get_permissions_evaluator().can_delete_tasks(
+            instance.team_video.project, instance.language):
             raise PermissionDenied()
         instance.delete()
 
@@ -33,7 +33,7 @@ from django.core.exceptions import MultipleObjectsReturned
 from django.core.urlresolvers import reverse
 from django.db import IntegrityError
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.utils.http import urlquote
 from django.utils.translation import ugettext_lazy as _, ugettext
 from tastypie.models import ApiKey
@@ -50,7 +50,8 @@ EMAIL_CONFIRMATION_DAYS = getattr(settings, 'EMAIL_CONFIRMATION_DAYS', 3)
 class AnonymousUserCacheGroup(CacheGroup):
     def __init__(self):
         super(AnonymousUserCacheGroup, self).__init__('user:anon',
-                                                      cache_pattern='user')
+                                                      cache_pattern='user',
+                                                      local_cache=True)
 
 class CustomUserManager(UserManager):
     def create_with_unique_username(self, **kwargs):
@@ -132,7 +133,8 @@ class CustomUser(BaseUser):
 
     objects = CustomUserManager()
 
-    cache = ModelCacheManager(default_cache_pattern='user')
+    cache = ModelCacheManager(default_cache_pattern='user',
+                              local_cache=True)
 
     class Meta:
         verbose_name = 'User'
@@ -376,6 +378,13 @@ class CustomUser(BaseUser):
     def ensure_api_key_created(self):
         ApiKey.objects.get_or_create(user=self)
 
+    def regenerate_api_key(self):
+        api_key, created = ApiKey.objects.get_or_create(user=self)
+        if not created:
+            api_key.key = api_key.generate_key()
+            api_key.save()
+        return api_key.key
+
 def create_custom_user(sender, instance, created, **kwargs):
     if created:
         values = {}
@@ -386,6 +395,31 @@ def create_custom_user(sender, instance, created, **kwargs):
 
 post_save.connect(create_custom_user, BaseUser)
 
+def api_key_pre_save(sender, instance, **kwargs):
+    # Invalidate the API auth cache for the old key
+    if instance.pk is None:
+        return
+    try:
+        old_api_key = ApiKey.objects.get(pk=instance.pk)
+    except ApiKey.DoesNotExist:
+        return
+    if old_api_key.key != instance.key:
+        _invalidate_api_auth_cache(old_api_key)
+
+def api_key_post_delete(sender, instance, **kwargs):
+    _invalidate_api_auth_cache(instance)
+
+def _invalidate_api_auth_cache(api_key):
+    from api.auth import invalidate_auth_cache
+    try:
+        username = CustomUser.objects.get(pk=api_key.user_id).username
+    except CustomUser.DoesNotExist:
+        return
+    invalidate_auth_cache(username, api_key.key)
+
+pre_save.connect(api_key_pre_save, ApiKey)
+post_delete.connect(api_key_post_delete, ApiKey)
+
 class Awards(models.Model):
     COMMENT = 1
     START_SUBTITLES = 2
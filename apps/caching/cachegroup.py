@@ -86,6 +86,22 @@ CacheGroup we will do a couple things:
 
 This speeds things up by reducing the number of round trips to memcached.
 
+The key counts for each pattern are shared between processes by storing them
+in the cache, so new processes don't need to re-learn the patterns.  Each
+process syncs its counts every ``CACHE_PATTERN_SYNC_INTERVAL`` seconds.  We
+only prefetch keys that were used by at least
+``CACHE_PATTERN_MIN_FREQUENCY`` of the CacheGroups for the pattern, and
+counts are halved every ``CACHE_PATTERN_DECAY_USES`` uses, so keys that stop
+being used eventually get dropped.
+
+For each pattern we send these metrics:
+
+- ``cache-pattern.<pattern>.prefetched``: keys we prefetched
+- ``cache-pattern.<pattern>.prefetch-used``: prefetched keys that were later
+  requested (prefetched - prefetch-used is the waste)
+- ``cache-pattern.<pattern>.round-trip-saved``: get_many() calls that didn't
+  need to go to the cache because of the prefetch
+
 Behind the scenes
 ^^^^^^^^^^^^^^^^^
 
@@ -118,6 +134,24 @@ Z         def:bar          *invalid*
     version key.  This way the version key changes for each deploy, which will
     invalidate all values.
 
+.. _cache-local:
+
+Local Caching
+^^^^^^^^^^^^^
+
+CacheGroups created with ``local_cache=True`` also store values in an
+in-process LRU cache, bounded by ``CACHE_GROUP_LOCAL_CACHE_MAX_BYTES``.  This
+is useful for values that are read on almost every page, like the team member
+lists and the user menu.  Values are stored locally exactly as they are in
+memcached (packed together with the version), so the normal version check
+works for them.
+
+The exception is the version key itself.  We only trust the locally cached
+version for ``CACHE_GROUP_LOCAL_CACHE_REVALIDATE`` seconds, after that we
+fetch it from memcached again.  This means that when another process
+invalidates the group, we will see it after at most that many seconds.
+Invalidations in the current process take effect immediately.
+
 .. _cache-race-condition-prevention:
 
 Race condition prevention
@@ -161,58 +195,316 @@ attribute to your class definition.
 """
 from __future__ import absolute_import
 import collections
+import cPickle
+import time
 
 from django.conf import settings
 from django.core.cache import cache
 
 from utils import codes
+from utils.lru import LRUCache
+from utils.metrics import Meter
 
 def get_commit_id():
     return settings.LAST_COMMIT_GUID
 
+# In-process cache for CacheGroups with local_cache=True
+local_cache = LRUCache(
+    getattr(settings, 'CACHE_GROUP_LOCAL_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+LOCAL_CACHE_REVALIDATE = getattr(settings,
+                                 'CACHE_GROUP_LOCAL_CACHE_REVALIDATE', 5)
+# We don't know the timeout for values that we fetch from memcached, so we
+# only keep local values for this long.
+LOCAL_CACHE_MAX_AGE = getattr(settings, 'CACHE_GROUP_LOCAL_CACHE_MAX_AGE',
+                              60 * 5)
+# How long a get_or_calc_stale() caller gets to recalculate a value
+LEASE_TIMEOUT = getattr(settings, 'CACHE_GROUP_LEASE_TIMEOUT', 30)
+
+class CacheGroupStats(object):
+    """Track local cache hits, memcached hits, and misses for CacheGroups
+
+    Stats are grouped by the first part of the CacheGroup prefix (for example
+    "user" or "team").  Use reset() to start tracking a new set of requests.
+
+    Fetches happen many times per request, so record() only updates the
+    in-process counts.  report() sends the totals since the last report as
+    cache-group.<prefix>.* meters.  It gets called at the end of each request
+    and celery task (see caching.signalhandlers).
+    """
+    def __init__(self):
+        self.reset()
+        self.unreported = collections.defaultdict(lambda: [0, 0, 0])
+
+    def reset(self):
+        self.counts = collections.defaultdict(lambda: [0, 0, 0])
+
+    def record(self, prefix, local_hits, remote_hits, misses):
+        prefix = prefix.split(':', 1)[0]
+        for counts in (self.counts[prefix], self.unreported[prefix]):
+            counts[0] += local_hits
+            counts[1] += remote_hits
+            counts[2] += misses
+
+    def report(self):
+        unreported, self.unreported = (
+            self.unreported, collections.defaultdict(lambda: [0, 0, 0]))
+        for prefix, (local_hits, remote_hits, misses) in unreported.items():
+            if local_hits:
+                Meter('cache-group.{0}.local-hit'.format(prefix)).inc(
+                    local_hits)
+            if remote_hits:
+                Meter('cache-group.{0}.remote-hit'.format(prefix)).inc(
+                    remote_hits)
+            if misses:
+                Meter('cache-group.{0}.miss'.format(prefix)).inc(misses)
+
+    def summary(self):
+        """Get a list of (prefix, local_hits, remote_hits, misses,
+        local_hit_rate, remote_hit_rate) tuples.
+        """
+        rv = []
+        for prefix, (local_hits, remote_hits, misses) in sorted(
+                self.counts.items()):
+            total = local_hits + remote_hits + misses
+            if total == 0:
+                continue
+            rv.append((prefix, local_hits, remote_hits, misses,
+                       float(local_hits) / total,
+                       float(remote_hits) / total))
+        return rv
+
+stats = CacheGroupStats()
+
 class _CacheWrapper(object):
     """Wrap cache access for CacheGroup.
 
-    This class helps CacheGroup access the cache.  It does 2 things:
+    This class helps CacheGroup access the cache.  It does a few things:
         - adds the key prefix
         - remembers previously fetched values and avoids fetching them again
         - handles prefetching keys for a cache pattern
+        - reads/writes values in the local cache if use_local_cache is True
     """
-    def __init__(self, prefix):
+    def __init__(self, prefix, version_key=None, use_local_cache=False):
         self.prefix = prefix
+        self.version_key = version_key
+        self.use_local_cache = use_local_cache
+        # keys that we got from the local cache rather than memcached
+        self.local_hits = set()
         self._cache_data = {}
 
     def get(self, key):
-        value = cache.get(self._prefix_key(key))
-        self._cache_data[key] = value
-        return value
+        return self._fetch([key])[key]
 
     def get_many(self, keys):
         unfetched_keys = [key for key in keys if key not in self._cache_data]
         if unfetched_keys:
-            self._run_get_many(unfetched_keys)
+            self._fetch(unfetched_keys)
         return dict((key, self._cache_data.get(key)) for key in keys)
 
-    def _run_get_many(self, keys):
-        result = cache.get_many([self._prefix_key(key) for key in keys])
-        for key in keys:
-            self._cache_data[key] = result.get(self._prefix_key(key))
+    def has_fetched(self, key):
+        return key in self._cache_data
+
+    def refetch(self, keys):
+        """Fetch keys from memcached, skipping the local cache."""
+        return self._fetch(keys, skip_local_cache=True)
+
+    def _fetch(self, keys, skip_local_cache=False):
+        result = {}
+        if self.use_local_cache and not skip_local_cache:
+            remote_keys = []
+            for key in keys:
+                value = self._local_get(key)
+                if value is None:
+                    remote_keys.append(key)
+                else:
+                    result[key] = value
+                    self.local_hits.add(key)
+        else:
+            remote_keys = list(keys)
+        remote_hits = 0
+        if remote_keys:
+            remote_result = cache.get_many(
+                [self._prefix_key(key) for key in remote_keys])
+            for key in remote_keys:
+                value = remote_result.get(self._prefix_key(key))
+                result[key] = value
+                self.local_hits.discard(key)
+                if value is not None:
+                    remote_hits += 1
+                    if self.use_local_cache:
+                        self._local_set(key, value)
+        self._cache_data.update(result)
+        stats.record(self.prefix, len(keys) - len(remote_keys), remote_hits,
+                     len(remote_keys) - remote_hits)
+        return result
 
     def set(self, key, value, timeout=None):
-        cache.set(self._prefix_key(key), value)
+        cache.set(self._prefix_key(key), value, timeout)
         self._cache_data[key] = value
+        if self.use_local_cache:
+            self._local_set(key, value, timeout)
 
     def set_many(self, values, timeout=None):
         raw_values = dict((self._prefix_key(key), value)
                           for (key, value) in values.items())
         cache.set_many(raw_values, timeout)
         self._cache_data.update(values)
+        if self.use_local_cache:
+            for key, value in values.items():
+                self._local_set(key, value, timeout)
+
+    def _local_get(self, key):
+        entry = local_cache.get(self._prefix_key(key))
+        if entry is None:
+            return None
+        stored_at, expires_at, pickled, data = entry
+        now = time.time()
+        if now >= expires_at:
+            return None
+        if (key == self.version_key and
+                now - stored_at > LOCAL_CACHE_REVALIDATE):
+            # Check with memcached in case another process invalidated us
+            return None
+        if pickled:
+            return cPickle.loads(data)
+        else:
+            return data
+
+    def _local_set(self, key, value, timeout=None):
+        now = time.time()
+        if timeout is None or timeout > LOCAL_CACHE_MAX_AGE:
+            timeout = LOCAL_CACHE_MAX_AGE
+        # Store non-string values pickled, so that callers can't modify the
+        # cached value by modifying the object that we return.
+        if isinstance(value, basestring):
+            entry = (now, now + timeout, False, value)
+        else:
+            entry = (now, now + timeout, True,
+                     cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+        local_cache.set(self._prefix_key(key), entry, len(entry[3]))
 
     def _prefix_key(self, key):
         return '{0}:{1}'.format(self.prefix, key)
 
-# map cache pattern IDs to the keys we've seen used
-_cache_pattern_memory = collections.defaultdict(set)
+PATTERN_SYNC_INTERVAL = getattr(settings, 'CACHE_PATTERN_SYNC_INTERVAL', 60)
+PATTERN_MIN_FREQUENCY = getattr(settings, 'CACHE_PATTERN_MIN_FREQUENCY', 0.1)
+PATTERN_DECAY_USES = getattr(settings, 'CACHE_PATTERN_DECAY_USES', 1000)
+PATTERN_MAX_KEYS = getattr(settings, 'CACHE_PATTERN_MAX_KEYS', 100)
+PATTERN_TIMEOUT = 60 * 60 * 24 * 7
+
+class _PatternInfo(object):
+    def __init__(self):
+        # counts from the last sync plus our changes since then
+        self.uses = 0
+        self.key_counts = {}
+        # changes since the last sync
+        self.new_uses = 0
+        self.new_key_counts = collections.defaultdict(int)
+        self.synced_at = None
+        # stats for this process
+        self.prefetched = 0
+        self.prefetch_used = 0
+        self.round_trips_saved = 0
+
+class CachePatternMemory(object):
+    """Remember which keys get used for each cache pattern
+
+    For each pattern we track the number of CacheGroups that used it and the
+    number of those that fetched each key.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.patterns = collections.defaultdict(_PatternInfo)
+
+    def start(self, pattern):
+        """Start using a pattern for a CacheGroup
+
+        :returns: set of keys to prefetch
+        """
+        info = self.patterns[pattern]
+        if (info.synced_at is None or
+                time.time() - info.synced_at > PATTERN_SYNC_INTERVAL):
+            self.sync(pattern)
+        keys = self._keys_to_prefetch(info)
+        info.uses += 1
+        info.new_uses += 1
+        return keys
+
+    def record_keys(self, pattern, keys):
+        """Record that a CacheGroup fetched keys
+
+        Only call this once per key for each CacheGroup.
+        """
+        info = self.patterns[pattern]
+        for key in keys:
+            info.key_counts[key] = info.key_counts.get(key, 0) + 1
+            info.new_key_counts[key] += 1
+
+    def record_prefetch(self, pattern, prefetched=0, prefetch_used=0,
+                        round_trips_saved=0):
+        info = self.patterns[pattern]
+        info.prefetched += prefetched
+        info.prefetch_used += prefetch_used
+        info.round_trips_saved += round_trips_saved
+        if prefetched:
+            Meter('cache-pattern.{0}.prefetched'.format(pattern)).inc(
+                prefetched)
+        if prefetch_used:
+            Meter('cache-pattern.{0}.prefetch-used'.format(pattern)).inc(
+                prefetch_used)
+        if round_trips_saved:
+            Meter('cache-pattern.{0}.round-trip-saved'.format(pattern)).inc(
+                round_trips_saved)
+
+    def sync(self, pattern):
+        """Merge our counts with the counts stored in the cache."""
+        info = self.patterns[pattern]
+        cache_key = 'cache-pattern:{0}'.format(pattern)
+        uses, key_counts = cache.get(cache_key) or (0, {})
+        uses += info.new_uses
+        for key, count in info.new_key_counts.items():
+            key_counts[key] = key_counts.get(key, 0) + count
+        if uses > PATTERN_DECAY_USES:
+            uses //= 2
+            key_counts = dict((key, count // 2)
+                              for key, count in key_counts.items()
+                              if count // 2 > 0)
+        if len(key_counts) > PATTERN_MAX_KEYS:
+            key_counts = dict(sorted(key_counts.items(), key=lambda i: -i[1])
+                              [:PATTERN_MAX_KEYS])
+        # Note: if another process syncs at the same time, one of the
+        # updates will be lost.  That's okay, the counts only need to be
+        # approximately correct.
+        cache.set(cache_key, (uses, key_counts), PATTERN_TIMEOUT)
+        info.uses = uses
+        info.key_counts = key_counts
+        info.new_uses = 0
+        info.new_key_counts.clear()
+        info.synced_at = time.time()
+
+    def _keys_to_prefetch(self, info):
+        if info.uses == 0:
+            return set()
+        min_count = info.uses * PATTERN_MIN_FREQUENCY
+        return set(key for key, count in info.key_counts.items()
+                   if count >= min_count)
+
+    def keys_to_prefetch(self, pattern):
+        return self._keys_to_prefetch(self.patterns[pattern])
+
+    def stats(self):
+        """Get a list of (pattern, uses, prefetched, prefetch_used,
+        round_trips_saved) tuples for this process.
+        """
+        return [
+            (pattern, info.uses, info.prefetched, info.prefetch_used,
+             info.round_trips_saved)
+            for pattern, info in sorted(self.patterns.items())
+        ]
+
+cache_pattern_memory = CachePatternMemory()
 
 class CacheGroup(object):
     """Manage a group of cached values
@@ -221,6 +513,8 @@ class CacheGroup(object):
         prefix(str): prefix keys with this
         cache_pattern(str): :ref:`cache pattern <cache-patterns>` identifier
         invalidate_on_deploy(bool): Invalidate values when we redeploy
+        local_cache(bool): Also store values in the in-process cache (see
+            :ref:`cache-local`)
 
     .. automethod:: get
     .. automethod:: get_many
@@ -233,24 +527,31 @@ class CacheGroup(object):
 
     """
 
-    def __init__(self, prefix, cache_pattern=None, invalidate_on_deploy=True):
+    def __init__(self, prefix, cache_pattern=None, invalidate_on_deploy=True,
+                 local_cache=False):
         self.prefix = prefix
-        self.cache_wrapper = _CacheWrapper(prefix)
+        self.cache_pattern = cache_pattern
         if cache_pattern:
-            # copy the values from _cache_pattern_memory now.  It's going to
-            # change as we fetch keys and for sanity sake we should not care
-            # about that
-            self._cache_pattern_keys = \
-                    set(_cache_pattern_memory[cache_pattern])
+            # Track patterns separately for each type of cache group, since
+            # a pattern like video-page is used for both video and team
+            # groups.
+            self._pattern_id = '{0}:{1}'.format(cache_pattern,
+                                                prefix.split(':', 1)[0])
         else:
-            self._cache_pattern_keys = None
-        self.cache_pattern = cache_pattern
+            self._pattern_id = None
+        self._pattern_started = False
+        # keys that we've recorded in the pattern memory
+        self._pattern_keys_seen = set()
+        # prefetched keys that haven't been requested yet
+        self._unused_prefetch_keys = set()
         self.current_version = None
         if invalidate_on_deploy:
             self.version_key = 'version:{0}'.format(get_commit_id())
         else:
             self.version_key = 'version'
         self.invalidate_on_deploy = invalidate_on_deploy
+        self.cache_wrapper = _CacheWrapper(prefix, self.version_key,
+                                           local_cache)
 
     def invalidate(self):
         """Invalidate all values in this CacheGroup."""
@@ -282,14 +583,11 @@ class CacheGroup(object):
 
         If there is no value set for our version key, we set it now.
         """
-        if self.cache_pattern:
-            _cache_pattern_memory[self.cache_pattern].update(keys)
         keys_to_fetch = set(keys)
         if self.current_version is None:
             keys_to_fetch.add(self.version_key)
-        if self._cache_pattern_keys:
-            keys_to_fetch.update(self._cache_pattern_keys)
-            self._cache_pattern_keys = None
+        if self._pattern_id:
+            self._update_cache_pattern(keys, keys_to_fetch)
         get_many_result = self.cache_wrapper.get_many(keys_to_fetch)
         # first of all, handle the version.
         if self.current_version is None:
@@ -304,8 +602,43 @@ class CacheGroup(object):
             version, value = self._unpack_cache_value(cache_value)
             if version == self.current_version:
                 result[key] = value
+        if self.cache_wrapper.local_hits:
+            # A locally cached value from an older version may have been
+            # replaced in memcached by another process.  Check there before
+            # calling it a miss.
+            stale_keys = [key for key in keys if key not in result and
+                          key in self.cache_wrapper.local_hits]
+            if stale_keys:
+                refetched = self.cache_wrapper.refetch(stale_keys)
+                for key, cache_value in refetched.items():
+                    version, value = self._unpack_cache_value(cache_value)
+                    if version == self.current_version:
+                        result[key] = value
         return result
 
+    def _update_cache_pattern(self, keys, keys_to_fetch):
+        if not self._pattern_started:
+            self._pattern_started = True
+            prefetch = cache_pattern_memory.start(self._pattern_id)
+            self._unused_prefetch_keys = prefetch - keys_to_fetch
+            keys_to_fetch.update(prefetch)
+            cache_pattern_memory.record_prefetch(
+                self._pattern_id, prefetched=len(self._unused_prefetch_keys))
+            used = None
+        else:
+            used = self._unused_prefetch_keys.intersection(keys)
+        new_keys = set(keys) - self._pattern_keys_seen
+        if new_keys:
+            cache_pattern_memory.record_keys(self._pattern_id, new_keys)
+            self._pattern_keys_seen.update(new_keys)
+        if used:
+            self._unused_prefetch_keys -= used
+            saved = all(self.cache_wrapper.has_fetched(key)
+                        for key in keys_to_fetch)
+            cache_pattern_memory.record_prefetch(
+                self._pattern_id, prefetch_used=len(used),
+                round_trips_saved=1 if saved else 0)
+
     def set(self, key, value, timeout=None):
         """Set a value in the cache """
         self.ensure_version()
@@ -339,6 +672,70 @@ class CacheGroup(object):
         self.set(key, calculated_value)
         return calculated_value
 
+    def get_or_calc_stale(self, key, work_func, soft_timeout=None,
+                          timeout=None):
+        """get_or_calc() variant that avoids stampedes for hot values
+
+        If the value is missing, we calculate it like get_or_calc().  If the
+        value is stale, because the group was invalidated or soft_timeout
+        seconds have passed since it was calculated, then one caller gets a
+        lease to recalculate it.  Other callers keep getting the stale
+        value until the new one is stored.
+
+        Only use this for values where it's okay to show slightly outdated
+        data for a short time, like rendered HTML.
+
+        Args:
+            key: key to store the value with
+            work_func: function that calculates the value.  It's called with
+                no arguments.
+            soft_timeout: recalculate the value after this many seconds
+            timeout: hard timeout for the value in the cache
+        """
+        stale_value = None
+        cached = self._unpack_soft_value(self.get(key))
+        if cached is not None:
+            refresh_at, value = cached
+            if refresh_at is None or time.time() < refresh_at:
+                return value
+            stale_value = value
+        else:
+            # Check if there's a value from a previous version of the group.
+            # The get() call already fetched it, so this doesn't go to the
+            # cache.
+            cache_value = self.cache_wrapper.get_many([key])[key]
+            version, value = self._unpack_cache_value(cache_value)
+            cached = self._unpack_soft_value(value)
+            if cached is not None:
+                stale_value = cached[1]
+        lease_key = '{0}:lease:{1}'.format(self.prefix, key)
+        if stale_value is not None and not cache.add(lease_key, 1,
+                                                     LEASE_TIMEOUT):
+            Meter('cache-group.stale-value-served').inc()
+            return stale_value
+        try:
+            calculated_value = work_func()
+            if soft_timeout is not None:
+                refresh_at = time.time() + soft_timeout
+            else:
+                refresh_at = None
+            self.set(key, ('soft-ttl', refresh_at, calculated_value),
+                     timeout)
+        finally:
+            if stale_value is not None:
+                cache.delete(lease_key)
+        return calculated_value
+
+    def _unpack_soft_value(self, value):
+        """Unpack a value stored by get_or_calc_stale()
+
+        Returns a (refresh_at, value) tuple or None
+        """
+        if (isinstance(value, tuple) and len(value) == 3 and
+                value[0] == 'soft-ttl'):
+            return value[1:]
+        return None
+
     def get_model(self, ModelClass, key):
         """Get a model stored with set_model()
 
@@ -439,11 +836,13 @@ class ModelCacheManager(object):
 
     .. automethod:: get_cache_group
     .. automethod:: invalidate_by_pk
+    .. automethod:: invalidate_many_by_pk
     .. automethod:: get_instance
 
     """
-    def __init__(self, default_cache_pattern=None):
+    def __init__(self, default_cache_pattern=None, local_cache=False):
         self.default_cache_pattern = default_cache_pattern
+        self.local_cache = local_cache
         # we will set in __get__ once the attribute is accessed
         self.model_class = None
 
@@ -460,7 +859,8 @@ class ModelCacheManager(object):
         """
         if cache_pattern is None:
             cache_pattern = self.default_cache_pattern
-        return CacheGroup(self._make_prefix(pk), cache_pattern)
+        return CacheGroup(self._make_prefix(pk), cache_pattern,
+                          local_cache=self.local_cache)
 
     def invalidate_by_pk(self, pk):
         """Invalidate a CacheGroup for an instance
@@ -470,6 +870,24 @@ class ModelCacheManager(object):
         """
         return self.get_cache_group(pk).invalidate()
 
+    def invalidate_many_by_pk(self, pks):
+        """Invalidate the CacheGroups for several instances
+
+        This works like invalidate_by_pk(), but it sets all the version keys
+        with a single set_many() call.
+        """
+        version = codes.make_code()
+        cache_groups = [self.get_cache_group(pk) for pk in pks]
+        cache.set_many(dict(
+            (cache_group.cache_wrapper._prefix_key(cache_group.version_key),
+             version)
+            for cache_group in cache_groups
+        ))
+        if self.local_cache:
+            for cache_group in cache_groups:
+                cache_group.cache_wrapper._local_set(cache_group.version_key,
+                                                     version)
+
     def get_instance(self, pk, cache_pattern=None):
         """Get a cached instance from it's cache group
 
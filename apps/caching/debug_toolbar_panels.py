@@ -13,6 +13,8 @@ from debug_toolbar.utils import (tidy_stacktrace, render_stacktrace,
 from django.core.cache import cache
 from django.utils.translation import ungettext
 
+from caching import cachegroup
+
 
 CallInfo = collections.namedtuple('CallInfo', 'name keys time stacktrace')
 
@@ -119,6 +121,7 @@ class CachePanel(Panel):
 
     def enable_instrumentation(self):
         self.patcher.start()
+        cachegroup.stats.reset()
 
     def disable_instrumentation(self):
         self.patcher.stop()
@@ -129,4 +132,6 @@ class CachePanel(Panel):
             'total_time': math.floor(self.patcher.total_time * 1000),
             'calls': self.patcher.calls,
             'counts': self.patcher.get_counts(),
+            'cache_group_stats': cachegroup.stats.summary(),
+            'cache_pattern_stats': cachegroup.cache_pattern_memory.stats(),
         })
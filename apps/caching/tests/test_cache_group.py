@@ -25,8 +25,8 @@ from django.test.utils import override_settings
 from nose.tools import *
 import mock
 
-from caching.cachegroup import (CacheGroup, _cache_pattern_memory,
-                                ModelCacheManager)
+from caching import cachegroup
+from caching.cachegroup import CacheGroup, ModelCacheManager
 from utils import test_utils
 from utils.factories import *
 from videos.models import Video
@@ -173,16 +173,182 @@ class CacheGroupTest2(CacheGroupTest):
     # test non-string values, which go through a slightly different codepath
     CACHE_VALUE = {'value': 'test'}
 
+class TimeoutTest(TestCase):
+    def test_set_timeout(self):
+        with mock.patch.object(cachegroup.cache, 'set') as mock_set:
+            make_cache_group().set('key', 'value', 10)
+        assert_equal(mock_set.call_args[0][2], 10)
+
+    def test_local_cache_timeout(self):
+        with mock.patch('caching.cachegroup.time') as mock_time:
+            mock_time.time.return_value = 1000.0
+            cache_group = make_cache_group(local_cache=True)
+            cache_group.set('key', 'value', 10)
+            cache.clear()
+            assert_equal(make_cache_group(local_cache=True).get('key'),
+                         'value')
+            mock_time.time.return_value = 1011.0
+            assert_equal(make_cache_group(local_cache=True).get('key'),
+                         None)
+
+class GetOrCalcStaleTest(TestCase):
+    def setUp(self):
+        self.time_patcher = mock.patch('caching.cachegroup.time')
+        self.mock_time = self.time_patcher.start()
+        self.mock_time.time.return_value = 1000.0
+        self.work_func = mock.Mock(return_value='value')
+
+    def tearDown(self):
+        self.time_patcher.stop()
+
+    def get_or_calc_stale(self, **kwargs):
+        return make_cache_group().get_or_calc_stale('key', self.work_func,
+                                                    **kwargs)
+
+    def lease_key(self):
+        return 'cache-group-prefix:lease:key'
+
+    def test_cache_miss(self):
+        assert_equal(self.get_or_calc_stale(), 'value')
+        assert_equal(self.work_func.call_count, 1)
+        # lease should only be used when there's a stale value
+        assert_equal(cache.get(self.lease_key()), None)
+
+    def test_cache_hit(self):
+        self.get_or_calc_stale()
+        self.work_func.return_value = 'new-value'
+        assert_equal(self.get_or_calc_stale(), 'value')
+        assert_equal(self.work_func.call_count, 1)
+
+    def test_invalidated(self):
+        # After the group is invalidated, we should recalculate the value
+        self.get_or_calc_stale()
+        make_cache_group().invalidate()
+        self.work_func.return_value = 'new-value'
+        assert_equal(self.get_or_calc_stale(), 'new-value')
+        assert_equal(cache.get(self.lease_key()), None)
+
+    def test_invalidated_with_lease_taken(self):
+        # If someone else is recalculating the value, we should return the
+        # stale value
+        self.get_or_calc_stale()
+        make_cache_group().invalidate()
+        cache.add(self.lease_key(), 1)
+        self.work_func.return_value = 'new-value'
+        assert_equal(self.get_or_calc_stale(), 'value')
+        assert_equal(self.work_func.call_count, 1)
+
+    def test_soft_timeout(self):
+        self.get_or_calc_stale(soft_timeout=60)
+        self.work_func.return_value = 'new-value'
+        self.mock_time.time.return_value = 1030.0
+        assert_equal(self.get_or_calc_stale(soft_timeout=60), 'value')
+        self.mock_time.time.return_value = 1061.0
+        cache.add(self.lease_key(), 1)
+        assert_equal(self.get_or_calc_stale(soft_timeout=60), 'value')
+        cache.delete(self.lease_key())
+        assert_equal(self.get_or_calc_stale(soft_timeout=60), 'new-value')
+
+    def test_error_releases_lease(self):
+        self.get_or_calc_stale()
+        make_cache_group().invalidate()
+        self.work_func.side_effect = ValueError()
+        with assert_raises(ValueError):
+            self.get_or_calc_stale()
+        assert_equal(cache.get(self.lease_key()), None)
+
+class LocalCacheTest(TestCase):
+    def setUp(self):
+        self.time_patcher = mock.patch('caching.cachegroup.time')
+        self.mock_time = self.time_patcher.start()
+        self.mock_time.time.return_value = 1000.0
+        cachegroup.stats.reset()
+
+    def tearDown(self):
+        self.time_patcher.stop()
+
+    def make_local_cache_group(self):
+        return make_cache_group(local_cache=True)
+
+    def advance_past_revalidate(self):
+        self.mock_time.time.return_value += (
+            cachegroup.LOCAL_CACHE_REVALIDATE + 1)
+
+    def test_local_hit(self):
+        self.make_local_cache_group().set('key', 'value')
+        # clear memcached, we should still be able to get the value
+        cache.clear()
+        assert_equal(self.make_local_cache_group().get('key'), 'value')
+        assert_equal(cachegroup.stats.counts['cache-group-prefix'][0], 2)
+
+    @mock.patch('caching.cachegroup.Meter')
+    def test_stats_reported_in_aggregate(self, mock_meter):
+        self.make_local_cache_group().set('key', 'value')
+        cache.clear()
+        cachegroup.stats.report()
+        mock_meter.reset_mock()
+        self.make_local_cache_group().get('key')
+        self.make_local_cache_group().get('key')
+        # fetching shouldn't send any metrics, we only send them in report()
+        assert_equal(mock_meter.call_count, 0)
+        cachegroup.stats.report()
+        mock_meter.assert_called_once_with(
+            'cache-group.cache-group-prefix.local-hit')
+        mock_meter.return_value.inc.assert_called_once_with(4)
+        # the stats are cleared after report()
+        mock_meter.reset_mock()
+        cachegroup.stats.report()
+        assert_equal(mock_meter.call_count, 0)
+
+    def test_returns_copies(self):
+        self.make_local_cache_group().set('key', [1, 2])
+        self.make_local_cache_group().get('key').append(3)
+        assert_equal(self.make_local_cache_group().get('key'), [1, 2])
+
+    def test_invalidate_from_other_process(self):
+        self.make_local_cache_group().set('key', 'value')
+        # Invalidate with a non-local cache group, which simulates another
+        # process invalidating the group.  We should continue to use the
+        # local value until the revalidate window expires.
+        make_cache_group().invalidate()
+        assert_equal(self.make_local_cache_group().get('key'), 'value')
+        self.advance_past_revalidate()
+        assert_equal(self.make_local_cache_group().get('key'), None)
+
+    def test_invalidate_from_same_process(self):
+        self.make_local_cache_group().set('key', 'value')
+        self.make_local_cache_group().invalidate()
+        assert_equal(self.make_local_cache_group().get('key'), None)
+
+    def test_refetch_stale_local_value(self):
+        self.make_local_cache_group().set('key', 'value')
+        # Another process invalidates the group and sets a new value
+        other_process_group = make_cache_group()
+        other_process_group.invalidate()
+        other_process_group.set('key', 'new-value')
+        self.advance_past_revalidate()
+        assert_equal(self.make_local_cache_group().get('key'), 'new-value')
+
 class CachePatternTest(TestCase):
+    PATTERN_ID = 'foo:cache-group-prefix'
+
     def tearDown(self):
-        _cache_pattern_memory.clear()
+        cachegroup.cache_pattern_memory.clear()
+
+    def use_pattern(self, keys):
+        # simulate a previous request that fetched keys
+        make_cache_group(cache_pattern='foo').get_many(keys)
+
+    def keys_to_prefetch(self):
+        return cachegroup.cache_pattern_memory.keys_to_prefetch(
+            self.PATTERN_ID)
 
     def test_remember_keys(self):
         # test that we remember fetched keys
         cache_group = make_cache_group(cache_pattern='foo')
         cache_group.get('a')
         cache_group.get_many(['b', 'c'])
-        assert_items_equal(_cache_pattern_memory['foo'], ['a', 'b', 'c'])
+        assert_items_equal(self.keys_to_prefetch(), ['a', 'b', 'c'])
 
     def test_remember_keys_two_runs(self):
         # test remembering fetched keys after multiple runs
@@ -190,7 +356,7 @@ class CachePatternTest(TestCase):
         cache_group.get('a')
         cache_group2 = make_cache_group(cache_pattern='foo')
         cache_group2.get_many(['b', 'c'])
-        assert_items_equal(_cache_pattern_memory['foo'], ['a', 'b', 'c'])
+        assert_items_equal(self.keys_to_prefetch(), ['a', 'b', 'c'])
 
     def make_mocked_cache_group(self):
         cache_group = make_cache_group(cache_pattern='foo')
@@ -203,7 +369,7 @@ class CachePatternTest(TestCase):
     def test_get_with_previous_key(self):
         # test calling get() with previously seen keys.  We should use
         # get_many() to fetch them all at once
-        _cache_pattern_memory['foo'] = set(['a', 'b'])
+        self.use_pattern(['a', 'b'])
         cache_group = self.make_mocked_cache_group()
         cache_group.get('a')
         assert_equal(cache_group.cache_wrapper.get_many.call_args,
@@ -213,7 +379,7 @@ class CachePatternTest(TestCase):
         # test calling get() twice.  On the first call we should fetch the
         # previous keys, but on the second one we should just fetch the new
         # value
-        _cache_pattern_memory['foo'] = set(['a', 'b'])
+        self.use_pattern(['a', 'b'])
         cache_group = self.make_mocked_cache_group()
         cache_group.get('a')
         cache_group.cache_wrapper.get_many.reset_mock()
@@ -224,7 +390,7 @@ class CachePatternTest(TestCase):
     def test_get_with_new_key(self):
         # test calling get() with a key not previously seen.  We should fetch
         # that value plus the previously seen ones
-        _cache_pattern_memory['foo'] = set(['a', 'b'])
+        self.use_pattern(['a', 'b'])
         cache_group = self.make_mocked_cache_group()
         cache_group.get('c')
         assert_equal(cache_group.cache_wrapper.get_many.call_args,
@@ -234,12 +400,57 @@ class CachePatternTest(TestCase):
         # test calling get_many() with some previous keys and some new keys.
         # We should fetch all the previous keys and also any new keys passed
         # to get_many()
-        _cache_pattern_memory['foo'] = set(['a', 'b'])
+        self.use_pattern(['a', 'b'])
         cache_group = self.make_mocked_cache_group()
         cache_group.get_many(['b', 'c'])
         assert_equal(cache_group.cache_wrapper.get_many.call_args,
                      mock.call(set(['a', 'b', 'c', cache_group.version_key])))
 
+    def test_patterns_separated_by_prefix(self):
+        # The same pattern used for different types of cache groups should
+        # be tracked separately.
+        self.use_pattern(['a'])
+        CacheGroup('other-prefix:1', cache_pattern='foo').get('b')
+        assert_items_equal(self.keys_to_prefetch(), ['a'])
+
+    def test_shared_between_processes(self):
+        self.use_pattern(['a', 'b'])
+        cachegroup.cache_pattern_memory.sync(self.PATTERN_ID)
+        # simulate starting a new process
+        cachegroup.cache_pattern_memory.clear()
+        cache_group = self.make_mocked_cache_group()
+        cache_group.get('a')
+        assert_equal(cache_group.cache_wrapper.get_many.call_args,
+                     mock.call(set(['a', 'b', cache_group.version_key])))
+
+    def test_rarely_used_keys_not_prefetched(self):
+        self.use_pattern(['a', 'rare'])
+        for i in xrange(20):
+            self.use_pattern(['a'])
+        assert_items_equal(self.keys_to_prefetch(), ['a'])
+
+    def test_decay(self):
+        self.use_pattern(['a', 'b'])
+        with mock.patch.object(cachegroup, 'PATTERN_DECAY_USES', 4):
+            for i in xrange(4):
+                self.use_pattern(['a'])
+            cachegroup.cache_pattern_memory.sync(self.PATTERN_ID)
+        # After the decay, "b" has a count of 0 and should be dropped
+        info = cachegroup.cache_pattern_memory.patterns[self.PATTERN_ID]
+        assert_equal(info.key_counts, {'a': 2})
+        assert_equal(info.uses, 2)
+
+    def test_stats(self):
+        self.use_pattern(['a', 'b', 'c'])
+        cache_group = make_cache_group(cache_pattern='foo')
+        cache_group.get('a')
+        # b was prefetched, so this shouldn't need a round trip
+        cache_group.get('b')
+        assert_equal(cachegroup.cache_pattern_memory.stats(), [
+            # pattern, uses, prefetched, prefetch_used, round_trips_saved
+            (self.PATTERN_ID, 2, 2, 1, 1),
+        ])
+
 class ModelCachingTest(TestCase):
     def test_model_to_tuple(self):
         video = VideoFactory()
@@ -311,6 +522,15 @@ class ModelCacheManagerTest(TestCase):
         cache_group2 = self.model_cache_manager.get_cache_group(self.pk)
         assert_equal(cache_group2.get('key'), None)
 
+    def test_invalidate_many_by_pk(self):
+        other_pk = User.objects.create_user('test-user2').pk
+        for pk in (self.pk, other_pk):
+            self.model_cache_manager.get_cache_group(pk).set('key', 'value')
+        self.model_cache_manager.invalidate_many_by_pk([self.pk, other_pk])
+        for pk in (self.pk, other_pk):
+            cache_group = self.model_cache_manager.get_cache_group(pk)
+            assert_equal(cache_group.get('key'), None)
+
     def test_get_instance(self):
         # Since the instance is not cached at this point, calling
         # get_instance() should fetch it from the DB
@@ -44,6 +44,7 @@ from teams.moderation_const import REVIEWED_AND_PUBLISHED, \
 
 from messages.models import Message
 from utils import send_templated_email
+from utils.bulkemail import send_templated_email_bulk
 from utils.metrics import Meter
 from utils.text import fmt
 from utils.translation import get_language_label
@@ -224,29 +225,33 @@ def team_member_new(member_pk):
     Action.create_new_member_handler(member)
     # notify  admins and owners through messages
     notifiable = TeamMember.objects.filter( team=member.team,
-       role__in=[TeamMember.ROLE_ADMIN, TeamMember.ROLE_OWNER]).exclude(pk=member.pk)
+       role__in=[TeamMember.ROLE_ADMIN, TeamMember.ROLE_OWNER]).exclude(pk=member.pk) \
+       .select_related('user')
+    context = {
+        "new_member": member.user,
+        "team":member.team,
+        "role":member.role,
+        "url_base":get_url_base(),
+    }
+    subject = fmt(
+        ugettext("%(team)s team has a new member"),
+        team=member.team)
+    notifiable_users = []
     for m in notifiable:
-        context = {
-            "new_member": member.user,
-            "team":member.team,
-            "user":m.user,
-            "role":member.role,
-            "url_base":get_url_base(),
-        }
-        body = render_to_string("messages/team-new-member.txt",context)
-        subject = fmt(
-            ugettext("%(team)s team has a new member"),
-            team=member.team)
         if m.user.notify_by_message:
+            body = render_to_string("messages/team-new-member.txt",
+                                    dict(context, user=m.user))
             msg = Message()
             msg.subject = subject
             msg.content = body
             msg.user = m.user
-            msg.object = m.team
+            msg.object = member.team
             msg.save()
-        template_name = "messages/email/team-new-member.html"
-        Meter('templated-emails-sent-by-type.teams.new-member').inc()
-        send_templated_email(m.user, subject, template_name, context)
+        notifiable_users.append(m.user)
+    template_name = "messages/email/team-new-member.html"
+    sent_count = send_templated_email_bulk(notifiable_users, subject,
+                                           template_name, context)
+    Meter('templated-emails-sent-by-type.teams.new-member').inc(sent_count)
 
     # does this team have a custom message for this?
     team_default_message = None
@@ -29,7 +29,6 @@ from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.translation import ugettext_lazy as _
 from django.utils.encoding import force_unicode
-from tastypie.models import ApiKey
 
 from auth.models import CustomUser as User
 from profiles.forms import (EditUserForm, EditAccountForm, SendMessageForm,
@@ -240,11 +239,8 @@ def send_message(request):
 
 @login_required
 def generate_api_key(request):
-    key, created = ApiKey.objects.get_or_create(user=request.user)
-    if not created:
-        key.key = key.generate_key()
-        key.save()
-    return HttpResponse(json.dumps({"key":key.key}))
+    key = request.user.regenerate_api_key()
+    return HttpResponse(json.dumps({"key":key}))
 
 
 @login_required
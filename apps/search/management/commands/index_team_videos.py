@@ -16,17 +16,46 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from multiprocessing import Pool
+from optparse import make_option
+import time
+
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connection, transaction
 
 from haystack import site
 from teams.models import Team, TeamVideo
+from teams.search_indexes import prefetch_index_data
 from videos.models import Video
-import time
+
+def index_chunk(team_video_ids):
+    """Index a chunk of team videos.
+
+    This is a module-level function so that it can be run from the worker
+    processes.
+    """
+    video_index = site.get_index(Video)
+    team_video_index = site.get_index(TeamVideo)
+    with transaction.commit_on_success():
+        team_videos = list(TeamVideo.objects
+                           .filter(id__in=team_video_ids)
+                           .select_related('video', 'team', 'project'))
+        prefetch_index_data(team_videos)
+        video_index.backend.update(video_index,
+                                   [tv.video for tv in team_videos])
+        team_video_index.backend.update(team_video_index, team_videos)
+    return len(team_videos)
 
 class Command(BaseCommand):
     args = '<team slug>'
     help = 'Re-index all videos from a team'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=500,
+                    help='Number of videos to send to solr at once'),
+        make_option('--workers', dest='workers', type='int', default=0,
+                    help='Number of worker processes to use'),
+    )
 
     def handle(self, *args, **options):
         if len(args) != 1:
@@ -36,25 +65,34 @@ class Command(BaseCommand):
         except Team.DoesNotExist:
             raise CommandError('Team with slug %r not found' % (args[0],))
 
-        video_index = site.get_index(Video)
-        team_video_index = site.get_index(TeamVideo)
         self.stdout.write("Fetching videos\n")
-        video_list = list(TeamVideo.objects
-                          .filter(team=team)
-                          .select_related('video'))
+        team_video_ids = list(TeamVideo.objects
+                              .filter(team=team)
+                              .order_by('id')
+                              .values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        chunks = [team_video_ids[i:i+chunk_size]
+                  for i in xrange(0, len(team_video_ids), chunk_size)]
         start_time = time.time()
-        self.stdout.write("Indexing")
-        self.stdout.flush()
-        with transaction.commit_manually():
-            for team_video in video_list:
-                video_index.update_object(team_video.video)
-                team_video_index.update_object(team_video)
-                self.stdout.write(".")
-                self.stdout.flush()
-                # commit after each pass to make sure that we aren't keeping
-                # open any database locks
-                transaction.commit()
+        self.stdout.write("Indexing\n")
+        if options['workers'] > 0:
+            # Close our DB connection so that the worker processes don't try
+            # to share it.
+            connection.close()
+            pool = Pool(options['workers'])
+            results = pool.imap_unordered(index_chunk, chunks)
+        else:
+            pool = None
+            results = (index_chunk(chunk) for chunk in chunks)
+        count = 0
+        for chunk_count in results:
+            count += chunk_count
+            self.stdout.write("%d/%d videos indexed\n" %
+                              (count, len(team_video_ids)))
+            self.stdout.flush()
+        if pool is not None:
+            pool.close()
+            pool.join()
         end_time = time.time()
-        self.stdout.write("\ndone indexed %s videos in %0.1f seconds\n" %
-                          (len(video_list), end_time-start_time))
-
+        self.stdout.write("done indexed %s videos in %0.1f seconds\n" %
+                          (count, end_time-start_time))
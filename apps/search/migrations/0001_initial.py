@@ -0,0 +1,52 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding model 'SearchIndexUpdate'
+        db.create_table('search_searchindexupdate', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('content_type', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contenttypes.ContentType'])),
+            ('object_id', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('queued', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('requeue_count', self.gf('django.db.models.fields.PositiveIntegerField')(default=0)),
+        ))
+        db.send_create_signal('search', ['SearchIndexUpdate'])
+
+        # Adding unique constraint on 'SearchIndexUpdate', fields ['content_type', 'object_id']
+        db.create_unique('search_searchindexupdate', ['content_type_id', 'object_id'])
+
+
+    def backwards(self, orm):
+
+        # Removing unique constraint on 'SearchIndexUpdate', fields ['content_type', 'object_id']
+        db.delete_unique('search_searchindexupdate', ['content_type_id', 'object_id'])
+
+        # Deleting model 'SearchIndexUpdate'
+        db.delete_table('search_searchindexupdate')
+
+
+    models = {
+        'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'search.searchindexupdate': {
+            'Meta': {'unique_together': "[('content_type', 'object_id')]", 'object_name': 'SearchIndexUpdate'},
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'object_id': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'queued': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'requeue_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'})
+        }
+    }
+
+    complete_apps = ['search']
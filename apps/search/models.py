@@ -14,4 +14,30 @@
 # 
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see 
-# http://www.gnu.org/licenses/agpl-3.0.html.
\ No newline at end of file
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from datetime import datetime
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+class SearchIndexUpdate(models.Model):
+    """Pending search index update for an object.
+
+    These are created by utils.celery_search_index when objects are saved
+    or deleted, then sent to the search backend in batches by the
+    flush_search_index_queue task.  There's at most one row per object, so
+    saving an object several times before the flush only updates the index
+    once.  We don't store what happened to the object: if it still exists
+    when we flush, we update it, otherwise we remove it from the index.
+    """
+    content_type = models.ForeignKey(ContentType)
+    object_id = models.PositiveIntegerField()
+    queued = models.DateTimeField(default=datetime.now)
+    # Number of times the object was queued again before we flushed it
+    requeue_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [
+            ('content_type', 'object_id'),
+        ]
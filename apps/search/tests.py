@@ -17,10 +17,16 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
 from django.test import TestCase
-from nose.tools import assert_equal
+from haystack import site
+from nose.tools import *
+import mock
 
 from search.forms import SearchForm
+from search.models import SearchIndexUpdate
+from utils import celery_search_index
+from utils.factories import *
 from utils.rpc import RpcMultiValueDict
+from videos.models import Video
 from videos.search_indexes import VideoIndex
 from utils import test_utils
 
@@ -105,3 +111,59 @@ class SearchTest(TestCase):
         form = SearchForm(RpcMultiValueDict(dict(q='')))
         # If we don't have a query, we should use the all videos
         self.check_get_language_facet_counts_query(VideoIndex.public())
+
+class SearchIndexQueueTest(TestCase):
+    def setUp(self):
+        self.search_index = site.get_index(Video)
+        self.backend = mock.Mock()
+        self.patcher = mock.patch.object(self.search_index, 'backend',
+                                         self.backend)
+        self.patcher.start()
+        self.videos = [VideoFactory() for i in xrange(3)]
+        SearchIndexUpdate.objects.all().delete()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def queued_ids(self):
+        return sorted(SearchIndexUpdate.objects
+                      .values_list('object_id', flat=True))
+
+    def test_queue_update(self):
+        celery_search_index.queue_update(Video, self.videos[0].pk)
+        celery_search_index.queue_update(Video, self.videos[1].pk)
+        # queueing an object twice should only result in 1 update
+        celery_search_index.queue_update(Video, self.videos[0].pk)
+        assert_equal(self.queued_ids(),
+                     sorted([self.videos[0].pk, self.videos[1].pk]))
+        assert_equal(self.backend.update.call_count, 0)
+
+    def test_flush(self):
+        for video in self.videos:
+            celery_search_index.queue_update(Video, video.pk)
+        deleted_pk = self.videos[2].pk
+        self.videos[2].delete()
+        self.backend.reset_mock()
+
+        assert_equal(celery_search_index.flush_queue(), 3)
+        assert_equal(self.queued_ids(), [])
+        # we should update the existing videos with 1 call, and remove the
+        # deleted one
+        assert_equal(self.backend.update.call_count, 1)
+        args, kwargs = self.backend.update.call_args
+        assert_equal(set(args[1]), set(self.videos[:2]))
+        self.backend.remove.assert_called_once_with(
+            u'videos.video.%s' % deleted_pk, commit=True)
+        # we should only commit at the end of the batch
+        assert_equal(kwargs, {'commit': False})
+
+    def test_requeue_during_flush(self):
+        # If an object gets queued again while we're flushing, we should
+        # keep it in the queue
+        video = self.videos[0]
+        celery_search_index.queue_update(Video, video.pk)
+        def requeue(*args, **kwargs):
+            celery_search_index.queue_update(Video, video.pk)
+        self.backend.update.side_effect = requeue
+        celery_search_index.flush_queue(max_batches=1)
+        assert_equal(self.queued_ids(), [video.pk])
@@ -16,8 +16,17 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from collections import namedtuple
+import copy
+import hashlib
+
+import babelsubs
+from django.conf import settings
 from django.core.cache import cache
 
+from utils.lru import LRUCache
+from utils.metrics import Meter
+
 TIMEOUT = 60 * 60 * 24 * 5 # 5 days
 
 
@@ -38,3 +47,126 @@ def get_is_synced(language, public):
 def set_is_synced(language, public, value):
     cache_key = _lang_is_synced_id(language, public)
     cache.set(cache_key, value, TIMEOUT)
+
+# Parsed SubtitleSets are cached in-process.  Versions are (mostly) immutable,
+# so we can keep the parsed data for as long as we have room.  The key
+# includes an identifier for the subtitle data to be extra safe if the data
+# for a version ever changes.
+#
+# Sizes are measured using the length of the DFXP, which is a reasonable
+# approximation of the memory used by the parsed tree.
+parsed_subtitle_cache = LRUCache(
+    getattr(settings, 'PARSED_SUBTITLE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+def _parsed_subtitles_key(version):
+    if version.blob_id is not None:
+        # blobs are content-addressed and never change
+        content_id = 'blob-%s' % version.blob_id
+    else:
+        content_id = hashlib.sha1(version.serialized_subtitles).hexdigest()
+    return (version.pk, content_id)
+
+def get_parsed_subtitles(version):
+    """Get a parsed SubtitleSet for a version from the in-process cache.
+
+    Returns None if the version is not in the cache.  We return a copy of the
+    cached SubtitleSet, so callers are free to modify it.
+    """
+    if version.pk is None:
+        return None
+    subtitles = parsed_subtitle_cache.get(_parsed_subtitles_key(version))
+    if subtitles is None:
+        Meter('subtitles.parsed-subtitle-cache.miss').inc()
+        return None
+    Meter('subtitles.parsed-subtitle-cache.hit').inc()
+    return copy.deepcopy(subtitles)
+
+def set_parsed_subtitles(version, subtitles, size):
+    """Store a parsed SubtitleSet in the in-process cache."""
+    if version.pk is None:
+        return
+    if parsed_subtitle_cache.set(_parsed_subtitles_key(version),
+                                 copy.deepcopy(subtitles), size):
+        Meter('subtitles.parsed-subtitle-cache.set').inc()
+
+def invalidate_parsed_subtitles(version):
+    """Drop all cached SubtitleSets for a version."""
+    pk = version.pk
+    parsed_subtitle_cache.delete_matching(lambda key: key[0] == pk)
+
+# Rendered subtitles (SRT, VTT, DFXP, etc) are cached as well.  Like the
+# parsed SubtitleSets, the key includes the subtitle data identifier, so
+# renditions never need to be invalidated.  We use 2 tiers:
+#
+#   - An in-process LRU cache, bounded by the size of the rendered text
+#   - memcached, so that all the web workers share the renditions.  Only
+#     renditions smaller than SUBTITLE_RENDITION_MAX_ITEM_BYTES get stored
+#     there.
+#
+# warm_rendition_cache() stores the SUBTITLE_RENDITION_WARM_FORMATS
+# renditions when a version gets published, so that most requests never
+# need to parse the subtitles at all.
+rendition_cache = LRUCache(
+    getattr(settings, 'SUBTITLE_RENDITION_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+RENDITION_MAX_ITEM_BYTES = getattr(settings,
+                                   'SUBTITLE_RENDITION_MAX_ITEM_BYTES',
+                                   512 * 1024)
+RENDITION_WARM_FORMATS = getattr(settings, 'SUBTITLE_RENDITION_WARM_FORMATS',
+                                 ('srt', 'vtt', 'dfxp'))
+
+Rendition = namedtuple('Rendition', 'content etag')
+
+def _rendition_key(version, format):
+    pk, content_id = _parsed_subtitles_key(version)
+    return 'subtitle-rendition:{0}:{1}:{2}'.format(pk, content_id, format)
+
+def rendition_etag(version, format):
+    """Get the ETag for a rendition.
+
+    This only needs the version data, so it can be used to handle
+    If-None-Match without fetching the rendition.
+    """
+    return '"{0}"'.format(
+        hashlib.sha1(_rendition_key(version, format)).hexdigest())
+
+def get_rendition(version, format):
+    """Get the subtitles for a version in a subtitle format
+
+    The rendition is fetched from the cache if possible.  Otherwise we
+    render it and store it in the cache.
+
+    :returns: Rendition tuple
+    """
+    key = _rendition_key(version, format)
+    content = rendition_cache.get(key)
+    if content is not None:
+        Meter('subtitles.rendition-cache.local-hit').inc()
+    else:
+        content = cache.get(key)
+        if content is not None:
+            Meter('subtitles.rendition-cache.remote-hit').inc()
+        else:
+            Meter('subtitles.rendition-cache.miss').inc()
+            content = _render(version, format)
+            _store_remote(key, content)
+        rendition_cache.set(key, content, len(content))
+    return Rendition(content, rendition_etag(version, format))
+
+def warm_rendition_cache(version, formats=None):
+    """Render a version and store the renditions in memcached."""
+    if formats is None:
+        formats = RENDITION_WARM_FORMATS
+    keys = dict((_rendition_key(version, format), format)
+                for format in formats)
+    already_cached = cache.get_many(keys.keys())
+    for key, format in keys.items():
+        if key not in already_cached:
+            _store_remote(key, _render(version, format))
+
+def _render(version, format):
+    return babelsubs.to(version.get_subtitles(), format)
+
+def _store_remote(key, content):
+    if len(content) <= RENDITION_MAX_ITEM_BYTES:
+        cache.set(key, content, TIMEOUT)
+        Meter('subtitles.rendition-cache.set').inc()
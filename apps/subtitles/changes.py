@@ -0,0 +1,77 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""subtitles.changes -- Calculate how much changed between two versions
+
+We measure changes separately for the text and the timing of the subtitles.
+Each subtitle set gets converted to a list of ints: hashes of the text for
+the text change, and hashes of the (start, end) pairs for the time change.
+Then we align the two lists and count the items that don't match.  The
+change value is:
+
+    (items removed + items added) / (total items in both versions)
+
+So 0.0 means nothing changed and 1.0 means everything changed.
+
+We work from the packed subtitle data (see subtitles.packed), so we never
+need to parse the DFXP.
+"""
+
+import difflib
+
+def _count_matches(old, new):
+    """Count the items that align between two lists of hashes."""
+    # Strip the common prefix and suffix first.  Most edits only touch a
+    # couple of lines, so this usually leaves very little for the
+    # SequenceMatcher to do.
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while (suffix < limit and
+           old[len(old) - suffix - 1] == new[len(new) - suffix - 1]):
+        suffix += 1
+    old_middle = old[prefix:len(old)-suffix]
+    new_middle = new[prefix:len(new)-suffix]
+    matches = prefix + suffix
+    if old_middle and new_middle:
+        matcher = difflib.SequenceMatcher(None, old_middle, new_middle,
+                                          autojunk=False)
+        matches += sum(block.size for block in matcher.get_matching_blocks())
+    return matches
+
+def sequence_change(old, new):
+    """Calculate the change value for two lists of hashes."""
+    total = len(old) + len(new)
+    if total == 0:
+        return 0.0
+    return float(total - 2 * _count_matches(old, new)) / total
+
+def calc_changes(old_packed, new_packed):
+    """Calculate the changes between 2 PackedSubtitles objects.
+
+    :returns: (time_change, text_change) tuple
+    """
+    old_timings = [hash(t) for t in old_packed.timings()]
+    new_timings = [hash(t) for t in new_packed.timings()]
+    old_texts = [hash(t) for t in old_packed.texts()]
+    new_texts = [hash(t) for t in new_packed.texts()]
+    return (sequence_change(old_timings, new_timings),
+            sequence_change(old_texts, new_texts))
@@ -182,7 +182,7 @@ class SubtitlesUploadForm(forms.Form):
 
     def _verify_translation_subtitle_counts(self, from_language_code):
         if from_language_code and hasattr(self, '_parsed_subtitles'):
-            from_count = len(self.from_sv.get_subtitles())
+            from_count = self.from_sv.get_subtitle_count()
             current_count = len(self._parsed_subtitles.get_subtitles())
 
             if current_count > from_count:
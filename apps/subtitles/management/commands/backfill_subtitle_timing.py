@@ -0,0 +1,70 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+
+from subtitles.models import SubtitleVersion
+from subtitles.tasks import backfill_timing_fields
+
+class Command(BaseCommand):
+    help = 'Fill in the timing fields for existing SubtitleVersions'
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=500, help='Versions to process per task'),
+        make_option('--sleep', dest='sleep', type='float', default=0.1,
+                    help='Seconds to sleep between batches'),
+        make_option('--local', dest='local', action='store_true',
+                    default=False,
+                    help='Process the batches here rather than in celery'),
+    )
+
+    def handle(self, *args, **options):
+        # We split the versions that haven't been backfilled into batches and
+        # send each one to celery, so that the workers process them in
+        # parallel.  Each task skips versions that have already been
+        # backfilled, so the command can be stopped and restarted at any
+        # time.
+        qs = (SubtitleVersion.objects.full()
+              .filter(speech_duration__isnull=True)
+              .order_by('id')
+              .values_list('id', flat=True))
+        last_pk = 0
+        count = 0
+        start_time = time.time()
+        while True:
+            version_ids = list(qs.filter(id__gt=last_pk)
+                               [:options['batch_size']])
+            if not version_ids:
+                break
+            if options['local']:
+                backfill_timing_fields(version_ids)
+            else:
+                backfill_timing_fields.delay(version_ids)
+            last_pk = version_ids[-1]
+            count += len(version_ids)
+            self.stdout.write("%d versions %s (last id: %d)\n" % (
+                count, 'processed' if options['local'] else 'queued',
+                last_pk))
+            self.stdout.flush()
+            time.sleep(options['sleep'])
+        self.stdout.write("done %s %d versions in %0.1f seconds\n" % (
+            'processed' if options['local'] else 'queued', count,
+            time.time() - start_time))
@@ -0,0 +1,81 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import random
+import time
+
+from babelsubs.generators.html import HTMLGenerator
+from babelsubs.storage import SubtitleSet, calc_changes
+from django.core.management.base import BaseCommand
+
+from subtitles import changes
+from subtitles import packed
+
+class Command(BaseCommand):
+    help = ('Benchmark subtitles.changes against babelsubs.calc_changes on '
+            'synthetic subtitle sets')
+    option_list = BaseCommand.option_list + (
+        make_option('--lines', dest='lines', type='int', default=5000,
+                    help='Subtitles per set'),
+        make_option('--edits', dest='edits', type='int', default=50,
+                    help='Number of edited subtitles in the second set'),
+        make_option('--runs', dest='runs', type='int', default=3,
+                    help='Number of times to run each diff'),
+        make_option('--skip-babelsubs', dest='skip_babelsubs',
+                    action='store_true', default=False,
+                    help="Don't run the babelsubs diff"),
+    )
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        old_items = [(i * 2000, i * 2000 + 1500, 'Subtitle line %d' % i)
+                     for i in xrange(options['lines'])]
+        new_items = list(old_items)
+        for i in random.sample(xrange(len(new_items)), options['edits']):
+            start, end, text = new_items[i]
+            if random.random() < 0.5:
+                new_items[i] = (start, end + 100, text)
+            else:
+                new_items[i] = (start, end, text + ' (edited)')
+        old_subs = self.make_subtitle_set(old_items)
+        new_subs = self.make_subtitle_set(new_items)
+        old_packed = packed.PackedSubtitles(packed.pack_subtitles(old_subs))
+        new_packed = packed.PackedSubtitles(packed.pack_subtitles(new_subs))
+
+        self.run_benchmark('subtitles.changes', options['runs'],
+                           changes.calc_changes, old_packed, new_packed)
+        if not options['skip_babelsubs']:
+            self.run_benchmark('babelsubs.calc_changes', options['runs'],
+                               calc_changes, old_subs, new_subs,
+                               HTMLGenerator.MAPPINGS)
+
+    def make_subtitle_set(self, items):
+        subs = SubtitleSet('en')
+        for start, end, text in items:
+            subs.append_subtitle(start, end, text)
+        return subs
+
+    def run_benchmark(self, name, runs, func, *args):
+        times = []
+        for i in xrange(runs):
+            start = time.time()
+            result = func(*args)
+            times.append(time.time() - start)
+        self.stdout.write("%s: best %0.4fs, avg %0.4fs (result: %s)\n" % (
+            name, min(times), sum(times) / len(times), result))
@@ -0,0 +1,99 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from collections import defaultdict
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from subtitles.models import SubtitleVersion, SubtitleVersionAncestor
+
+ParentLink = SubtitleVersion.parents.through
+
+class Command(BaseCommand):
+    help = 'Fill in the SubtitleVersionAncestor table for existing versions'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=500, help='Versions to index per transaction'),
+        make_option('--sleep', dest='sleep', type='float', default=0.1,
+                    help='Seconds to sleep between chunks'),
+        make_option('--start-id', dest='start_id', type='int', default=0,
+                    help='Start with versions after this id'),
+    )
+
+    def handle(self, *args, **options):
+        # Parents are always created before their children, so if we walk
+        # the versions in id order, the ancestors of each parent are already
+        # in the table by the time we get to the child.  Versions that
+        # already have rows are skipped, so the command can be restarted.
+        last_id = options['start_id']
+        count = 0
+        start_time = time.time()
+        while True:
+            with transaction.commit_on_success():
+                version_ids = list(SubtitleVersion.objects.full()
+                                   .filter(id__gt=last_id)
+                                   .order_by('id')
+                                   .values_list('id', flat=True)
+                                   [:options['chunk_size']])
+                if not version_ids:
+                    break
+                count += self.index_chunk(version_ids)
+            last_id = version_ids[-1]
+            self.stdout.write("%d versions indexed (last id: %d)\n" %
+                              (count, last_id))
+            self.stdout.flush()
+            time.sleep(options['sleep'])
+        self.stdout.write("done indexed %d versions in %0.1f seconds\n" %
+                          (count, time.time() - start_time))
+
+    def index_chunk(self, version_ids):
+        parents = defaultdict(set)
+        for child_id, parent_id in (ParentLink.objects
+                                    .filter(from_subtitleversion__in=version_ids)
+                                    .values_list('from_subtitleversion_id',
+                                                 'to_subtitleversion_id')):
+            parents[child_id].add(parent_id)
+        already_indexed = set(SubtitleVersionAncestor.objects
+                              .filter(descendant__in=version_ids)
+                              .values_list('descendant_id', flat=True)
+                              .distinct())
+        # ancestors for the parents that were indexed before this chunk
+        all_parent_ids = set().union(*parents.values()) if parents else set()
+        ancestors = defaultdict(set)
+        for descendant_id, ancestor_id in (
+            SubtitleVersionAncestor.objects
+            .filter(descendant__in=all_parent_ids - set(version_ids))
+            .values_list('descendant_id', 'ancestor_id')):
+            ancestors[descendant_id].add(ancestor_id)
+
+        links = []
+        for version_id in version_ids:
+            for parent_id in parents[version_id]:
+                ancestors[version_id].add(parent_id)
+                ancestors[version_id].update(ancestors[parent_id])
+            if version_id in already_indexed:
+                continue
+            links.extend(
+                SubtitleVersionAncestor(descendant_id=version_id,
+                                        ancestor_id=ancestor_id)
+                for ancestor_id in ancestors[version_id])
+        SubtitleVersionAncestor.objects.bulk_create(links)
+        return len(version_ids) - len(already_indexed)
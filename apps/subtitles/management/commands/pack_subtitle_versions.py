@@ -0,0 +1,63 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from subtitles.models import SubtitleVersion
+
+class Command(BaseCommand):
+    help = 'Fill in packed_subtitles for existing SubtitleVersions'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=100, help='Versions to convert per transaction'),
+        make_option('--sleep', dest='sleep', type='float', default=0.1,
+                    help='Seconds to sleep between chunks'),
+    )
+
+    def handle(self, *args, **options):
+        # Only versions with an empty packed_subtitles column are converted,
+        # so the command can be stopped and restarted at any time.  We walk
+        # the table in pk order to avoid long-running queries and to keep the
+        # transactions small.
+        chunk_size = options['chunk_size']
+        qs = (SubtitleVersion.objects.full()
+              .filter(packed_subtitles='')
+              .only('id', 'language_code', 'blob', 'serialized_subtitles')
+              .order_by('id'))
+        last_pk = 0
+        count = 0
+        start_time = time.time()
+        while True:
+            with transaction.commit_on_success():
+                versions = list(qs.filter(id__gt=last_pk)[:chunk_size])
+                for version in versions:
+                    version.update_packed_subtitles()
+            if not versions:
+                break
+            last_pk = versions[-1].id
+            count += len(versions)
+            self.stdout.write("%d versions converted (last id: %d)\n" %
+                              (count, last_pk))
+            self.stdout.flush()
+            time.sleep(options['sleep'])
+        self.stdout.write("done converted %d versions in %0.1f seconds\n" %
+                          (count, time.time() - start_time))
@@ -0,0 +1,116 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from subtitles.models import SubtitleBlob, SubtitleVersion
+from utils.compress import decompress
+
+class Command(BaseCommand):
+    args = '<report|migrate>'
+    help = ('Report on SubtitleBlob deduplication or move existing '
+            'SubtitleVersion data into blobs')
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=100, help='Versions to migrate per transaction'),
+        make_option('--sleep', dest='sleep', type='float', default=0.1,
+                    help='Seconds to sleep between chunks'),
+        make_option('--limit', dest='limit', type='int', default=None,
+                    help='Stop after migrating this many versions'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1 or args[0] not in ('report', 'migrate'):
+            raise CommandError('Usage subtitle_blobs <report|migrate>')
+        if args[0] == 'report':
+            self.report()
+        else:
+            self.migrate(options)
+
+    def report(self):
+        versions = SubtitleVersion.objects.full()
+        legacy_count = versions.filter(blob__isnull=True).count()
+        version_stats = (versions.filter(blob__isnull=False)
+                         .aggregate(count=Count('id'),
+                                    size=Sum('blob__size')))
+        blob_stats = SubtitleBlob.objects.aggregate(count=Count('id'),
+                                                    size=Sum('size'))
+        delta_count = SubtitleBlob.objects.filter(base__isnull=False).count()
+        stored_size = sum(len(data) for data in
+                          SubtitleBlob.objects.values_list('data', flat=True)
+                          .iterator())
+        logical_size = version_stats['size'] or 0
+        self.stdout.write("versions not migrated: %d\n" % legacy_count)
+        self.stdout.write("versions using blobs: %d\n" %
+                          version_stats['count'])
+        self.stdout.write("blobs: %d (%d deltas)\n" % (blob_stats['count'],
+                                                       delta_count))
+        if blob_stats['count']:
+            self.stdout.write("versions per blob: %0.2f\n" % (
+                float(version_stats['count']) / blob_stats['count']))
+        self.stdout.write("DFXP size for all versions: %d bytes\n" %
+                          logical_size)
+        self.stdout.write("DFXP size for unique blobs: %d bytes\n" %
+                          (blob_stats['size'] or 0))
+        self.stdout.write("stored size: %d bytes\n" % stored_size)
+        if stored_size:
+            self.stdout.write("dedup ratio: %0.2f\n" % (
+                float(logical_size) / stored_size))
+
+    def migrate(self, options):
+        # Walk the versions that don't have a blob in pk order.  Each chunk is
+        # committed separately, so the command can be stopped and restarted
+        # at any time.
+        qs = (SubtitleVersion.objects.full()
+              .filter(blob__isnull=True)
+              .only('id', 'serialized_subtitles')
+              .order_by('id'))
+        last_pk = 0
+        count = 0
+        start_time = time.time()
+        while options['limit'] is None or count < options['limit']:
+            chunk_size = options['chunk_size']
+            if options['limit'] is not None:
+                chunk_size = min(chunk_size, options['limit'] - count)
+            with transaction.commit_on_success():
+                versions = list(qs.filter(id__gt=last_pk)[:chunk_size])
+                for version in versions:
+                    self.migrate_version(version)
+            if not versions:
+                break
+            last_pk = versions[-1].id
+            count += len(versions)
+            self.stdout.write("%d versions migrated (last id: %d)\n" %
+                              (count, last_pk))
+            self.stdout.flush()
+            time.sleep(options['sleep'])
+        self.stdout.write("done migrated %d versions in %0.1f seconds\n" %
+                          (count, time.time() - start_time))
+
+    def migrate_version(self, version):
+        blob = SubtitleBlob.objects.store(
+            decompress(version.serialized_subtitles))
+        # use update() so that we don't run any of the SubtitleVersion.save()
+        # logic
+        SubtitleVersion.objects.filter(pk=version.pk).update(
+            blob=blob, serialized_subtitles='')
@@ -0,0 +1,260 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding field 'SubtitleVersion.packed_subtitles'
+        db.add_column('subtitles_subtitleversion', 'packed_subtitles', self.gf('django.db.models.fields.TextField')(default='', blank=True), keep_default=False)
+
+
+    def backwards(self, orm):
+
+        # Deleting field 'SubtitleVersion.packed_subtitles'
+        db.delete_column('subtitles_subtitleversion', 'packed_subtitles')
+
+
+    models = {
+        'auth.customuser': {
+            'Meta': {'_ormbases': ['auth.User'], 'object_name': 'CustomUser'},
+            'autoplay_preferences': ('django.db.models.fields.IntegerField', [], {'default': '1'}),
+            'award_points': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'biography': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'can_send_messages': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'True'}),
+            'full_name': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '63'}),
+            'homepage': ('django.db.models.fields.URLField', [], {'blank': 'True', 'max_length': '200'}),
+            'is_partner': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'last_ip': ('django.db.models.fields.IPAddressField', [], {'blank': 'True', 'max_length': '15', 'null': 'True'}),
+            'notify_by_email': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'True'}),
+            'notify_by_message': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'True'}),
+            'partner': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'null': 'True', 'to': "orm['teams.Partner']"}),
+            'pay_rate_code': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '3'}),
+            'picture': ('utils.amazon.fields.S3EnabledImageField', [], {'blank': 'True', 'max_length': '100'}),
+            'preferred_language': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '16'}),
+            'user_ptr': ('django.db.models.fields.related.OneToOneField', [], {'primary_key': 'True', 'to': "orm['auth.User']", 'unique': 'True'}),
+            'valid_email': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'videos': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'symmetrical': 'False', 'to': "orm['videos.Video']"})
+        },
+        'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '80', 'unique': 'True'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'symmetrical': 'False', 'to': "orm['auth.Permission']"})
+        },
+        'auth.permission': {
+            'Meta': {'object_name': 'Permission', 'unique_together': "(('content_type', 'codename'),)"},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['contenttypes.ContentType']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2014, 9, 18, 20, 1, 42, 344124)'}),
+            'email': ('django.db.models.fields.EmailField', [], {'blank': 'True', 'max_length': '75'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '30'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'symmetrical': 'False', 'to': "orm['auth.Group']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime(2014, 9, 18, 20, 1, 42, 344009)'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '30'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'symmetrical': 'False', 'to': "orm['auth.Permission']"}),
+            'username': ('django.db.models.fields.CharField', [], {'max_length': '30', 'unique': 'True'})
+        },
+        'contenttypes.contenttype': {
+            'Meta': {'db_table': "'django_content_type'", 'object_name': 'ContentType', 'unique_together': "(('app_label', 'model'),)"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        'subtitles.subtitlelanguage': {
+            'Meta': {'object_name': 'SubtitleLanguage', 'unique_together': "[('video', 'language_code')]"},
+            'created': ('django.db.models.fields.DateTimeField', [], {}),
+            'followers': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'new_followed_languages'", 'symmetrical': 'False', 'to': "orm['auth.CustomUser']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_forked': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'language_code': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            'subtitles_complete': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'video': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'newsubtitlelanguage_set'", 'to': "orm['videos.Video']"}),
+            'writelock_owner': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'null': 'True', 'related_name': "'writelocked_newlanguages'", 'to': "orm['auth.CustomUser']"}),
+            'writelock_session_key': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '255'}),
+            'writelock_time': ('django.db.models.fields.DateTimeField', [], {'blank': 'True', 'null': 'True'})
+        },
+        'subtitles.subtitlenote': {
+            'Meta': {'object_name': 'SubtitleNote'},
+            'body': ('django.db.models.fields.TextField', [], {}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'language_code': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'null': 'True', 'related_name': "'+'", 'to': "orm['auth.CustomUser']"}),
+            'video': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'+'", 'to': "orm['videos.Video']"})
+        },
+        'subtitles.subtitleversion': {
+            'Meta': {'object_name': 'SubtitleVersion', 'unique_together': "[('video', 'subtitle_language', 'version_number'), ('video', 'language_code', 'version_number')]"},
+            'author': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'newsubtitleversion_set'", 'to': "orm['auth.CustomUser']"}),
+            'created': ('django.db.models.fields.DateTimeField', [], {}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'language_code': ('django.db.models.fields.CharField', [], {'max_length': '16'}),
+            'meta_1_content': ('videos.metadata.MetadataContentField', [], {'blank': 'True', 'default': "''", 'max_length': '255'}),
+            'meta_2_content': ('videos.metadata.MetadataContentField', [], {'blank': 'True', 'default': "''", 'max_length': '255'}),
+            'meta_3_content': ('videos.metadata.MetadataContentField', [], {'blank': 'True', 'default': "''", 'max_length': '255'}),
+            'note': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '512'}),
+            'origin': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '255'}),
+            'packed_subtitles': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'parents': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'symmetrical': 'False', 'to': "orm['subtitles.SubtitleVersion']"}),
+            'rollback_of_version_number': ('django.db.models.fields.PositiveIntegerField', [], {'blank': 'True', 'default': 'None', 'null': 'True'}),
+            'serialized_lineage': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'serialized_subtitles': ('django.db.models.fields.TextField', [], {}),
+            'subtitle_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'subtitle_language': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['subtitles.SubtitleLanguage']"}),
+            'title': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '2048'}),
+            'version_number': ('django.db.models.fields.PositiveIntegerField', [], {'default': '1'}),
+            'video': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'newsubtitleversion_set'", 'to': "orm['videos.Video']"}),
+            'visibility': ('django.db.models.fields.CharField', [], {'default': "'public'", 'max_length': '10'}),
+            'visibility_override': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '10'})
+        },
+        'subtitles.subtitleversionmetadata': {
+            'Meta': {'object_name': 'SubtitleVersionMetadata', 'unique_together': "(('key', 'subtitle_version'),)"},
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'data': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'key': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'auto_now': 'True', 'blank': 'True'}),
+            'subtitle_version': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'metadata'", 'to': "orm['subtitles.SubtitleVersion']"})
+        },
+        'teams.application': {
+            'Meta': {'object_name': 'Application', 'unique_together': "(('team', 'user', 'status'),)"},
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'history': ('django.db.models.fields.TextField', [], {'blank': 'True', 'null': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'blank': 'True', 'null': 'True'}),
+            'note': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'status': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'applications'", 'to': "orm['teams.Team']"}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'team_applications'", 'to': "orm['auth.CustomUser']"})
+        },
+        'teams.partner': {
+            'Meta': {'object_name': 'Partner'},
+            'admins': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'null': 'True', 'related_name': "'managed_partners'", 'symmetrical': 'False', 'to': "orm['auth.CustomUser']"}),
+            'can_request_paid_captions': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '250', 'unique': 'True'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'db_index': 'True', 'max_length': '50', 'unique': 'True'})
+        },
+        'teams.project': {
+            'Meta': {'object_name': 'Project', 'unique_together': "(('team', 'name'), ('team', 'slug'))"},
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True', 'max_length': '2048', 'null': 'True'}),
+            'guidelines': ('django.db.models.fields.TextField', [], {'blank': 'True', 'max_length': '2048', 'null': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'modified': ('django.db.models.fields.DateTimeField', [], {'blank': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'order': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'blank': 'True', 'db_index': 'True', 'max_length': '50'}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['teams.Team']"}),
+            'workflow_enabled': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'})
+        },
+        'teams.team': {
+            'Meta': {'object_name': 'Team'},
+            'applicants': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'applicated_teams'", 'symmetrical': 'False', 'through': "orm['teams.Application']", 'to': "orm['auth.CustomUser']"}),
+            'application_text': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'auth_provider_code': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '24'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'deleted': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'header_html_text': ('django.db.models.fields.TextField', [], {'blank': 'True', 'default': "''"}),
+            'highlight': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_moderated': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'is_visible': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'True'}),
+            'last_notification_time': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'logo': ('utils.amazon.fields.S3EnabledImageField', [], {'blank': 'True', 'default': "''", 'max_length': '100', 'thumb_sizes': '[(280, 100), (100, 100)]'}),
+            'max_tasks_per_member': ('django.db.models.fields.PositiveIntegerField', [], {'blank': 'True', 'default': 'None', 'null': 'True'}),
+            'membership_policy': ('django.db.models.fields.IntegerField', [], {'default': '4'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '250', 'unique': 'True'}),
+            'notify_interval': ('django.db.models.fields.CharField', [], {'default': "'D'", 'max_length': '1'}),
+            'page_content': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'partner': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'null': 'True', 'related_name': "'teams'", 'to': "orm['teams.Partner']"}),
+            'points': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'projects_enabled': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'slug': ('django.db.models.fields.SlugField', [], {'db_index': 'True', 'max_length': '50', 'unique': 'True'}),
+            'square_logo': ('utils.amazon.fields.S3EnabledImageField', [], {'blank': 'True', 'default': "''", 'max_length': '100', 'thumb_sizes': '[(100, 100), (48, 48)]'}),
+            'subtitle_policy': ('django.db.models.fields.IntegerField', [], {'default': '10'}),
+            'task_assign_policy': ('django.db.models.fields.IntegerField', [], {'default': '10'}),
+            'task_expiration': ('django.db.models.fields.PositiveIntegerField', [], {'blank': 'True', 'default': 'None', 'null': 'True'}),
+            'translate_policy': ('django.db.models.fields.IntegerField', [], {'default': '10'}),
+            'users': ('django.db.models.fields.related.ManyToManyField', [], {'related_name': "'teams'", 'symmetrical': 'False', 'through': "orm['teams.TeamMember']", 'to': "orm['auth.CustomUser']"}),
+            'video': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'null': 'True', 'related_name': "'intro_for_teams'", 'to': "orm['videos.Video']"}),
+            'video_policy': ('django.db.models.fields.IntegerField', [], {'default': '1'}),
+            'videos': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'through': "orm['teams.TeamVideo']", 'to': "orm['videos.Video']"}),
+            'workflow_enabled': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'workflow_type': ('django.db.models.fields.CharField', [], {'default': "'O'", 'max_length': '2'})
+        },
+        'teams.teammember': {
+            'Meta': {'object_name': 'TeamMember', 'unique_together': "(('team', 'user'),)"},
+            'created': ('django.db.models.fields.DateTimeField', [], {'blank': 'True', 'default': 'datetime.datetime.now', 'null': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'role': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'default': "'contributor'", 'max_length': '16'}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'members'", 'to': "orm['teams.Team']"}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'team_members'", 'to': "orm['auth.CustomUser']"})
+        },
+        'teams.teamvideo': {
+            'Meta': {'object_name': 'TeamVideo', 'unique_together': "(('team', 'video'),)"},
+            'added_by': ('django.db.models.fields.related.ForeignKey', [], {'null': 'True', 'to': "orm['auth.CustomUser']"}),
+            'all_languages': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'blank': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'partner_id': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '100'}),
+            'project': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['teams.Project']"}),
+            'team': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['teams.Team']"}),
+            'thumbnail': ('utils.amazon.fields.S3EnabledImageField', [], {'blank': 'True', 'max_length': '100', 'null': 'True', 'thumb_sizes': '((288, 162), (120, 90))'}),
+            'video': ('django.db.models.fields.related.OneToOneField', [], {'to': "orm['videos.Video']", 'unique': 'True'})
+        },
+        'videos.video': {
+            'Meta': {'object_name': 'Video'},
+            'allow_community_edits': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'allow_video_urls_edit': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'True'}),
+            'complete_date': ('django.db.models.fields.DateTimeField', [], {'blank': 'True', 'null': 'True'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'}),
+            'description': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'duration': ('django.db.models.fields.PositiveIntegerField', [], {'blank': 'True', 'null': 'True'}),
+            'edited': ('django.db.models.fields.DateTimeField', [], {'null': 'True'}),
+            'featured': ('django.db.models.fields.DateTimeField', [], {'blank': 'True', 'null': 'True'}),
+            'followers': ('django.db.models.fields.related.ManyToManyField', [], {'blank': 'True', 'related_name': "'followed_videos'", 'symmetrical': 'False', 'to': "orm['auth.CustomUser']"}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_public': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'True'}),
+            'is_subtitled': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'default': 'False'}),
+            'languages_count': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True', 'default': '0'}),
+            'meta_1_content': ('videos.metadata.MetadataContentField', [], {'blank': 'True', 'default': "''", 'max_length': '255'}),
+            'meta_1_type': ('videos.metadata.MetadataTypeField', [], {'blank': 'True', 'null': 'True'}),
+            'meta_2_content': ('videos.metadata.MetadataContentField', [], {'blank': 'True', 'default': "''", 'max_length': '255'}),
+            'meta_2_type': ('videos.metadata.MetadataTypeField', [], {'blank': 'True', 'null': 'True'}),
+            'meta_3_content': ('videos.metadata.MetadataContentField', [], {'blank': 'True', 'default': "''", 'max_length': '255'}),
+            'meta_3_type': ('videos.metadata.MetadataTypeField', [], {'blank': 'True', 'null': 'True'}),
+            'moderated_by': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'null': 'True', 'related_name': "'moderating'", 'to': "orm['teams.Team']"}),
+            'primary_audio_language_code': ('django.db.models.fields.CharField', [], {'blank': 'True', 'default': "''", 'max_length': '16'}),
+            's3_thumbnail': ('utils.amazon.fields.S3EnabledImageField', [], {'blank': 'True', 'max_length': '100', 'thumb_sizes': '((288, 162), (120, 90))'}),
+            'small_thumbnail': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '500'}),
+            'thumbnail': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '500'}),
+            'title': ('django.db.models.fields.CharField', [], {'blank': 'True', 'max_length': '2048'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'null': 'True', 'to': "orm['auth.CustomUser']"}),
+            'video_id': ('django.db.models.fields.CharField', [], {'max_length': '255', 'unique': 'True'}),
+            'view_count': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True', 'default': '0'}),
+            'was_subtitled': ('django.db.models.fields.BooleanField', [], {'blank': 'True', 'db_index': 'True', 'default': 'False'}),
+            'writelock_owner': ('django.db.models.fields.related.ForeignKey', [], {'null': 'True', 'related_name': "'writelock_owners'", 'to': "orm['auth.CustomUser']"}),
+            'writelock_session_key': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'writelock_time': ('django.db.models.fields.DateTimeField', [], {'null': 'True'})
+        }
+    }
+
+    complete_apps = ['subtitles']
@@ -18,10 +18,13 @@
 
 """Django models represention subtitles."""
 
+import difflib
+import hashlib
 import itertools
 import json
 from datetime import datetime, date, timedelta
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.db import models
@@ -30,14 +33,14 @@ from django.utils.translation import ugettext
 from django.utils.translation import ugettext_lazy as _
 
 from subtitles import cache
+from subtitles import packed
 from subtitles import shims
 from auth.models import CustomUser as User
 from videos import metadata
 from videos.models import Video, Action
 from babelsubs.storage import SubtitleSet
-from babelsubs.storage import calc_changes
-from babelsubs.generators.html import HTMLGenerator
 from babelsubs import load_from
+from subtitles import changes
 from subtitles import signals
 from utils.compress import compress, decompress
 from utils.subtitles import create_new_subtitles
@@ -671,9 +674,7 @@ EXISTS(
         if not version:
             return False
 
-        subtitles = version.get_subtitles()
-
-        return subtitles.fully_synced
+        return version.is_synced()
 
     def _sanity_check_parents(self, version, parents):
         r"""Check that the given parents are sane for an SV about to be created.
@@ -759,8 +760,12 @@ EXISTS(
         metadata = kwargs.pop('metadata', None)
 
         sv = SubtitleVersion(*args, **kwargs)
+        sv.cache_previous_version(tip, full=True)
+        if tip and not tip.is_deleted():
+            sv.cache_previous_version(tip)
 
         sv.set_subtitles(kwargs.get('subtitles', None))
+        sv.update_changes(sv.previous_version())
         self._sanity_check_parents(sv, parents)
 
         sv.full_clean()
@@ -768,6 +773,7 @@ EXISTS(
 
         for p in parents:
             sv.parents.add(p)
+        SubtitleVersionAncestor.objects.add_links(sv, parents)
 
         cache.invalidate_language_cache(self)
         self.clear_tip_cache()
@@ -997,32 +1003,28 @@ LIMIT 1;""", (self.id, self.id))
             >>> en.get_dsl(direct=True)
             [fr]
 
-        Note that this is NOT going to be very performant.
+        A language is a dependent if its tip has an ancestor in this
+        language.  Since versions build on the previous version of their
+        language, that's the same as checking if any non-deleted version has
+        an ancestor in this language, which we can do with a single query on
+        the SubtitleVersionAncestor table.
 
         This is a shim for the existing UI.  Once the new one comes this
         monstrosity will be torn out.
 
         """
-        # Start with all the subtitle languages for the video.
-        sls = self.video.newsubtitlelanguage_set
-
-        # Exclude this one.
-        sls = sls.exclude(id=self.id)
+        dependent_ids = (SubtitleVersionAncestor.objects
+                         .filter(ancestor__subtitle_language=self)
+                         .exclude(descendant__subtitle_language=self)
+                         .exclude(descendant__visibility_override='deleted')
+                         .values_list('descendant__subtitle_language_id',
+                                      flat=True)
+                         .distinct())
 
         # Exclude those that are already forked.  They can't be dependents.
-        sls = sls.exclude(is_forked=True)
-
-        # Realize the query to get the list of remaining SubtitleLanguages that
-        # could possibly be dependents.  Hopefully there shouldn't be too many.
-        sls = list(sls)
-
-        # Check the lineage maps for the candidates to determine if they're
-        # dependents.
-        results = []
-        for sl in sls:
-            tip = sl.get_tip()
-            if tip and self.language_code in tip.lineage:
-                results.append(sl)
+        results = list(SubtitleLanguage.objects
+                       .filter(video=self.video_id, id__in=dependent_ids)
+                       .exclude(is_forked=True))
 
         # Direct translations are restricted to those that come directly from
         # the source language (this).
@@ -1109,6 +1111,127 @@ LIMIT 1;""", (self.id, self.id))
         return False
 
 
+# Subtitle Blobs --------------------------------------------------------------
+class SubtitleBlobManager(models.Manager):
+    def store(self, xml, base=None):
+        """Get a SubtitleBlob for a DFXP string, creating it if needed.
+
+        Blobs are keyed by the hash of their contents, so storing the same
+        subtitles twice (for example when rolling back, or when only the
+        title changes) returns the existing blob.
+
+        If base is given and delta storage is enabled, we may store the blob
+        as a delta against base.
+        """
+        if isinstance(xml, unicode):
+            xml = xml.encode('utf-8')
+        hash = hashlib.sha1(xml).hexdigest()
+        try:
+            return self.get(hash=hash)
+        except SubtitleBlob.DoesNotExist:
+            pass
+        blob = SubtitleBlob(hash=hash, size=len(xml))
+        blob.set_xml(xml, base)
+        blob, created = self.get_or_create(hash=hash, defaults={
+            'size': blob.size,
+            'data': blob.data,
+            'base': blob.base,
+            'depth': blob.depth,
+        })
+        return blob
+
+class SubtitleBlob(models.Model):
+    """Stores the DFXP for SubtitleVersions
+
+    Blobs are content-addressed by the SHA1 of the uncompressed DFXP, so many
+    versions can share a single blob.  A blob can either store the full DFXP
+    compressed with utils.compress, or a delta against a base blob (usually
+    the blob of the parent version).  Deltas are only used when the
+    SUBTITLE_BLOB_DELTAS setting is True, and delta chains are limited to
+    SUBTITLE_BLOB_MAX_DELTA_DEPTH blobs.
+
+    Blobs are immutable, never change them once they're created.
+    """
+    hash = models.CharField(max_length=40, unique=True)
+    # Size of the uncompressed DFXP
+    size = models.PositiveIntegerField(default=0)
+    data = models.TextField()
+    base = models.ForeignKey('self', null=True, blank=True,
+                             related_name='+')
+    # length of the delta chain, 0 for blobs that store the full DFXP
+    depth = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(default=datetime.now, editable=False)
+
+    objects = SubtitleBlobManager()
+
+    def __unicode__(self):
+        return u'SubtitleBlob %s' % self.hash
+
+    @staticmethod
+    def deltas_enabled():
+        return getattr(settings, 'SUBTITLE_BLOB_DELTAS', False)
+
+    @staticmethod
+    def max_delta_depth():
+        return getattr(settings, 'SUBTITLE_BLOB_MAX_DELTA_DEPTH', 10)
+
+    def is_delta(self):
+        return self.base_id is not None
+
+    def get_xml(self):
+        if not hasattr(self, '_xml'):
+            if self.is_delta():
+                self._xml = self._apply_delta(self.base.get_xml(),
+                                              json.loads(decompress(self.data)))
+            else:
+                self._xml = decompress(self.data)
+        return self._xml
+
+    def set_xml(self, xml, base=None):
+        self.data = compress(xml)
+        self.base = None
+        self.depth = 0
+        if (base is not None and self.deltas_enabled() and
+            base.depth < self.max_delta_depth()):
+            delta = compress(json.dumps(self._make_delta(base.get_xml(), xml)))
+            # only use the delta if it actually saves space
+            if len(delta) < len(self.data) / 2:
+                self.data = delta
+                self.base = base
+                self.depth = base.depth + 1
+        self._xml = xml
+
+    @staticmethod
+    def _make_delta(base_xml, xml):
+        """Calculate a line-based delta between two DFXP strings.
+
+        The delta is a list of operations.  ["c", i, j] means copy lines i
+        to j from the base, ["i", text] means insert text.
+        """
+        base_lines = base_xml.splitlines(True)
+        lines = xml.splitlines(True)
+        matcher = difflib.SequenceMatcher(None, base_lines, lines,
+                                          autojunk=False)
+        ops = []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                ops.append(['c', i1, i2])
+            elif j2 > j1:
+                ops.append(['i', ''.join(lines[j1:j2]).decode('utf-8')])
+        return ops
+
+    @staticmethod
+    def _apply_delta(base_xml, ops):
+        base_lines = base_xml.splitlines(True)
+        parts = []
+        for op in ops:
+            if op[0] == 'c':
+                parts.extend(base_lines[op[1]:op[2]])
+            else:
+                parts.append(op[1].encode('utf-8'))
+        return ''.join(parts)
+
+
 # SubtitleVersions ------------------------------------------------------------
 class SubtitleVersionManager(models.Manager):
     use_for_related_fields = True
@@ -1346,16 +1469,46 @@ class SubtitleVersion(models.Model):
     # easier filtering later.
     subtitle_count = models.PositiveIntegerField(default=0)
 
+    # Denormalized time/text changes from the previous version.  These are
+    # calculated when the version is created.  changes_base_pk stores the pk
+    # of the version we compared against.  If that version gets deleted, we
+    # recalculate the changes against the new previous version.  Use
+    # get_changes() to access these.
+    time_change_ratio = models.FloatField(null=True, blank=True)
+    text_change_ratio = models.FloatField(null=True, blank=True)
+    changes_base_pk = models.PositiveIntegerField(null=True, blank=True)
+
     created = models.DateTimeField(editable=False)
 
     meta_1_content = metadata.MetadataContentField()
     meta_2_content = metadata.MetadataContentField()
     meta_3_content = metadata.MetadataContentField()
 
-    # Subtitles are stored in a text blob, serialized as base64'ed zipped XML
-    # (oh the joys of Django).  Use the subtitles property to get and set them.
-    # You shouldn't be touching this field.
-    serialized_subtitles = models.TextField()
+    # Subtitles are stored as DFXP in a SubtitleBlob, which can be shared
+    # between versions with identical subtitles.  Older versions store the
+    # DFXP in serialized_subtitles instead, serialized as base64'ed zipped XML
+    # (oh the joys of Django).  Use get_subtitles()/set_subtitles() to get
+    # and set them.  You shouldn't be touching these fields.
+    blob = models.ForeignKey(SubtitleBlob, null=True, blank=True,
+                             related_name='versions')
+    serialized_subtitles = models.TextField(blank=True)
+
+    # Denormalized timing data, calculated in set_subtitles() so that billing
+    # and reporting code doesn't need to look at the subtitles.  Times are in
+    # milliseconds (see subtitles.packed.TimingSummary).  speech_duration and
+    # fully_synced are NULL for versions that haven't been backfilled yet
+    # (see the backfill_subtitle_timing command).  Use get_timing_summary()
+    # and is_synced() to access these.
+    first_start_time = models.IntegerField(null=True, blank=True)
+    last_end_time = models.IntegerField(null=True, blank=True)
+    speech_duration = models.PositiveIntegerField(null=True, blank=True)
+    fully_synced = models.NullBooleanField()
+
+    # Packed copy of the subtitle data, for callers that only need the counts,
+    # timings or text without parsing the DFXP (see subtitles.packed).  It's
+    # also compressed with utils.compress.  Empty for versions that haven't
+    # been converted yet.  Use get_packed_subtitles() to access it.
+    packed_subtitles = models.TextField(blank=True)
 
     # Lineage is stored as a blob of JSON to save on DB rows.  You shouldn't
     # need to touch this field yourself, use the lineage property.
@@ -1382,13 +1535,20 @@ class SubtitleVersion(models.Model):
         subtitles.
 
         """
-        # We cache the parsed subs for speed.
+        # We cache the parsed subs for speed.  First on the instance, then
+        # in the process-wide cache for saved versions.
         if self._subtitles == None:
-            self._subtitles = load_from(decompress(self.serialized_subtitles),
-                    type='dfxp').to_internal()
-            # force the subtitles to have the correct language code.  For a
-            # while we had a bug where we always set to to "en"
-            self._subtitles.set_language(self.language_code)
+            if self._unsaved_xml is None:
+                self._subtitles = cache.get_parsed_subtitles(self)
+            if self._subtitles is None:
+                xml = self.get_subtitle_xml()
+                self._subtitles = load_from(xml, type='dfxp').to_internal()
+                # force the subtitles to have the correct language code.  For
+                # a while we had a bug where we always set to to "en"
+                self._subtitles.set_language(self.language_code)
+                if self._unsaved_xml is None:
+                    cache.set_parsed_subtitles(self, self._subtitles,
+                                               len(xml))
 
         return self._subtitles
 
@@ -1420,11 +1580,98 @@ class SubtitleVersion(models.Model):
                                 % str(type(subtitles)))
 
         self.subtitle_count = len(subtitles)
-        self.serialized_subtitles = compress(subtitles.to_xml())
+        packed_data = packed.pack_subtitles(subtitles)
+        self.packed_subtitles = compress(packed_data)
+        self._set_timing_fields(packed.PackedSubtitles(packed_data))
+        # The blob gets stored when we save the version.  Until then keep the
+        # XML around so that get_subtitle_xml() works for unsaved versions.
+        self.blob = None
+        self.serialized_subtitles = ''
+        self._unsaved_xml = subtitles.to_xml()
 
         # We cache the parsed subs for speed.
         self._subtitles = subtitles
+        self._packed_subtitles = None
+
+    def get_subtitle_xml(self):
+        """Get the DFXP string for this version."""
+        if self._unsaved_xml is not None:
+            return self._unsaved_xml
+        elif self.blob_id is not None:
+            return self.blob.get_xml()
+        else:
+            return decompress(self.serialized_subtitles)
+
+    def _store_blob(self):
+        if self._unsaved_xml is None:
+            return
+        base = None
+        if SubtitleBlob.deltas_enabled():
+            parent = self.previous_version(full=True)
+            if parent is not None and parent.blob_id is not None:
+                base = parent.blob
+        self.blob = SubtitleBlob.objects.store(self._unsaved_xml, base)
+        self._unsaved_xml = None
+
+    def get_packed_subtitles(self):
+        """Return a PackedSubtitles object for this version.
+
+        This is much cheaper than get_subtitles() if you only need the count,
+        the timings, or the text for some of the items.  If the version
+        hasn't been converted to the packed format yet, we pack the parsed
+        subtitles (but don't save them, use update_packed_subtitles() for
+        that).
+        """
+        if self._packed_subtitles is None:
+            if self.packed_subtitles:
+                data = decompress(self.packed_subtitles)
+            else:
+                data = packed.pack_subtitles(self.get_subtitles())
+            self._packed_subtitles = packed.PackedSubtitles(data)
+        return self._packed_subtitles
+
+    def update_packed_subtitles(self):
+        """Calculate packed_subtitles from the DFXP and save it to the DB.
+
+        This only updates the packed_subtitles column, so it's safe to call on
+        existing versions.
+        """
+        data = packed.pack_subtitles(self.get_subtitles())
+        self.packed_subtitles = compress(data)
+        self._packed_subtitles = packed.PackedSubtitles(data)
+        SubtitleVersion.objects.filter(pk=self.pk).update(
+            packed_subtitles=self.packed_subtitles)
+
+    def _set_timing_fields(self, packed_subtitles):
+        summary = packed_subtitles.timing_summary()
+        self.first_start_time = summary.first_start_time
+        self.last_end_time = summary.last_end_time
+        self.speech_duration = summary.speech_duration
+        self.fully_synced = packed_subtitles.fully_synced
+
+    def get_timing_summary(self):
+        """Get a subtitles.packed.TimingSummary for this version.
+
+        This reads the denormalized timing fields if they're set, otherwise
+        it calculates the data from the packed subtitles.
+        """
+        if self.speech_duration is None:
+            return self.get_packed_subtitles().timing_summary()
+        return packed.TimingSummary(self.first_start_time, self.last_end_time,
+                                    self.speech_duration)
+
+    def update_timing_fields(self):
+        """Calculate the timing fields and save them to the DB.
 
+        This only updates the timing columns, so it's safe to call on
+        existing versions.
+        """
+        self._set_timing_fields(self.get_packed_subtitles())
+        SubtitleVersion.objects.filter(pk=self.pk).update(
+            first_start_time=self.first_start_time,
+            last_end_time=self.last_end_time,
+            speech_duration=self.speech_duration,
+            fully_synced=self.fully_synced)
 
     def get_lineage(self):
         # We cache the parsed lineage for speed.
@@ -1473,6 +1720,8 @@ class SubtitleVersion(models.Model):
         super(SubtitleVersion, self).__init__(*args, **kwargs)
 
         self._subtitles = None
+        self._packed_subtitles = None
+        self._unsaved_xml = None
         if has_subtitles:
             self.set_subtitles(subtitles)
 
@@ -1517,6 +1766,7 @@ class SubtitleVersion(models.Model):
 
         Action.create_caption_handler(self, self.created)
 
+        self._store_blob()
         super(SubtitleVersion, self).save(*args, **kwargs)
 
         if self.is_public() and self.is_for_primary_audio_language():
@@ -1534,54 +1784,95 @@ class SubtitleVersion(models.Model):
             return 'ltr'
 
     def get_ancestors(self):
-        """Return all ancestors of this version.  WARNING: MAY EAT YOUR DB!
-
-        Returning all ancestors of a version is very database-intensive, because
-        we need to walk each relation.  It will make roughly l^b database calls,
-        where l is the length of a branch of history and b is the "branchiness".
+        """Return all ancestors of this version.
 
-        You probably don't need this.  You probably want to use the lineage
-        instead.  This is mostly here for sanity tests.
+        This uses the SubtitleVersionAncestor table, so it only takes a single
+        query.  Versions that haven't been added to that table yet (see the
+        index_subtitle_ancestry command) fall back to walking the parents
+        relation, which is very database-intensive.  It will make roughly l^b
+        database calls, where l is the length of a branch of history and b is
+        the "branchiness".
 
         """
+        ancestors = set(SubtitleVersion.objects.full()
+                        .filter(descendant_links__descendant=self))
+        if ancestors or not self.parents.full().exists():
+            return ancestors
+        return self._walk_ancestors()
+
+    def get_ancestor_ids(self):
+        """Return the ids of all ancestors of this version."""
+        ancestor_ids = set(SubtitleVersionAncestor.objects
+                           .filter(descendant=self)
+                           .values_list('ancestor_id', flat=True))
+        if ancestor_ids or not self.parents.full().exists():
+            return ancestor_ids
+        return set(v.id for v in self._walk_ancestors())
+
+    def _walk_ancestors(self):
         def _ancestors(version):
             return [version] + list(mapcat(_ancestors, version.parents.full()))
 
         return set(mapcat(_ancestors, self.parents.full()))
 
+    def get_descendants(self):
+        """Return a queryset of all descendants of this version."""
+        return (SubtitleVersion.objects.full()
+                .filter(ancestor_links__ancestor=self))
+
     def get_subtitle_count(self):
-        # TODO: babelsubs now supports len() on SubtitleSet instances
-        return len([s for s in self.get_subtitles().subtitle_items()])
+        return len(self.get_packed_subtitles())
 
     def get_changes(self):
         """Return (time_change, text_change).
 
-        Beware.
-
-        This was ported over from the old data model as a hack.  There are
-        probably lots of cases where it doesn't work right.
-
-        What we *really* need to do is sit down and come up with a scheme for
-        diffing subtitle versions meaningfully.  Until then, we have this
-        monstrosity.  Godspeed.
+        Both values are floats from 0.0 (nothing changed) to 1.0 (everything
+        changed) comparing this version to the previous one.  See
+        subtitles.changes for how they're calculated.
 
+        Normally the values are calculated when the version is created and
+        this method only needs to check that the previous version is still
+        the one we compared against.  Versions created before we stored the
+        changes get them calculated and saved on the first call.
         """
-        # TODO: Time only changes aren't quite right.
-
         if hasattr(self, '_time_change') and hasattr(self, '_text_change'):
             return (self._time_change, self._text_change)
 
         parent = self.previous_version()
 
         if not parent:
-            return (1.0, 1.0)
-
-        self._text_change, self._time_change = calc_changes(
-            parent.get_subtitles(), self.get_subtitles(),
-            HTMLGenerator.MAPPINGS)
+            self._time_change, self._text_change = (1.0, 1.0)
+        elif (self.changes_base_pk == parent.pk and
+              self.time_change_ratio is not None and
+              self.text_change_ratio is not None):
+            self._time_change = self.time_change_ratio
+            self._text_change = self.text_change_ratio
+        else:
+            self.update_changes(parent)
+            if self.pk:
+                SubtitleVersion.objects.filter(pk=self.pk).update(
+                    time_change_ratio=self.time_change_ratio,
+                    text_change_ratio=self.text_change_ratio,
+                    changes_base_pk=self.changes_base_pk)
 
         return self._time_change, self._text_change
 
+    def update_changes(self, parent):
+        """Calculate the time/text changes from parent.
+
+        This sets the denormalized fields, but doesn't save them.
+        """
+        if parent is None:
+            self._time_change, self._text_change = (1.0, 1.0)
+            self.time_change_ratio = self.text_change_ratio = None
+            self.changes_base_pk = None
+            return
+        self._time_change, self._text_change = changes.calc_changes(
+            parent.get_packed_subtitles(), self.get_packed_subtitles())
+        self.time_change_ratio = self._time_change
+        self.text_change_ratio = self._text_change
+        self.changes_base_pk = parent.pk
+
     @property
     def time_change(self):
         if not hasattr(self, '_time_change'):
@@ -1825,7 +2116,9 @@ class SubtitleVersion(models.Model):
         return self.subtitle_count is not 0
 
     def is_synced(self):
-        return self.get_subtitles().fully_synced
+        if self.fully_synced is not None:
+            return self.fully_synced
+        return self.get_packed_subtitles().fully_synced
 
     def publish(self):
         """Make this version publicly viewable."""
@@ -1833,10 +2126,14 @@ class SubtitleVersion(models.Model):
         was_public = self.is_public()
         self.visibility = 'public'
         self.save()
+        cache.invalidate_parsed_subtitles(self)
         if not was_public and self.is_tip():
             self.subtitle_language.set_tip_cache('public', self)
         if self.is_for_primary_audio_language():
             self._set_video_data()
+        if not was_public:
+            from subtitles.tasks import warm_rendition_cache
+            warm_rendition_cache.delay(self.pk)
 
     def _set_video_data(self):
         if self.title:
@@ -1859,6 +2156,7 @@ class SubtitleVersion(models.Model):
 
         self.visibility_override = 'deleted' if delete else 'private'
         self.save()
+        cache.invalidate_parsed_subtitles(self)
         if signal and was_tip:
             self.subtitle_language.clear_tip_cache()
             new_tip = version=self.subtitle_language.get_tip(public=True)
@@ -1871,6 +2169,45 @@ class SubtitleVersion(models.Model):
                 [self.video.video_id, self.language_code, self.subtitle_language.pk,
                  self.pk])
 
+class SubtitleVersionAncestorManager(models.Manager):
+    def add_links(self, version, parents):
+        """Add the rows for a newly created version.
+
+        version gets a row for each of its parents and for each of their
+        ancestors.
+        """
+        ancestor_ids = set()
+        for parent in parents:
+            ancestor_ids.add(parent.id)
+            ancestor_ids.update(parent.get_ancestor_ids())
+        self.bulk_create([
+            SubtitleVersionAncestor(descendant_id=version.id,
+                                    ancestor_id=ancestor_id)
+            for ancestor_id in ancestor_ids
+        ])
+
+class SubtitleVersionAncestor(models.Model):
+    """Closure table for the SubtitleVersion parents graph.
+
+    There is a row for each (version, ancestor) pair.  This lets us find all
+    ancestors/descendants of a version, or all languages that depend on
+    another language, with a single query instead of walking the parents
+    relation.
+
+    Rows are added by SubtitleLanguage.add_version().  Since versions never
+    change their parents after they're created, rows never need to be
+    updated.
+    """
+    descendant = models.ForeignKey(SubtitleVersion,
+                                   related_name='ancestor_links')
+    ancestor = models.ForeignKey(SubtitleVersion,
+                                 related_name='descendant_links')
+
+    objects = SubtitleVersionAncestorManager()
+
+    class Meta:
+        unique_together = [('descendant', 'ancestor')]
+
 class SubtitleVersionMetadata(models.Model):
     """This model is used to add extra metadata to SubtitleVersions.
 
@@ -0,0 +1,221 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""subtitles.packed -- Compact binary encoding of subtitle data
+
+Parsing the DFXP stored in SubtitleVersion.serialized_subtitles is expensive.
+Many callers only need the subtitle count, the timings or the text of a
+couple items, so we store a packed copy of that data alongside the DFXP.  The
+DFXP is still the canonical version -- the packed data can always be
+recreated from it.
+
+Format (all integers are little-endian):
+
+    ========  ==============================================================
+    header    magic ('ASUB'), format version (uint8), item count (uint32),
+              flags (uint8, bit 0 is set if the subtitles are fully synced)
+    starts    item count int32 values, start times in ms (-1 for unsynced)
+    ends      item count int32 values, end times in ms (-1 for unsynced)
+    para      item count uint8 values, 1 if the item starts a new paragraph
+    offsets   item count + 1 uint32 values, offsets into the string table
+    strings   UTF-8 encoded text for each item, concatenated together
+    ========  ==============================================================
+
+PackedSubtitles only decodes the parts of the data that are asked for, so
+reading the count or a slice of items is cheap.
+"""
+
+import collections
+import struct
+
+MAGIC = 'ASUB'
+FORMAT_VERSION = 1
+FLAG_FULLY_SYNCED = 0x1
+UNSYNCED = -1
+
+_HEADER = struct.Struct('<4sBIB')
+
+PackedItem = collections.namedtuple('PackedItem',
+                                    'start_time end_time text new_paragraph')
+
+# Timing data for a set of subtitles, in milliseconds.  first_start_time and
+# last_end_time are None if no subtitles are synced.  speech_duration is the
+# total time covered by the synced subtitles.
+TimingSummary = collections.namedtuple(
+    'TimingSummary', 'first_start_time last_end_time speech_duration')
+
+class PackedSubtitlesError(ValueError):
+    pass
+
+def _pack_time(value):
+    return UNSYNCED if value is None else int(value)
+
+def _unpack_time(value):
+    return None if value == UNSYNCED else value
+
+def pack_subtitles(subtitles):
+    """Pack a SubtitleSet into a bytestring."""
+    starts = []
+    ends = []
+    paragraphs = []
+    texts = []
+    for item in subtitles.subtitle_items():
+        starts.append(_pack_time(item.start_time))
+        ends.append(_pack_time(item.end_time))
+        paragraphs.append(1 if item.meta.get('new_paragraph') else 0)
+        text = item.text or u''
+        if not isinstance(text, unicode):
+            text = text.decode('utf-8')
+        texts.append(text.encode('utf-8'))
+    return pack_items(starts, ends, paragraphs, texts, subtitles.fully_synced)
+
+def pack_items(starts, ends, paragraphs, texts, fully_synced):
+    """Pack already split-up subtitle data into a bytestring.
+
+    texts should be a list of UTF-8 encoded bytestrings.
+    """
+    count = len(starts)
+    offsets = [0]
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+    flags = FLAG_FULLY_SYNCED if fully_synced else 0
+    return ''.join([
+        _HEADER.pack(MAGIC, FORMAT_VERSION, count, flags),
+        struct.pack('<%di' % count, *starts),
+        struct.pack('<%di' % count, *ends),
+        struct.pack('<%dB' % count, *paragraphs),
+        struct.pack('<%dI' % (count + 1), *offsets),
+    ] + texts)
+
+class PackedSubtitles(object):
+    """Read-only view of packed subtitle data.
+
+    Supports len(), indexing and slicing.  Items are returned as PackedItem
+    tuples.  Unsynced times are returned as None, to match the babelsubs
+    SubtitleLine tuples.
+    """
+    def __init__(self, data):
+        if len(data) < _HEADER.size:
+            raise PackedSubtitlesError("packed data too short")
+        magic, version, count, flags = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise PackedSubtitlesError("invalid magic: %r" % magic)
+        if version != FORMAT_VERSION:
+            raise PackedSubtitlesError("unknown format version: %s" % version)
+        self.data = data
+        self.count = count
+        self.fully_synced = bool(flags & FLAG_FULLY_SYNCED)
+        self._starts_pos = _HEADER.size
+        self._ends_pos = self._starts_pos + 4 * count
+        self._para_pos = self._ends_pos + 4 * count
+        self._offsets_pos = self._para_pos + count
+        self._strings_pos = self._offsets_pos + 4 * (count + 1)
+        if len(data) < self._strings_pos:
+            raise PackedSubtitlesError("packed data truncated")
+
+    def __len__(self):
+        return self.count
+
+    def _read_ints(self, fmt, pos, start, stop, itemsize=4):
+        n = stop - start
+        if n <= 0:
+            return ()
+        return struct.unpack_from('<%d%s' % (n, fmt), self.data,
+                                  pos + itemsize * start)
+
+    def _bounds(self, start, stop):
+        return slice(start, stop).indices(self.count)[:2]
+
+    def start_times(self, start=0, stop=None):
+        start, stop = self._bounds(start, stop)
+        return [_unpack_time(t) for t in
+                self._read_ints('i', self._starts_pos, start, stop)]
+
+    def end_times(self, start=0, stop=None):
+        start, stop = self._bounds(start, stop)
+        return [_unpack_time(t) for t in
+                self._read_ints('i', self._ends_pos, start, stop)]
+
+    def timings(self, start=0, stop=None):
+        """Get a list of (start_time, end_time) tuples."""
+        return zip(self.start_times(start, stop), self.end_times(start, stop))
+
+    def timing_summary(self):
+        """Get a TimingSummary for the subtitles.
+
+        The first start time comes from the first item that has a start time
+        or an end time, the last end time from the last item that has an end
+        time or a start time.
+        """
+        starts = self.start_times()
+        ends = self.end_times()
+        first_start_time = last_end_time = None
+        for start_time, end_time in zip(starts, ends):
+            if start_time is not None or end_time is not None:
+                first_start_time = (start_time if start_time is not None
+                                    else end_time)
+                break
+        for start_time, end_time in zip(reversed(starts), reversed(ends)):
+            if start_time is not None or end_time is not None:
+                last_end_time = (end_time if end_time is not None
+                                 else start_time)
+                break
+        speech_duration = sum(
+            end_time - start_time
+            for start_time, end_time in zip(starts, ends)
+            if start_time is not None and end_time is not None
+            and end_time > start_time)
+        return TimingSummary(first_start_time, last_end_time,
+                             speech_duration)
+
+    def texts(self, start=0, stop=None):
+        start, stop = self._bounds(start, stop)
+        if stop <= start:
+            return []
+        offsets = self._read_ints('I', self._offsets_pos, start, stop + 1)
+        base = self._strings_pos
+        return [
+            self.data[base+offsets[i]:base+offsets[i+1]].decode('utf-8')
+            for i in xrange(len(offsets) - 1)
+        ]
+
+    def items(self, start=0, stop=None):
+        start, stop = self._bounds(start, stop)
+        paragraphs = self._read_ints('B', self._para_pos, start, stop,
+                                     itemsize=1)
+        return [
+            PackedItem(start_time, end_time, text, bool(para))
+            for (start_time, end_time), text, para in zip(
+                self.timings(start, stop), self.texts(start, stop),
+                paragraphs)
+        ]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("slice steps not supported")
+            return self.items(index.start or 0, index.stop)
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.items(index, index+1)[0]
+
+    def __iter__(self):
+        return iter(self.items())
+
@@ -54,6 +54,9 @@ a nutshell:
 
 """
 
+from collections import namedtuple, OrderedDict
+
+from babelsubs.storage import SubtitleSet
 from django.db import transaction
 
 from videos.models import Video
@@ -64,6 +67,7 @@ from subtitles.models import (
 from subtitles import signals
 from subtitles import workflows
 from teams.signals import api_subtitles_edited
+from utils.translation import ALL_LANGUAGE_CODES
 
 # Utility Functions -----------------------------------------------------------
 def _strip_nones(d):
@@ -172,14 +176,17 @@ def _handle_outstanding_tasks(outstanding_tasks, version, team_video, committer,
                               complete):
     """Handle any existing tasks for this subtitle addition."""
     from teams.permissions import can_assign_task
+    from teams.search_indexes import TaskIndex
 
     language_code = version.language_code
 
     # There are tasks for this video.  If this version isn't published yet, it
     # belongs to those tasks, so update them.
     if version.visibility != 'public':
+        task_ids = list(outstanding_tasks.values_list('id', flat=True))
         outstanding_tasks.update(new_subtitle_version=version,
                                  language=language_code)
+        TaskIndex.queue_task_ids(task_ids)
 
     # There may be existing subtitle/translate tasks.
     outstanding_subtrans_tasks = (
@@ -373,13 +380,16 @@ def _timings_changed(subtitle_language, new_version):
     previous_version = new_version.previous_version()
     if previous_version is None:
         return False
-    new_timings = [(s.start_time, s.end_time)
-                   for s in new_version.get_subtitles()]
-    old_timings = [(s.start_time, s.end_time)
-                   for s in previous_version.get_subtitles()]
+    new_timings = new_version.get_packed_subtitles().timings()
+    old_timings = previous_version.get_packed_subtitles().timings()
     return new_timings != old_timings
 
 
+def _warm_rendition_cache(version):
+    if version.is_public():
+        from subtitles.tasks import warm_rendition_cache
+        warm_rendition_cache.delay(version.pk)
+
 def _add_subtitles(video, language_code, subtitles, title, description, author,
                    visibility, visibility_override, parents,
                    rollback_of_version_number, committer, created, note,
@@ -476,6 +486,104 @@ def _rollback_to(video, language_code, version_number, rollback_author):
     return version
 
 
+# keyword arguments from add_subtitles that can be used for bulk items
+_BULK_ITEM_ARGS = set([
+    'title', 'description', 'author', 'visibility', 'visibility_override',
+    'parents', 'committer', 'complete', 'created', 'note', 'origin',
+    'metadata', 'action',
+])
+
+def _prepare_bulk_item(item, author, committer, origin):
+    """Validate an item for add_subtitles_bulk.
+
+    Returns the kwargs to pass to _add_subtitles.  Raises an exception if the
+    item is invalid.
+    """
+    item = dict(item)
+    video = item.pop('video')
+    language_code = item.pop('language_code')
+    subtitles = item.pop('subtitles')
+    unknown_args = set(item) - _BULK_ITEM_ARGS
+    if unknown_args:
+        raise ValueError("Unknown arguments: %s" %
+                         ', '.join(sorted(unknown_args)))
+    if language_code not in ALL_LANGUAGE_CODES:
+        raise ValueError("Invalid language code: %s" % language_code)
+    # Parse the subtitles now so that bad data gets reported before we start
+    # writing to the DB.
+    if isinstance(subtitles, basestring):
+        subtitles = SubtitleSet(language_code, initial_data=subtitles)
+
+    item.setdefault('author', author)
+    item.setdefault('committer', committer)
+    item.setdefault('origin', origin)
+    action = _calc_action_for_add_subtitles(video, language_code,
+                                            item['author'],
+                                            item.pop('complete', None),
+                                            item.pop('action', None))
+    if action:
+        item['visibility'] = action.subtitle_visibility
+
+    kwargs = dict((name, None) for name in _BULK_ITEM_ARGS)
+    del kwargs['complete']
+    kwargs.update(item)
+    kwargs.update({
+        'video': video,
+        'language_code': language_code,
+        'subtitles': subtitles,
+        'action': action,
+        'rollback_of_version_number': None,
+    })
+    return kwargs
+
+def _add_subtitles_bulk_for_video(video, video_items, results):
+    """Add the subtitles for a single video for add_subtitles_bulk.
+
+    video_items is a list of (index, kwargs) tuples.  Results get stored in
+    the results list using the index.
+    """
+    added = []
+    try:
+        with transaction.commit_on_success():
+            for i, kwargs in video_items:
+                sid = transaction.savepoint()
+                try:
+                    version = _add_subtitles(**kwargs)
+                except Exception, e:
+                    transaction.savepoint_rollback(sid)
+                    results[i] = BulkAddResult(None, e)
+                else:
+                    transaction.savepoint_commit(sid)
+                    added.append((i, kwargs, version))
+    except Exception, e:
+        # The commit failed, so none of the versions were actually saved.
+        for i, kwargs, version in added:
+            results[i] = BulkAddResult(None, e)
+        return
+    if not added:
+        return
+
+    video.cache.invalidate()
+    last_versions = OrderedDict()
+    for i, kwargs, version in added:
+        results[i] = BulkAddResult(version, None)
+        last_versions[version.language_code] = version
+    for version in last_versions.values():
+        api_subtitles_edited.send(version)
+        _warm_rendition_cache(version)
+    for i, kwargs, version in added:
+        action = kwargs['action']
+        if action:
+            try:
+                action.perform(kwargs['author'], video,
+                               version.subtitle_language, version)
+            except Exception, e:
+                results[i] = BulkAddResult(version, e)
+
+    from videos.tasks import video_changed_tasks
+    video_changed_tasks.delay(video.pk)
+
+
 # Public API ------------------------------------------------------------------
 def add_subtitles(video, language_code, subtitles,
                   title=None, description=None, author=None,
@@ -548,8 +656,52 @@ def add_subtitles(video, language_code, subtitles,
     api_subtitles_edited.send(version)
     if action:
         action.perform(author, video, version.subtitle_language, version)
+    _warm_rendition_cache(version)
     return version
 
+BulkAddResult = namedtuple('BulkAddResult', 'version error')
+
+def add_subtitles_bulk(items, author=None, committer=None, origin=None):
+    """Add subtitles for many videos/languages at once.
+
+    items should be a list of dicts.  Each one needs "video",
+    "language_code", and "subtitles" keys, and can have any of the optional
+    keyword arguments to add_subtitles ("title", "description", "action",
+    "complete", "metadata", etc).  author, committer, and origin are used for
+    items that don't specify their own.
+
+    This works like calling add_subtitles for each item, but with less
+    overhead per item:
+
+    * All items are validated up front, before anything gets written.  This
+      includes parsing the subtitles and looking up the actions.
+    * Items are grouped by video.  Each video gets a single transaction, with
+      a savepoint for each item, so a bad item doesn't roll back the rest.
+    * The video cache is invalidated and video_changed_tasks is scheduled
+      once per video.  api_subtitles_edited is sent once per language, for the
+      last version added.
+
+    A failing item doesn't stop the import.  Returns a list of BulkAddResult
+    tuples, one for each item, in the same order as items.  version is the new
+    SubtitleVersion (or None if the item failed) and error is the exception
+    raised for the item (or None if it succeeded).  If the version was saved,
+    but performing the action failed afterwards, both will be set.
+    """
+    results = [None] * len(items)
+    by_video = OrderedDict()
+    for i, item in enumerate(items):
+        try:
+            kwargs = _prepare_bulk_item(item, author, committer, origin)
+        except Exception, e:
+            results[i] = BulkAddResult(None, e)
+        else:
+            video = kwargs['video']
+            by_video.setdefault(video.pk, (video, []))[1].append((i, kwargs))
+
+    for video, video_items in by_video.values():
+        _add_subtitles_bulk_for_video(video, video_items, results)
+    return results
+
 def _calc_action_for_add_subtitles(video, language_code, author, complete,
                                    action_name):
     # complete and action do similar things.  In _add_subtitles _add_subtitles
@@ -605,5 +757,6 @@ def rollback_to(video, language_code, version_number,
         version = _rollback_to(video, language_code, version_number,
                                rollback_author)
     video.cache.invalidate()
+    _warm_rendition_cache(version)
     return version
 
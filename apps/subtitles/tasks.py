@@ -0,0 +1,43 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from celery.task import task
+
+from subtitles import cache
+from subtitles.models import SubtitleVersion
+
+@task(ignore_result=True)
+def warm_rendition_cache(version_id):
+    try:
+        version = SubtitleVersion.objects.extant().get(pk=version_id)
+    except SubtitleVersion.DoesNotExist:
+        return
+    cache.warm_rendition_cache(version)
+
+@task(ignore_result=True)
+def backfill_timing_fields(version_ids):
+    """Fill in the timing fields for a batch of versions.
+
+    Versions that already have the fields set are skipped.
+    """
+    qs = (SubtitleVersion.objects.full()
+          .filter(id__in=version_ids, speech_duration__isnull=True)
+          .only('id', 'language_code', 'blob', 'serialized_subtitles',
+                'packed_subtitles'))
+    for version in qs:
+        version.update_timing_fields()
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from nose.tools import *
+
+from subtitles import pipeline
+from subtitles.models import SubtitleBlob, SubtitleVersion
+from utils.compress import compress
+from utils.factories import *
+
+class SubtitleBlobTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+
+    def refresh(self, version):
+        return SubtitleVersion.objects.get(pk=version.pk)
+
+    def test_identical_subtitles_share_blobs(self):
+        subs = SubtitleSetFactory(num_subs=5)
+        v1 = pipeline.add_subtitles(self.video, 'en', subs)
+        v2 = pipeline.add_subtitles(self.video, 'en', subs, title='New title')
+        assert_not_equal(v1.blob_id, None)
+        assert_equal(v1.blob_id, v2.blob_id)
+        assert_equal(SubtitleBlob.objects.count(), 1)
+        assert_equal(self.refresh(v2).get_subtitles(), subs)
+
+    def test_rollback_shares_blob(self):
+        v1 = pipeline.add_subtitles(self.video, 'en',
+                                    SubtitleSetFactory(num_subs=5))
+        pipeline.add_subtitles(self.video, 'en',
+                               SubtitleSetFactory(num_subs=2))
+        v3 = pipeline.rollback_to(self.video, 'en', 1)
+        assert_equal(v3.blob_id, v1.blob_id)
+
+    def test_legacy_versions(self):
+        subs = SubtitleSetFactory(num_subs=3)
+        v1 = pipeline.add_subtitles(self.video, 'en', subs)
+        SubtitleVersion.objects.filter(pk=v1.pk).update(
+            blob=None, serialized_subtitles=compress(subs.to_xml()))
+        assert_equal(self.refresh(v1).get_subtitles(), subs)
+
+    def test_delta(self):
+        base_xml = ''.join('line %d\n' % i for i in xrange(100))
+        xml = base_xml.replace('line 50\n', 'changed\n') + 'extra line\n'
+        delta = SubtitleBlob._make_delta(base_xml, xml)
+        assert_equal(SubtitleBlob._apply_delta(base_xml, delta), xml)
+
+    @override_settings(SUBTITLE_BLOB_DELTAS=True)
+    def test_delta_chain(self):
+        subs = SubtitleSetFactory(num_subs=200)
+        v1 = pipeline.add_subtitles(self.video, 'en', subs)
+        subs.append_subtitle(500000, 501000, 'new sub')
+        v2 = pipeline.add_subtitles(self.video, 'en', subs)
+        v2 = self.refresh(v2)
+        assert_equal(v2.blob.base_id, v1.blob_id)
+        assert_equal(v2.blob.depth, 1)
+        assert_equal(v2.get_subtitles(), subs)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from nose.tools import *
+import babelsubs
+import mock
+
+from subtitles import cache
+from subtitles import pipeline
+from subtitles.models import SubtitleVersion
+from utils import test_utils
+from utils.factories import *
+
+class ParsedSubtitleCacheTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        self.subs = SubtitleSetFactory(num_subs=5)
+        self.version = pipeline.add_subtitles(self.video, 'en', self.subs)
+
+    def load_subtitles(self):
+        return SubtitleVersion.objects.get(pk=self.version.pk).get_subtitles()
+
+    def test_cache(self):
+        with mock.patch('subtitles.models.load_from') as mock_load_from:
+            mock_load_from.return_value.to_internal.return_value = self.subs
+            assert_equal(self.load_subtitles(), self.subs)
+            assert_equal(self.load_subtitles(), self.subs)
+        assert_equal(mock_load_from.call_count, 1)
+
+    def test_returns_copies(self):
+        subs = self.load_subtitles()
+        subs.append_subtitle(10000, 11000, 'extra')
+        assert_equal(len(self.load_subtitles()), 5)
+
+    def test_invalidate_on_visibility_change(self):
+        self.load_subtitles()
+        assert_equal(len(cache.parsed_subtitle_cache), 1)
+        SubtitleVersion.objects.get(pk=self.version.pk).unpublish()
+        assert_equal(len(cache.parsed_subtitle_cache), 0)
+
+class RenditionCacheTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        self.version = pipeline.add_subtitles(self.video, 'en',
+                                              SubtitleSetFactory(num_subs=5))
+
+    def get_rendition(self, format='srt'):
+        version = SubtitleVersion.objects.get(pk=self.version.pk)
+        return cache.get_rendition(version, format)
+
+    def test_get_rendition(self):
+        assert_equal(self.get_rendition().content,
+                     babelsubs.to(self.version.get_subtitles(), 'srt'))
+
+    def test_cache(self):
+        with mock.patch('subtitles.cache._render') as mock_render:
+            mock_render.return_value = 'rendered'
+            assert_equal(self.get_rendition().content, 'rendered')
+            assert_equal(self.get_rendition().content, 'rendered')
+            # clear the in-process cache, we should use memcached next
+            cache.rendition_cache.clear()
+            assert_equal(self.get_rendition().content, 'rendered')
+        assert_equal(mock_render.call_count, 1)
+
+    def test_etag(self):
+        rendition = self.get_rendition()
+        assert_equal(rendition.etag,
+                     cache.rendition_etag(self.version, 'srt'))
+        assert_not_equal(rendition.etag,
+                         cache.rendition_etag(self.version, 'vtt'))
+
+    def test_max_item_size(self):
+        with mock.patch('subtitles.cache.RENDITION_MAX_ITEM_BYTES', 10):
+            self.get_rendition()
+            cache.rendition_cache.clear()
+            with mock.patch('subtitles.cache._render') as mock_render:
+                mock_render.return_value = 'rendered'
+                self.get_rendition()
+        # The rendition was too big for memcached, so we needed to render
+        # it again
+        assert_equal(mock_render.call_count, 1)
+
+    def test_warm_rendition_cache(self):
+        cache.warm_rendition_cache(self.version, ['srt', 'vtt'])
+        with mock.patch('subtitles.cache._render') as mock_render:
+            self.get_rendition('srt')
+            self.get_rendition('vtt')
+        assert_equal(mock_render.call_count, 0)
+
+    def test_warm_on_publish(self):
+        version = pipeline.add_subtitles(self.video, 'en',
+                                         SubtitleSetFactory(num_subs=5),
+                                         visibility='private')
+        test_utils.warm_rendition_cache.reset_mock()
+        version.publish()
+        test_utils.warm_rendition_cache.delay.assert_called_with(version.pk)
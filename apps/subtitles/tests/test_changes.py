@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from subtitles import changes
+from subtitles import pipeline
+from subtitles.models import SubtitleVersion
+from utils.factories import *
+
+class SequenceChangeTest(TestCase):
+    def test_sequence_change(self):
+        assert_equal(changes.sequence_change([], []), 0.0)
+        assert_equal(changes.sequence_change([1, 2, 3], [1, 2, 3]), 0.0)
+        assert_equal(changes.sequence_change([1], [2, 3]), 1.0)
+        assert_almost_equal(changes.sequence_change([1], [1, 2]), 1/3.0)
+        assert_equal(changes.sequence_change([1, 2, 3, 4], [1, 5, 3, 4]),
+                     0.25)
+
+class StoredChangesTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        self.v1 = pipeline.add_subtitles(self.video, 'en', [
+            (0, 1000, 'Hello there'),
+        ])
+        self.v2 = pipeline.add_subtitles(self.video, 'en', [
+            (0, 1000, 'Hello there'),
+            (2000, 3000, 'How are you?'),
+        ])
+
+    def test_changes_stored_on_create(self):
+        v2 = SubtitleVersion.objects.get(pk=self.v2.pk)
+        assert_almost_equal(v2.time_change_ratio, 1/3.0)
+        assert_almost_equal(v2.text_change_ratio, 1/3.0)
+        assert_equal(v2.changes_base_pk, self.v1.pk)
+        with mock.patch('subtitles.changes.calc_changes') as calc_changes:
+            v2.get_changes()
+        assert_false(calc_changes.called)
+
+    def test_legacy_versions(self):
+        SubtitleVersion.objects.filter(pk=self.v2.pk).update(
+            time_change_ratio=None, text_change_ratio=None,
+            changes_base_pk=None)
+        v2 = SubtitleVersion.objects.get(pk=self.v2.pk)
+        assert_almost_equal(v2.get_changes()[0], 1/3.0)
+        # the changes should be saved after the first call
+        v2 = SubtitleVersion.objects.get(pk=self.v2.pk)
+        assert_equal(v2.changes_base_pk, self.v1.pk)
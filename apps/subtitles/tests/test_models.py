@@ -30,7 +30,9 @@ from babelsubs.storage import SubtitleSet
 
 from auth.models import CustomUser as User
 from subtitles import pipeline
-from subtitles.models import SubtitleLanguage, SubtitleVersion
+from subtitles.models import (
+    SubtitleLanguage, SubtitleVersion, SubtitleVersionAncestor
+)
 from subtitles.tests.utils import (
     make_video, make_video_2, make_video_3, make_sl, refresh, ids, parent_ids,
     ancestor_ids
@@ -631,6 +633,50 @@ class TestHistory(TestCase):
         self.assertEqual(sv2.lineage, {'en': 1})
         self.assertEqual(sv3.lineage, {'en': 2})
 
+    def test_descendants(self):
+        e1 = self.sl_en.add_version()
+        e2 = self.sl_en.add_version()
+        f1 = self.sl_fr.add_version(parents=[e1])
+        d1 = self.sl_de.add_version(parents=[f1])
+
+        self.assertEqual(ids(e1.get_descendants()), ids([e2, f1, d1]))
+        self.assertEqual(ids(f1.get_descendants()), ids([d1]))
+        self.assertEqual(ids(d1.get_descendants()), ids([]))
+
+    def test_ancestors_without_index(self):
+        # Versions that haven't been indexed should fall back to walking the
+        # parents relation
+        e1 = self.sl_en.add_version()
+        e2 = self.sl_en.add_version()
+        f1 = self.sl_fr.add_version(parents=[e2])
+        SubtitleVersionAncestor.objects.all().delete()
+
+        self.assertEqual(ids(refresh(f1).get_ancestors()), ids([e1, e2]))
+        # new versions should still get a complete index
+        f2 = self.sl_fr.add_version()
+        self.assertEqual(ids(SubtitleVersion.objects.full().filter(
+            descendant_links__descendant=f2)), ids([e1, e2, f1]))
+
+    def test_dependent_languages(self):
+        e1 = self.sl_en.add_version()
+        f1 = self.sl_fr.add_version(parents=[e1])
+        self.sl_de.add_version(parents=[f1])
+        self.sl_cy.add_version()
+
+        self.assertEqual(
+            set(sl.language_code for sl in
+                self.sl_en.get_dependent_subtitle_languages()),
+            set(['fr', 'de']))
+        self.assertEqual(
+            [sl.language_code for sl in
+             self.sl_en.get_dependent_subtitle_languages(direct=True)],
+            ['fr'])
+        self.sl_fr.fork()
+        self.assertEqual(
+            [sl.language_code for sl in
+             self.sl_en.get_dependent_subtitle_languages()],
+            ['de'])
+
     def test_multiple_parents(self):
         """Test the ancestry, parentage, and lineage for a merged history."""
 
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from django.test import TestCase
+from nose.tools import *
+
+from babelsubs.storage import SubtitleSet
+
+from subtitles import packed
+from subtitles import pipeline
+from subtitles import tasks
+from subtitles.models import SubtitleVersion
+from utils.factories import *
+
+class PackedSubtitlesTest(TestCase):
+    def setUp(self):
+        self.subtitles = SubtitleSet('en')
+        self.subtitles.append_subtitle(0, 1000, u'first')
+        self.subtitles.append_subtitle(1000, 2000, u'secönd',
+                                       new_paragraph=True)
+        self.subtitles.append_subtitle(None, None, u'third')
+
+    def test_round_trip(self):
+        p = packed.PackedSubtitles(packed.pack_subtitles(self.subtitles))
+        assert_equal(len(p), 3)
+        assert_equal(p.timings(), [(0, 1000), (1000, 2000), (None, None)])
+        assert_equal(p.texts(), [u'first', u'secönd', u'third'])
+        assert_equal([item.new_paragraph for item in p],
+                     [False, True, False])
+        assert_false(p.fully_synced)
+
+    def test_ranges(self):
+        p = packed.PackedSubtitles(packed.pack_subtitles(self.subtitles))
+        assert_equal(p[1], packed.PackedItem(1000, 2000, u'secönd', True))
+        assert_equal(p[-1].text, u'third')
+        assert_equal([item.text for item in p[1:]], [u'secönd', u'third'])
+        assert_equal(p.timings(0, 1), [(0, 1000)])
+        assert_equal(p.texts(5, 10), [])
+        assert_raises(IndexError, p.__getitem__, 3)
+
+    def test_empty(self):
+        p = packed.PackedSubtitles(packed.pack_subtitles(SubtitleSet('en')))
+        assert_equal(len(p), 0)
+        assert_equal(p.items(), [])
+        assert_true(p.fully_synced)
+
+    def test_timing_summary(self):
+        self.subtitles.append_subtitle(3000, None, u'fourth')
+        p = packed.PackedSubtitles(packed.pack_subtitles(self.subtitles))
+        assert_equal(p.timing_summary(),
+                     packed.TimingSummary(0, 3000, 2000))
+
+    def test_timing_summary_unsynced(self):
+        subtitles = SubtitleSet('en')
+        subtitles.append_subtitle(None, None, u'first')
+        p = packed.PackedSubtitles(packed.pack_subtitles(subtitles))
+        assert_equal(p.timing_summary(),
+                     packed.TimingSummary(None, None, 0))
+
+    def test_invalid_data(self):
+        assert_raises(packed.PackedSubtitlesError, packed.PackedSubtitles,
+                      'foo')
+        data = packed.pack_subtitles(self.subtitles)
+        assert_raises(packed.PackedSubtitlesError, packed.PackedSubtitles,
+                      'XXXX' + data[4:])
+        assert_raises(packed.PackedSubtitlesError, packed.PackedSubtitles,
+                      data[:20])
+
+class SubtitleVersionPackedTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        self.version = pipeline.add_subtitles(
+            self.video, 'en', SubtitleSetFactory(num_subs=5))
+
+    def test_set_subtitles_packs(self):
+        version = SubtitleVersion.objects.get(pk=self.version.pk)
+        assert_not_equal(version.packed_subtitles, '')
+        p = version.get_packed_subtitles()
+        assert_equal(len(p), 5)
+        assert_equal(p[4].text, 'Sub 4')
+        assert_equal(p.timings(), [(i*1000, i*1000 + 999) for i in range(5)])
+        # we shouldn't have needed to parse the DFXP
+        assert_equal(version._subtitles, None)
+
+    def test_unconverted_versions(self):
+        SubtitleVersion.objects.filter(pk=self.version.pk).update(
+            packed_subtitles='')
+        version = SubtitleVersion.objects.get(pk=self.version.pk)
+        assert_equal(version.get_subtitle_count(), 5)
+        assert_true(version.is_synced())
+        version.update_packed_subtitles()
+        version = SubtitleVersion.objects.get(pk=self.version.pk)
+        assert_not_equal(version.packed_subtitles, '')
+        assert_equal(version.get_subtitle_count(), 5)
+
+class SubtitleVersionTimingTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        self.version = pipeline.add_subtitles(
+            self.video, 'en', SubtitleSetFactory(num_subs=5))
+
+    def check_timing(self, version):
+        assert_equal(version.first_start_time, 0)
+        assert_equal(version.last_end_time, 4999)
+        assert_equal(version.speech_duration, 5 * 999)
+        assert_equal(version.fully_synced, True)
+
+    def test_set_subtitles(self):
+        version = SubtitleVersion.objects.get(pk=self.version.pk)
+        self.check_timing(version)
+        assert_equal(version.get_timing_summary(),
+                     packed.TimingSummary(0, 4999, 5 * 999))
+        assert_true(version.is_synced())
+        # we shouldn't have needed to unpack the subtitles
+        assert_equal(version._packed_subtitles, None)
+
+    def test_not_backfilled(self):
+        SubtitleVersion.objects.filter(pk=self.version.pk).update(
+            first_start_time=None, last_end_time=None, speech_duration=None,
+            fully_synced=None)
+        version = SubtitleVersion.objects.get(pk=self.version.pk)
+        assert_equal(version.get_timing_summary(),
+                     packed.TimingSummary(0, 4999, 5 * 999))
+        assert_true(version.is_synced())
+
+    def test_backfill(self):
+        SubtitleVersion.objects.filter(pk=self.version.pk).update(
+            first_start_time=None, last_end_time=None, speech_duration=None,
+            fully_synced=None)
+        tasks.backfill_timing_fields([self.version.pk])
+        self.check_timing(SubtitleVersion.objects.get(pk=self.version.pk))
@@ -24,6 +24,7 @@ from __future__ import absolute_import
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 from nose.tools import *
+import mock
 
 from babelsubs.storage import SubtitleSet, SubtitleLine
 
@@ -798,3 +799,62 @@ class TestRollbacks(TestCase):
                 pt1 and pt2 and pl1 and pl2 and ja1 and ja2 and ja3)
 
 
+
+class TestBulkAdd(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+        self.video2 = VideoFactory()
+        self.user = UserFactory()
+        test_utils.video_changed_tasks.delay.reset_mock()
+
+    def test_add(self):
+        subs = SubtitleSetFactory(num_subs=2)
+        results = pipeline.add_subtitles_bulk([
+            {'video': self.video, 'language_code': 'en', 'subtitles': subs},
+            {'video': self.video, 'language_code': 'fr',
+             'subtitles': subs.to_xml(), 'title': 'French title'},
+            {'video': self.video2, 'language_code': 'en', 'subtitles': subs},
+        ], author=self.user)
+        assert_equal([r.error for r in results], [None, None, None])
+        en, fr, en2 = [r.version for r in results]
+        assert_equal(en.video, self.video)
+        assert_equal(en.author, self.user)
+        assert_equal(en.get_subtitles(), subs)
+        assert_equal(fr.language_code, 'fr')
+        assert_equal(fr.title, 'French title')
+        assert_equal(en2.video, self.video2)
+
+    def test_item_failures(self):
+        results = pipeline.add_subtitles_bulk([
+            {'video': self.video, 'language_code': 'en',
+             'subtitles': SubtitleSetFactory()},
+            {'video': self.video, 'language_code': 'invalid-code',
+             'subtitles': SubtitleSetFactory()},
+            {'video': self.video, 'language_code': 'fr',
+             'subtitles': SubtitleSetFactory(), 'bad_arg': 1},
+            {'video': self.video, 'language_code': 'de',
+             'subtitles': SubtitleSetFactory(),
+             'parents': [('en', 100)]},
+        ])
+        assert_not_equal(results[0].version, None)
+        assert_equal(results[0].error, None)
+        for result in results[1:]:
+            assert_equal(result.version, None)
+            assert_not_equal(result.error, None)
+        # the failing items shouldn't affect the one that worked
+        assert_equal(SubtitleVersion.objects.filter(video=self.video).count(),
+                     1)
+        assert_equal(self.video.subtitle_language('de'), None)
+
+    def test_coalesce_tasks(self):
+        pipeline.add_subtitles_bulk([
+            {'video': self.video, 'language_code': 'en', 'subtitles': []},
+            {'video': self.video, 'language_code': 'en', 'subtitles': []},
+            {'video': self.video, 'language_code': 'fr', 'subtitles': []},
+            {'video': self.video2, 'language_code': 'en', 'subtitles': []},
+        ])
+        call_args = test_utils.video_changed_tasks.delay.call_args_list
+        assert_equal(sorted(call_args), sorted([
+            mock.call(self.video.pk),
+            mock.call(self.video2.pk),
+        ]))
@@ -28,7 +28,8 @@ from messages.forms import TeamAdminPageMessageForm
 from teams.models import (
     Team, TeamMember, TeamVideo, Workflow, Task, Setting, MembershipNarrowing,
     Project, TeamLanguagePreference, TeamNotificationSetting, BillingReport,
-    Partner, Application, ApplicationInvalidException, Invite, BillingRecord
+    Partner, Application, ApplicationInvalidException, Invite, BillingRecord,
+    CallbackDelivery
 )
 from utils.text import fmt
 from videos.models import SubtitleLanguage
@@ -291,6 +292,13 @@ class BillingRecordAdmin(admin.ModelAdmin):
                      'new_subtitle_version', 'video', 'project',
     )
 
+class CallbackDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('notification_setting', 'event_name', 'status',
+                    'attempts', 'created', 'finished', 'response_status',
+                    'latency')
+    list_filter = ('status', 'created')
+    raw_id_fields = ('notification_setting',)
+
 
 admin.site.register(TeamMember, TeamMemberAdmin)
 admin.site.register(Team, TeamAdmin)
@@ -307,3 +315,4 @@ admin.site.register(Partner)
 admin.site.register(Invite, InviteAdmin)
 admin.site.register(Application, ApplicationAdmin)
 admin.site.register(BillingRecord, BillingRecordAdmin)
+admin.site.register(CallbackDelivery, CallbackDeliveryAdmin)
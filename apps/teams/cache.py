@@ -16,6 +16,21 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+"""teams.cache -- Cached team data
+
+This module handles two kinds of caching:
+
+  - Language preferences, which are stored in memcached.
+  - Membership snapshots, which store a user's role and narrowings for a
+    team.  Snapshots are stored in the team's CacheGroup and memoized in a
+    thread-local dict, so that all Team instances used while handling a
+    request or running a task share them.  The memo is cleared at the start
+    and end of each request/task (see teams.signalhandlers) and whenever a
+    TeamMember or MembershipNarrowing changes.
+"""
+
+import threading
+
 from django.core.cache import cache
 
 TIMEOUT = 60 * 60 * 24 * 5 # 5 days
@@ -26,7 +41,7 @@ def _team_readable_langs_id(team):
     return u"%s-readable-langs" % team.pk
 
 def _team_writable_langs_id(team):
-    return u"%s-readable-langs" % team.pk
+    return u"%s-writable-langs" % team.pk
 
 def _team_preferred_langs_id(team):
     return u"%s-preferred-langs" % team.pk
@@ -36,6 +51,7 @@ def invalidate_lang_preferences(team):
     cache.delete(_team_readable_langs_id(team), version=CACHE_VERSION)
     cache.delete(_team_writable_langs_id(team), version=CACHE_VERSION)
     cache.delete(_team_preferred_langs_id(team), version=CACHE_VERSION)
+    clear_memo(team.pk)
 
 
 def get_readable_langs(team):
@@ -65,3 +81,113 @@ def get_preferred_langs(team):
         cache.set(cache_key, value, TIMEOUT, version=CACHE_VERSION)
     return value
 
+
+_memo = threading.local()
+
+def _get_memo():
+    try:
+        return _memo.values
+    except AttributeError:
+        _memo.values = {}
+        return _memo.values
+
+def clear_memo(team_id=None):
+    """Clear memoized membership snapshots and language preferences.
+
+    Args:
+        team_id: only clear values for this team.  If None, clear
+            everything.
+    """
+    memo = _get_memo()
+    if team_id is None:
+        memo.clear()
+    else:
+        for key in [k for k in memo if k[1] == team_id]:
+            del memo[key]
+
+def _memoize(key, work_func, *args):
+    memo = _get_memo()
+    if key not in memo:
+        memo[key] = work_func(*args)
+    return memo[key]
+
+def get_readable_langs_memoized(team):
+    return _memoize(('readable-langs', team.pk), get_readable_langs, team)
+
+def get_writable_langs_memoized(team):
+    return _memoize(('writable-langs', team.pk), get_writable_langs, team)
+
+class MembershipSnapshot(object):
+    """A user's membership in a team
+
+    Attributes:
+        team: Team object
+        member: TeamMember object, or None if the user isn't a member
+        role: the member's role, or ROLE_OUTSIDER
+        project_narrowings: set of project ids the member is narrowed to
+        language_narrowings: set of language codes the member is narrowed to
+    """
+    def __init__(self, team, member, project_narrowings,
+                 language_narrowings):
+        from teams.permissions_const import ROLE_OUTSIDER
+        self.team = team
+        self.member = member
+        self.role = member.role if member else ROLE_OUTSIDER
+        self.project_narrowings = set(project_narrowings)
+        self.language_narrowings = set(language_narrowings)
+
+    def has_narrowings(self):
+        return bool(self.project_narrowings or self.language_narrowings)
+
+    @property
+    def readable_langs(self):
+        return get_readable_langs_memoized(self.team)
+
+    @property
+    def writable_langs(self):
+        return get_writable_langs_memoized(self.team)
+
+def _calc_membership_data(team, user):
+    from teams.models import TeamMember
+    try:
+        member = TeamMember.objects.get(team=team, user=user)
+    except TeamMember.DoesNotExist:
+        return (None, [], [])
+    project_narrowings = []
+    language_narrowings = []
+    for project_id, language in member.narrowings.values_list('project_id',
+                                                              'language'):
+        if project_id:
+            project_narrowings.append(project_id)
+        if language:
+            language_narrowings.append(language)
+    return (member, project_narrowings, language_narrowings)
+
+def _make_snapshot(team, user):
+    cache_key = 'membership:{0}'.format(user.id)
+    data = team.cache.get(cache_key)
+    if data is None:
+        data = _calc_membership_data(team, user)
+        team.cache.set(cache_key, data)
+    member, project_narrowings, language_narrowings = data
+    if member is not None:
+        # avoid queries when code accesses member.team or member.user
+        member.team = team
+        member.user = user
+    return MembershipSnapshot(team, member, project_narrowings,
+                              language_narrowings)
+
+def get_membership(team, user):
+    """Get a MembershipSnapshot for a user
+
+    Snapshots are shared between all Team instances for the same team in
+    the current request/task.
+    """
+    if user is None or not user.is_authenticated():
+        return MembershipSnapshot(team, None, [], [])
+    return _memoize(('membership', team.pk, user.id), _make_snapshot, team,
+                    user)
+
+def forget_membership(team, user):
+    """Forget the memoized MembershipSnapshot for a user."""
+    _get_memo().pop(('membership', team.pk, user.id), None)
@@ -0,0 +1,114 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from datetime import datetime, timedelta
+from optparse import make_option
+import csv
+import os
+import resource
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auth.models import CustomUser as User
+from teams.models import BillingRecord, BillingReportGenerator, Team
+from utils import codes
+from videos.models import Video
+
+class Command(BaseCommand):
+    help = ('Benchmark billing report generation on a synthetic dataset.  '
+            'The data is created inside a transaction that gets rolled '
+            'back at the end.')
+    option_list = BaseCommand.option_list + (
+        make_option('--records', dest='records', type='int',
+                    default=1000000, help='Number of billing records'),
+        make_option('--records-per-video', dest='records_per_video',
+                    type='int', default=5,
+                    help='Billing records for each video'),
+        make_option('--batch-size', dest='batch_size', type='int',
+                    default=5000, help='Rows per bulk insert'),
+    )
+
+    @transaction.commit_manually
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stdout.write("warning: DEBUG is enabled, so every query "
+                              "is stored in memory\n")
+        try:
+            team = self.create_data(options)
+            self.run_benchmark(team)
+        finally:
+            transaction.rollback()
+
+    def create_data(self, options):
+        start_time = time.time()
+        prefix = 'bench%s-' % codes.make_code(32)
+        user = User.objects.create(username='billing-benchmark-%s' %
+                                   codes.make_code())
+        team = Team.objects.create(name='Billing benchmark',
+                                   slug='billing-benchmark-%s' %
+                                   codes.make_code())
+        video_count = ((options['records'] - 1) //
+                       options['records_per_video']) + 1
+        created = datetime(2015, 1, 1)
+        for start in xrange(0, video_count, options['batch_size']):
+            end = min(start + options['batch_size'], video_count)
+            Video.objects.bulk_create([
+                Video(video_id='%s%d' % (prefix, i),
+                      title='Benchmark video %d' % i)
+                for i in xrange(start, end)
+            ])
+        video_ids = list(Video.objects.filter(video_id__startswith=prefix)
+                         .order_by('id').values_list('id', flat=True))
+        records = []
+        for i in xrange(options['records']):
+            records.append(BillingRecord(
+                video_id=video_ids[i // options['records_per_video']],
+                minutes=1.5, is_original=False, team=team,
+                created=created + timedelta(seconds=i), source='benchmark',
+                user=user))
+            if len(records) >= options['batch_size']:
+                BillingRecord.objects.bulk_create(records)
+                records = []
+        if records:
+            BillingRecord.objects.bulk_create(records)
+        self.stdout.write("created %d records for %d videos in %0.1fs\n" %
+                          (options['records'], len(video_ids),
+                           time.time() - start_time))
+        return team
+
+    def run_benchmark(self, team):
+        start_memory = self.max_rss()
+        start_time = time.time()
+        all_records = BillingRecord.objects.filter(team=team)
+        row_count = 0
+        with open(os.devnull, 'w') as f:
+            writer = csv.writer(f)
+            for row in BillingReportGenerator(all_records):
+                writer.writerow(row)
+                row_count += 1
+        self.stdout.write(
+            "generated %d rows in %0.1fs (max RSS grew by %0.1fMB)\n" % (
+                row_count, time.time() - start_time,
+                (self.max_rss() - start_memory) / 1024.0))
+
+    def max_rss(self):
+        # ru_maxrss is in KB on linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
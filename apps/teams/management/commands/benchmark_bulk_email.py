@@ -0,0 +1,109 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from optparse import make_option
+import tempfile
+import time
+
+from django.conf import settings
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+
+from auth.models import CustomUser as User
+from teams.models import Team, TeamMember
+from utils import send_templated_email
+from utils.bulkemail import send_templated_email_bulk
+
+BACKENDS = {
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+}
+
+class Command(BaseCommand):
+    help = ('Benchmark send_templated_email_bulk against calling '
+            'send_templated_email for each recipient.  Emails are sent '
+            'with the locmem or file email backend, nothing gets sent to '
+            'the mail server.')
+    option_list = BaseCommand.option_list + (
+        make_option('--recipients', dest='recipients', type='int',
+                    default=10000, help='Number of recipients'),
+        make_option('--backend', dest='backend', default='locmem',
+                    help='Email backend to use (locmem or file)'),
+        make_option('--file-path', dest='file_path', default=None,
+                    help='Directory for the file backend (default: '
+                    'a temp directory)'),
+        make_option('--skip-single', dest='skip_single',
+                    action='store_true', default=False,
+                    help="Don't run the send_templated_email benchmark"),
+    )
+
+    def handle(self, *args, **options):
+        if options['backend'] not in BACKENDS:
+            raise CommandError("Unknown backend: %s" % options['backend'])
+        # send_templated_email() always uses the default backend, so we
+        # need to change the settings rather than passing in a connection.
+        settings.EMAIL_BACKEND = BACKENDS[options['backend']]
+        settings.EMAIL_FILE_PATH = (options['file_path'] or
+                                    tempfile.mkdtemp(prefix='bulk-email-'))
+        if options['backend'] == 'file':
+            self.stdout.write("writing emails to %s\n" %
+                              settings.EMAIL_FILE_PATH)
+
+        # Unsaved objects are enough to render the template
+        team = Team(name='Bulk email benchmark', slug='bulk-email-benchmark')
+        new_member = User(username='new-member', first_name='New',
+                          last_name='Member', email='new@example.com')
+        recipients = [
+            User(username='user%d' % i, first_name='User', last_name=str(i),
+                 email='user%d@example.com' % i, notify_by_email=True)
+            for i in xrange(options['recipients'])
+        ]
+        template_name = 'messages/email/team-new-member.html'
+        subject = 'Bulk email benchmark'
+
+        def context():
+            return {
+                'team': team,
+                'new_member': new_member,
+                'role': TeamMember.ROLE_CONTRIBUTOR,
+            }
+
+        def send_single():
+            for user in recipients:
+                body_dict = context()
+                body_dict['user'] = user
+                send_templated_email(user, subject, template_name, body_dict)
+
+        def send_bulk():
+            send_templated_email_bulk(recipients, subject, template_name,
+                                      context())
+
+        if not options['skip_single']:
+            self.run_benchmark('send_templated_email', send_single)
+        self.run_benchmark('send_templated_email_bulk', send_bulk)
+
+    def run_benchmark(self, name, func):
+        mail.outbox = []
+        start_time = time.time()
+        func()
+        duration = time.time() - start_time
+        count = len(mail.outbox) if hasattr(mail, 'outbox') else None
+        self.stdout.write("%s: %0.2fs (%0.0f emails/sec)\n" % (
+            name, duration,
+            (count if count else 0) / duration if duration else 0))
+        mail.outbox = []
@@ -16,10 +16,10 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 from collections import defaultdict
-from itertools import groupby
 from math import ceil
 import csv
 import datetime
+import json
 import logging
 
 from django.conf import settings
@@ -50,12 +50,15 @@ from teams.permissions_const import (
     TEAM_PERMISSIONS, PROJECT_PERMISSIONS, ROLE_OWNER, ROLE_ADMIN, ROLE_MANAGER,
     ROLE_CONTRIBUTOR
 )
+from teams import notifications
 from teams import tasks
 from teams import workflows
 from teams.signals import api_subtitles_approved, api_subtitles_rejected
 from utils import DEFAULT_PROTOCOL
+from utils import codes
 from utils import translation
 from utils.amazon import S3EnabledImageField, S3EnabledFileField
+from utils.metrics import Histogram, Meter
 from utils.panslugify import pan_slugify
 from utils.searching import get_terms
 from utils.text import fmt
@@ -286,17 +289,13 @@ class Team(models.Model):
     objects = TeamManager()
     all_objects = models.Manager() # For accessing deleted teams, if necessary.
 
-    cache = ModelCacheManager()
+    cache = ModelCacheManager(local_cache=True)
 
     class Meta:
         ordering = ['name']
         verbose_name = _(u'Team')
         verbose_name_plural = _(u'Teams')
 
-    def __init__(self, *args, **kwargs):
-        models.Model.__init__(self, *args, **kwargs)
-        self._member_cache = {}
-
     def save(self, *args, **kwargs):
         creating = self.pk is None
         super(Team, self).save(*args, **kwargs)
@@ -452,15 +451,15 @@ class Team(models.Model):
         """Get a TeamMember object for a user or None."""
         if not user.is_authenticated():
             return None
+        return self.get_membership(user).member
 
-        if user.id in self._member_cache:
-            return self._member_cache[user.id]
-        try:
-            member = self.members.get(user=user)
-        except TeamMember.DoesNotExist:
-            member = None
-        self._member_cache[user.id] = member
-        return member
+    def get_membership(self, user):
+        """Get a MembershipSnapshot for a user.
+
+        See teams.cache for details.
+        """
+        from teams.cache import get_membership
+        return get_membership(self, user)
 
     def user_is_member(self, user):
         members = self.cache.get('members')
@@ -470,10 +469,8 @@ class Team(models.Model):
         return user.id in members
 
     def uncache_member(self, user):
-        try:
-            del self._member_cache[user.id]
-        except KeyError:
-            pass
+        from teams.cache import forget_membership
+        forget_membership(self, user)
 
     def user_can_view_videos(self, user):
         return self.is_visible or self.user_is_member(user)
@@ -1025,10 +1022,12 @@ class TeamVideo(models.Model):
         # these imports are here to avoid circular imports, hacky
         from teams.signals import api_teamvideo_new
         from teams.signals import video_moved_from_team_to_team
+        from teams.search_indexes import TaskIndex
         from videos import metadata_manager
         # For now, we'll just delete any tasks associated with the moved video.
         if not within_team:
             self.task_set.update(deleted=True)
+            TaskIndex.queue_tasks(self.task_set.all())
 
             # We move the video by just switching the team, instead of deleting and
             # recreating it.
@@ -1305,14 +1304,6 @@ class TeamMember(models.Model):
     def __unicode__(self):
         return u'%s' % self.user
 
-    def save(self, *args, **kwargs):
-        super(TeamMember, self).save(*args, **kwargs)
-        Team.cache.invalidate_by_pk(self.team_id)
-
-    def delete(self):
-        super(TeamMember, self).delete()
-        Team.cache.invalidate_by_pk(self.team_id)
-
     def project_narrowings(self):
         """Return any project narrowings applied to this member."""
         return self.narrowings.filter(project__isnull=False)
@@ -1378,8 +1369,11 @@ def clear_tasks(sender, instance, *args, **kwargs):
     Used when deleting a user from a team.
 
     """
+    from teams.search_indexes import TaskIndex
     tasks = instance.team.task_set.incomplete().filter(assignee=instance.user)
+    task_ids = list(tasks.values_list('id', flat=True))
     tasks.update(assignee=None)
+    TaskIndex.queue_task_ids(task_ids)
 
 pre_delete.connect(clear_tasks, TeamMember, dispatch_uid='teams.members.clear-tasks-on-delete')
 
@@ -1426,11 +1420,6 @@ class MembershipNarrowing(models.Model):
             assert not duplicate_exists, "Duplicate project narrowing detected!"
 
         super(MembershipNarrowing, self).save(*args, **kwargs)
-        Team.cache.invalidate_by_pk(self.member.team_id)
-
-    def delete(self):
-        super(MembershipNarrowing, self).delete()
-        Team.cache.invalidate_by_pk(self.member.team_id)
 
 class TeamSubtitleNote(SubtitleNoteBase):
     team = models.ForeignKey(Team, related_name='+')
@@ -2704,8 +2693,8 @@ class TeamLanguagePreferenceManager(models.Manager):
         This value may come from memcache if possible.
 
         """
-        from teams.cache import get_readable_langs
-        return get_readable_langs(team)
+        from teams.cache import get_readable_langs_memoized
+        return get_readable_langs_memoized(team)
 
     def get_writable(self, team):
         """Return the set of language codes that are writeable for this team.
@@ -2713,8 +2702,8 @@ class TeamLanguagePreferenceManager(models.Manager):
         This value may come from memcache if possible.
 
         """
-        from teams.cache import get_writable_langs
-        return get_writable_langs(team)
+        from teams.cache import get_writable_langs_memoized
+        return get_writable_langs_memoized(team)
 
     def get_preferred(self, team):
         """Return the set of language codes that are preferred for this team.
@@ -2876,7 +2865,14 @@ class TeamNotificationSetting(models.Model):
             logger.exception("Apparently unisubs-integration is not installed")
 
     def notify(self, event_name,  **kwargs):
-        """Resolve the notification class for this setting and fires notfications."""
+        """Resolve the notification class for this setting and fires notfications.
+
+        HTTP callbacks are queued and sent by the send_http_callbacks task.
+        Returns the CallbackDelivery for the callback.
+
+        Notification classes that override send_http_request() are sent
+        right away and we return its (success, content) tuple.
+        """
         notification_class = self.get_notification_class()
 
         if not notification_class:
@@ -2887,12 +2883,14 @@ class TeamNotificationSetting(models.Model):
                 event_name,  **kwargs)
 
         if self.request_url:
-            success, content = notification.send_http_request(
-                self.request_url,
-                self.basic_auth_username,
-                self.basic_auth_password
-            )
-            return success, content
+            if notification_class.uses_legacy_http_request():
+                Meter('http-callback.legacy-send').inc()
+                return notification.send_http_request(
+                    self.request_url,
+                    self.basic_auth_username,
+                    self.basic_auth_password
+                )
+            return notifications.queue_callback(self, notification)
         # FIXME: spec and test this, for now just return
         return
 
@@ -2901,6 +2899,141 @@ class TeamNotificationSetting(models.Model):
             return u'NotificationSettings for partner %s' % self.partner
         return u'NotificationSettings for team %s' % self.team
 
+class CallbackDeliveryManager(models.Manager):
+    def ready_to_send(self, notification_setting, now=None):
+        if now is None:
+            now = datetime.datetime.now()
+        return self.filter(notification_setting=notification_setting,
+                           status=CallbackDelivery.STATUS_PENDING,
+                           next_attempt__lte=now)
+
+    def claim(self, notification_setting, limit):
+        """Claim pending deliveries so that we can send them
+
+        Claimed deliveries are switched to STATUS_SENDING, which prevents
+        other workers from sending them at the same time.
+
+        :returns: list of claimed CallbackDelivery objects
+        """
+        now = datetime.datetime.now()
+        ids = list(self.ready_to_send(notification_setting, now)
+                   .order_by('id').values_list('id', flat=True)[:limit])
+        if not ids:
+            return []
+        claim_token = codes.make_code()
+        self.filter(id__in=ids, status=CallbackDelivery.STATUS_PENDING).update(
+            status=CallbackDelivery.STATUS_SENDING, claim_token=claim_token,
+            claimed=now)
+        return list(self.filter(claim_token=claim_token).order_by('id'))
+
+    def release_stale_claims(self, max_age):
+        """Return deliveries to the pending state if they were claimed more
+        than max_age seconds ago.
+
+        This handles workers that died while sending the deliveries.
+        """
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=max_age)
+        return self.filter(status=CallbackDelivery.STATUS_SENDING,
+                           claimed__lt=cutoff).update(
+                               status=CallbackDelivery.STATUS_PENDING,
+                               claim_token='')
+
+    def prune(self, max_age, limit):
+        """Delete finished deliveries that are older than max_age seconds.
+
+        At most limit rows are deleted, so that we don't lock the table for
+        too long.
+
+        :returns: number of deliveries deleted
+        """
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=max_age)
+        # Order by id so that MySQL can walk the primary key from the oldest
+        # rows rather than scanning the table.
+        ids = list(self.filter(status__in=[CallbackDelivery.STATUS_DELIVERED,
+                                           CallbackDelivery.STATUS_FAILED],
+                               finished__lt=cutoff)
+                   .order_by('id').values_list('id', flat=True)[:limit])
+        if ids:
+            self.filter(id__in=ids).delete()
+        return len(ids)
+
+    def notification_settings_to_send(self):
+        """Get ids for TeamNotificationSettings with pending deliveries."""
+        return (self.filter(status=CallbackDelivery.STATUS_PENDING,
+                            next_attempt__lte=datetime.datetime.now())
+                .values_list('notification_setting_id', flat=True)
+                .distinct())
+
+class CallbackDelivery(models.Model):
+    """HTTP callback for a TeamNotificationSetting
+
+    These get created when we queue a callback, and updated after each
+    attempt to send it (see teams.notifications).  We keep them afterwards,
+    which gives us a log of the callbacks that we sent and how long the
+    requests took.  Finished deliveries get deleted after
+    HTTP_CALLBACK_LOG_RETENTION_DAYS (see CallbackDeliveryManager.prune()).
+    """
+    STATUS_PENDING = 'P'
+    STATUS_SENDING = 'S'
+    STATUS_DELIVERED = 'D'
+    STATUS_FAILED = 'F'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, _('Pending')),
+        (STATUS_SENDING, _('Sending')),
+        (STATUS_DELIVERED, _('Delivered')),
+        (STATUS_FAILED, _('Failed')),
+    )
+
+    notification_setting = models.ForeignKey(TeamNotificationSetting,
+                                             related_name='deliveries')
+    event_name = models.CharField(max_length=255)
+    # JSON-encoded callback data
+    data = models.TextField()
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES,
+                              default=STATUS_PENDING, db_index=True)
+    created = models.DateTimeField(default=datetime.datetime.now)
+    next_attempt = models.DateTimeField(default=datetime.datetime.now)
+    attempts = models.PositiveIntegerField(default=0)
+    claim_token = models.CharField(max_length=32, blank=True, db_index=True)
+    claimed = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    response_status = models.IntegerField(null=True, blank=True)
+    response_content = models.TextField(blank=True)
+    # seconds that the last request took
+    latency = models.FloatField(null=True, blank=True)
+
+    objects = CallbackDeliveryManager()
+
+    def __unicode__(self):
+        return u'CallbackDelivery: %s (%s)' % (self.event_name,
+                                               self.get_status_display())
+
+    def get_data(self):
+        return json.loads(self.data)
+
+    def record_attempt(self, success, response_status, response_content,
+                       latency):
+        """Update the delivery after we tried to send it."""
+        now = datetime.datetime.now()
+        self.attempts += 1
+        self.response_status = response_status
+        self.response_content = (response_content or '')[:1000]
+        self.latency = latency
+        self.claim_token = ''
+        if success:
+            self.status = self.STATUS_DELIVERED
+            self.finished = now
+            Histogram('http-callback.delivery-lag').record(
+                (now - self.created).total_seconds())
+        elif self.attempts >= notifications.CALLBACK_MAX_ATTEMPTS:
+            self.status = self.STATUS_FAILED
+            self.finished = now
+            Meter('http-callback.gave-up').inc()
+        else:
+            self.status = self.STATUS_PENDING
+            self.next_attempt = now + datetime.timedelta(
+                seconds=notifications.retry_delay(self.attempts))
+        self.save()
 
 class BillingReport(models.Model):
     # use BillingRecords to signify completed work
@@ -3042,11 +3175,26 @@ class BillingReport(models.Model):
         return [header] + data_rows
 
     def generate_rows_type_billing_record(self):
-        rows = []
-        for i,team in enumerate(self.teams.all()):
-            rows = rows + BillingRecord.objects.csv_report_for_team(team,
-                self.start_date, self.end_date, add_header=i == 0)
-        return rows
+        return list(self.iter_rows_type_billing_record())
+
+    def iter_rows_type_billing_record(self):
+        for i, team in enumerate(self.teams.all()):
+            for row in BillingRecord.objects.iter_report_rows_for_team(
+                    team, self.start_date, self.end_date,
+                    add_header=i == 0):
+                yield row
+
+    def iter_rows(self):
+        """Iterate through the rows for the report
+
+        Billing record reports are generated as we iterate, so that we
+        don't need to keep the entire report in memory.  The other types
+        use generate_rows().
+        """
+        if self.type == BillingReport.TYPE_BILLING_RECORD:
+            return self.iter_rows_type_billing_record()
+        else:
+            return iter(self.generate_rows())
 
     def generate_rows(self):
         if self.type == BillingReport.TYPE_BILLING_RECORD:
@@ -3065,21 +3213,21 @@ class BillingReport(models.Model):
                 return value.encode("utf-8")
             else:
                 return value
-        return [tuple(_convert(v) for v in row) for row in rows]
+        return (tuple(_convert(v) for v in row) for row in rows)
 
     def process(self):
         """
         Generate the correct rows (including headers), saves it to a tempo file,
         then set's that file to the csv_file property, which if , using the S3
         storage will take care of exporting it to s3.
+
+        Rows are written to the file as they're generated.
         """
         try:
-            rows = self.generate_rows()
+            self.csv_file = self.make_csv_file(self.iter_rows())
         except StandardError:
             logger.error("Error generating billing report: (id: %s)", self.id)
             self.csv_file = None
-        else:
-            self.csv_file = self.make_csv_file(rows)
         self.processed = datetime.datetime.utcnow()
         self.save()
 
@@ -3103,23 +3251,62 @@ class BillingReport(models.Model):
     def end_str(self):
         return self.end_date.strftime("%Y%m%d")
 
+# How many BillingRecords to fetch at once when generating reports
+BILLING_REPORT_CHUNK_SIZE = getattr(settings, 'BILLING_REPORT_CHUNK_SIZE',
+                                    1000)
+
 class BillingReportGenerator(object):
+    """Generate the rows for a billing record report
+
+    Iterate over the generator to get the rows.  We fetch the records
+    BILLING_REPORT_CHUNK_SIZE at a time, using values() to get the data from
+    the related tables in the same query, and calculate the language numbers
+    with a subquery.  Rows are generated as we go, so memory usage doesn't
+    depend on the size of the report.
+
+    Records are ordered by video, with the rows for completed languages
+    that don't have a billing record before the rows for each video.
+    """
+
+    LANGUAGE_NUMBER_SQL = """\
+SELECT COUNT(*)
+FROM teams_billingrecord br
+WHERE br.video_id = teams_billingrecord.video_id AND (
+    br.created < teams_billingrecord.created OR (
+        br.created = teams_billingrecord.created AND
+        br.id <= teams_billingrecord.id))"""
+
+    NO_BILLING_RECORD_WHERE = """\
+NOT EXISTS (
+    SELECT 1
+    FROM teams_billingrecord br
+    WHERE br.new_subtitle_language_id = subtitles_subtitlelanguage.id
+)"""
+
     def __init__(self, all_records, add_header=True):
-        if add_header:
-            self.rows = [self.header()]
-        else:
-            self.rows = []
-        all_records = list(all_records)
-        self.make_language_number_map(all_records)
-        self.make_languages_without_records(all_records)
-        for video, records in groupby(all_records, lambda r: r.video):
-            records = list(records)
-            if video:
-                for lang in self.languages_without_records.get(video.id, []):
-                    self.rows.append(
-                        self.make_row_for_lang_without_record(video, lang))
-            for r in records:
-                self.rows.append(self.make_row(video, r))
+        self.all_records = all_records
+        self.add_header = add_header
+
+    @property
+    def rows(self):
+        return list(self)
+
+    def __iter__(self):
+        if self.add_header:
+            yield self.header()
+        last_video_id = None
+        for chunk in self.fetch_chunks():
+            videos = self.fetch_videos(chunk)
+            languages_without_records = self.fetch_languages_without_records(
+                videos.keys())
+            for record in chunk:
+                video = videos.get(record['video_id'])
+                if video and video.id != last_video_id:
+                    for lang in languages_without_records.get(video.id, []):
+                        yield self.make_row_for_lang_without_record(video,
+                                                                    lang)
+                last_video_id = record['video_id']
+                yield self.make_row(video, record)
 
     def header(self):
         return [
@@ -3136,65 +3323,84 @@ class BillingReportGenerator(object):
             'User',
         ]
 
+    def fetch_chunks(self):
+        """Fetch the records in chunks
+
+        We use keyset pagination on (video_id, id), starting with the
+        records that don't have a video.
+        """
+        qs = (self.all_records
+              .extra(select={'language_number': self.LANGUAGE_NUMBER_SQL})
+              .values('id', 'video_id', 'project__name',
+                      'new_subtitle_language__language_code', 'minutes',
+                      'is_original', 'language_number', 'team__slug',
+                      'created', 'source', 'user__username'))
+        last_id = 0
+        while True:
+            chunk = list(qs.filter(video__isnull=True, id__gt=last_id)
+                         .order_by('id')[:BILLING_REPORT_CHUNK_SIZE])
+            if not chunk:
+                break
+            yield chunk
+            last_id = chunk[-1]['id']
+
+        last_video_id = last_id = 0
+        while True:
+            chunk = list(qs.filter(Q(video__gt=last_video_id) |
+                                   Q(video=last_video_id, id__gt=last_id))
+                         .order_by('video', 'id')[:BILLING_REPORT_CHUNK_SIZE])
+            if not chunk:
+                break
+            yield chunk
+            last_video_id = chunk[-1]['video_id']
+            last_id = chunk[-1]['id']
+
+    def fetch_videos(self, chunk):
+        video_ids = set(r['video_id'] for r in chunk if r['video_id'])
+        videos = list(Video.objects.filter(id__in=video_ids))
+        Video.bulk_prefetch_primary_videourls(videos)
+        for video in videos:
+            video._billing_report_title = video.title_display()
+        return dict((v.id, v) for v in videos)
+
+    def fetch_languages_without_records(self, video_ids):
+        languages_without_records = defaultdict(list)
+        if not video_ids:
+            return languages_without_records
+        qs = (NewSubtitleLanguage.objects
+              .filter(video__in=video_ids, subtitles_complete=True)
+              .extra(where=[self.NO_BILLING_RECORD_WHERE])
+              .values('video_id', 'language_code', 'created'))
+        for lang in qs:
+            languages_without_records[lang['video_id']].append(lang)
+        return languages_without_records
+
     def make_row(self, video, record):
         return [
-            (video and video.title_display()) or "----",
+            (video and video._billing_report_title) or "----",
             (video and video.video_id) or "deleted",
-            (record.project.name if record.project else 'none'),
-            (record.new_subtitle_language and record.new_subtitle_language.language_code) or "----",
-            record.minutes,
-            record.is_original,
-            (self.language_number_map and (record.id in self.language_number_map) and self.language_number_map[record.id]) or "----",
-            record.team.slug,
-            record.created.strftime('%Y-%m-%d %H:%M:%S'),
-            record.source,
-            record.user.username,
+            record['project__name'] or 'none',
+            record['new_subtitle_language__language_code'] or "----",
+            record['minutes'],
+            record['is_original'],
+            record['language_number'] or "----",
+            record['team__slug'],
+            record['created'].strftime('%Y-%m-%d %H:%M:%S'),
+            record['source'],
+            record['user__username'],
         ]
 
-    def make_language_number_map(self, records):
-        self.language_number_map = {}
-        videos = set(r.video for r in records)
-        video_counts = dict((v and v.id, 0) for v in videos)
-        qs = (BillingRecord.objects
-              .filter(video__in=videos)
-              .order_by('created'))
-        for record in qs:
-            vid = record.video and record.video.id
-            video_counts[vid] += 1
-            self.language_number_map[record.id] = video_counts[vid]
-
-    def make_languages_without_records(self, records):
-        self.languages_without_records = {}
-        videos = [r.video for r in records]
-        language_ids = [r.new_subtitle_language_id for r in records]
-        no_billing_record_where = """\
-NOT EXISTS (
-    SELECT 1
-    FROM teams_billingrecord br
-    WHERE br.new_subtitle_language_id = subtitles_subtitlelanguage.id
-)"""
-        qs = (NewSubtitleLanguage.objects
-              .filter(video__in=videos, subtitles_complete=True)
-              .exclude(id__in=language_ids).
-              extra(where=[no_billing_record_where]))
-        for lang in qs:
-            vid = lang.video_id
-            if vid not in self.languages_without_records:
-                self.languages_without_records[vid] = [lang]
-            else:
-                self.languages_without_records[vid].append(lang)
-
     def make_row_for_lang_without_record(self, video, language):
         return [
-            video.title_display(),
+            video._billing_report_title,
             video.video_id,
             'none',
-            language.language_code,
+            language['language_code'],
             0,
-            language.is_primary_audio_language(),
+            language['language_code'] == video.primary_audio_language_code,
             0,
             'unknown',
-            language.created.strftime('%Y-%m-%d %H:%M:%S'),
+            language['created'].strftime('%Y-%m-%d %H:%M:%S'),
             'unknown',
             'unknown',
         ]
@@ -3205,9 +3411,17 @@ class BillingRecordManager(models.Manager):
         return self.filter(team=team, created__gte=start, created__lte=end)
 
     def csv_report_for_team(self, team, start, end, add_header=True):
+        return list(self.iter_report_rows_for_team(team, start, end,
+                                                   add_header))
+
+    def iter_report_rows_for_team(self, team, start, end, add_header=True):
+        """Iterate through the rows for a team's billing report
+
+        This is like csv_report_for_team(), but it generates the rows as
+        they're needed rather than building a list.
+        """
         all_records = self.data_for_team(team, start, end)
-        generator = BillingReportGenerator(all_records, add_header)
-        return generator.rows
+        return iter(BillingReportGenerator(all_records, add_header))
 
     def insert_records_for_translations(self, billing_record):
         """
@@ -3292,36 +3506,12 @@ def get_minutes_for_version(version, round_up_to_integer):
     """
     Return the number of minutes the subtitles specified in version
     """
-    subs = version.get_subtitles()
-
-    if len(subs) == 0:
-        return 0
-
-    for sub in subs:
-        if sub.start_time is not None:
-            start_time = sub.start_time
-            break
-        # we shouldn't have an end time set without a start time, but handle
-        # it just in case
-        if sub.end_time is not None:
-            start_time = sub.end_time
-            break
-    else:
-        return 0
-
-    for sub in reversed(subs):
-        if sub.end_time is not None:
-            end_time = sub.end_time
-            break
-        # we shouldn't have an end time not set, but check for that just in
-        # case
-        if sub.start_time is not None:
-            end_time = sub.start_time
-            break
-    else:
+    summary = version.get_timing_summary()
+    if summary.first_start_time is None or summary.last_end_time is None:
         return 0
 
-    duration_seconds =  (end_time - start_time) / 1000.0
+    duration_seconds = (summary.last_end_time -
+                        summary.first_start_time) / 1000.0
     minutes = duration_seconds/60.0
     if round_up_to_integer:
         minutes = int(ceil(minutes))
@@ -225,7 +225,6 @@ def settings_basic(request, team):
 
             if is_visible != form.instance.is_visible:
                 tasks.update_video_public_field.delay(team.id)
-                tasks.invalidate_video_visibility_caches.delay(team)
 
             messages.success(request, _(u'Settings saved.'))
             return HttpResponseRedirect(request.path)
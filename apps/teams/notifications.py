@@ -16,23 +16,78 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
-from httplib2 import Http
+"""teams.notifications -- HTTP callbacks and emails for team activity
+
+TeamNotificationSetting.notify() creates a notification object, then calls
+queue_callback() to store the callback data in a CallbackDelivery row.  The
+send_http_callbacks task sends the pending deliveries with
+send_pending_callbacks():
+
+- We keep a pool of httplib2.Http objects for each callback URL.  httplib2
+  keeps the connections open, so we can reuse them for later requests.  The
+  pool size also limits how many requests a process sends to a partner at
+  once.
+- Requests time out after HTTP_CALLBACK_TIMEOUT seconds.
+- Failed deliveries are retried with exponential backoff, up to
+  HTTP_CALLBACK_MAX_ATTEMPTS times.  The periodic retry_http_callbacks task
+  sends them once they're due.
+- Teams/partners listed in HTTP_CALLBACK_BATCH_SIZES get several events in
+  a single POST, as a JSON object like {"events": [...]}.
+
+The CallbackDelivery rows are kept afterwards as a delivery log.
+retry_http_callbacks deletes delivered and failed rows once they're older
+than HTTP_CALLBACK_LOG_RETENTION_DAYS.
+
+Notification classes that override send_http_request() skip all of this,
+and get send_http_request() called directly.
+"""
+
+from datetime import datetime
 from urllib import urlencode
+from urlparse import urlparse
+import json
+import Queue
+import threading
+import time
+
+from httplib2 import Http
 
 from django.conf import settings
 DEFAULT_PROTOCOL = getattr(settings, "DEFAULT_PROTOCOL", 'https')
 
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.utils.translation import ugettext_lazy as _
 
 from utils import send_templated_email
-from utils.metrics import Meter
+from utils.metrics import Histogram, Meter
 from unilangs import LanguageCode
 from videos.models import Video
 
 import logging
 logger = logging.getLogger("team-notifier")
 
+CALLBACK_TIMEOUT = getattr(settings, 'HTTP_CALLBACK_TIMEOUT', 10)
+# Max number of connections to each callback URL, per process
+CALLBACK_POOL_SIZE = getattr(settings, 'HTTP_CALLBACK_POOL_SIZE', 4)
+CALLBACK_MAX_ATTEMPTS = getattr(settings, 'HTTP_CALLBACK_MAX_ATTEMPTS', 6)
+# Delay before the first retry.  It doubles with each failed attempt.
+CALLBACK_RETRY_DELAY = getattr(settings, 'HTTP_CALLBACK_RETRY_DELAY', 30)
+# Max number of deliveries to send in one send_http_callbacks run.  If there
+# are more left after that, we schedule another run.
+CALLBACK_MAX_PER_RUN = getattr(settings, 'HTTP_CALLBACK_MAX_PER_RUN', 100)
+# Maps team/partner slugs to the max number of events to send in one POST
+CALLBACK_BATCH_SIZES = getattr(settings, 'HTTP_CALLBACK_BATCH_SIZES', {})
+# Seconds to wait for more events before sending a batch
+CALLBACK_BATCH_DELAY = getattr(settings, 'HTTP_CALLBACK_BATCH_DELAY', 5)
+# How long to keep finished CallbackDeliveries around
+CALLBACK_LOG_RETENTION_DAYS = getattr(
+    settings, 'HTTP_CALLBACK_LOG_RETENTION_DAYS', 30)
+# Max number of old CallbackDeliveries to delete in one
+# retry_http_callbacks run
+CALLBACK_PRUNE_BATCH_SIZE = getattr(settings,
+                                    'HTTP_CALLBACK_PRUNE_BATCH_SIZE', 1000)
+
 class BaseNotification(object):
     """
     Holds the data needed to prepare a notification.
@@ -40,9 +95,15 @@ class BaseNotification(object):
     and language codes with from_internal_lang and
     from_internal_video_id
 
-    Also, subclasses should implement a more specialized version of
-    'send_http_request'
+    Also, subclasses can implement a more specialized version of
+    'get_callback_data'
     'send_email'
+
+    Subclasses used to customize the callbacks by overriding
+    'send_http_request'.  That still works (see
+    uses_legacy_http_request()), but those callbacks get sent right away,
+    without the delivery queue, retries, or batching.  New code should
+    override 'get_callback_data' instead.
     """
     codec = "unisubs"
     api_name = "partners"
@@ -139,11 +200,12 @@ class BaseNotification(object):
         if self.language:
             return  self.from_internal_lang(self.language.language_code)
 
-    def send_http_request(self, url, basic_auth_username, basic_auth_password):
-        h = Http(disable_ssl_certificate_validation=True)
-        if basic_auth_username and basic_auth_password:
-            h.add_credentials(basic_auth_username, basic_auth_password)
+    def get_callback_data(self):
+        """Get the data to send in the HTTP callback for this notification.
 
+        This gets calculated once, when we queue the callback, so the
+        retries don't need to hit the DB.
+        """
         project = self.video.get_team_video().project.slug if self.video else None
         data = {
             'event': self.event_name,
@@ -164,31 +226,40 @@ class BaseNotification(object):
                 "language_code": self.language_code,
                 "language_id": self.language.pk,
             })
-        data_sent = data
-        data = urlencode(data)
-        url = "%s?%s" % (url , data)
+        return data
+
+    def send_http_request(self, url, basic_auth_username, basic_auth_password):
+        """Send the HTTP callback right away, bypassing the delivery queue.
+
+        :returns: (success, content) tuple.  success is None if we couldn't
+            connect to the server.
+        """
+        pool = get_connection_pool(url, basic_auth_username,
+                                   basic_auth_password)
         try:
-            resp, content = h.request(url, method="POST", body=data, headers={
-                'referer': '%s://%s' % (DEFAULT_PROTOCOL, Site.objects.get_current().domain)
-            })
-            success = 200 <= resp.status < 400
-            if success is False:
-                logger.error("Failed to notify team %s " % (self.team),
-                     extra={
-                        'team': self.team or self.partner,
-                        'url': url,
-                        'response': resp,
-                        'content': content,
-                        'data_sent':data_sent,
-                    })
-
-                Meter('http-callback-notification-error').inc()
-            else:
-                Meter('http-callback-notification-success').inc()
-            return success, content
-        except:
+            resp, content = _post_callback(pool, url,
+                                           [self.get_callback_data()])
+        except Exception:
             logger.exception("Failed to send http notification ")
-        return None, None
+            return None, None
+        success = 200 <= resp.status < 400
+        if success:
+            Meter('http-callback-notification-success').inc()
+        else:
+            Meter('http-callback-notification-error').inc()
+        return success, content
+
+    @classmethod
+    def uses_legacy_http_request(cls):
+        """Check if this class overrides send_http_request()
+
+        If so, we call send_http_request() directly rather than queueing a
+        CallbackDelivery, so that the override still gets used.
+        """
+        for klass in cls.__mro__:
+            if 'send_http_request' in klass.__dict__:
+                return klass is not BaseNotification
+        return False
 
     def send_email(self, email_to):
         Meter('templated-emails-sent-by-type.teams.team-video-activity').inc()
@@ -203,3 +274,193 @@ class BaseNotification(object):
                 }
             )
 
+
+
+class ConnectionPool(object):
+    """Pool of httplib2.Http objects for a callback URL
+
+    httplib2 keeps connections open between requests, so reusing the Http
+    objects lets us reuse connections.  The pool has a fixed size, so it also
+    limits how many requests we send at once.  If all the connections are in
+    use, connection() waits for one to be returned.
+    """
+    def __init__(self, size, timeout, username=None, password=None):
+        self.timeout = timeout
+        self.username = username
+        self.password = password
+        # None means we haven't created the Http object for the slot yet
+        self.available = Queue.LifoQueue()
+        for i in xrange(size):
+            self.available.put(None)
+
+    def connection(self):
+        return _PooledConnection(self)
+
+    def make_http(self):
+        http = Http(timeout=self.timeout,
+                    disable_ssl_certificate_validation=True)
+        if self.username and self.password:
+            http.add_credentials(self.username, self.password)
+        return http
+
+class _PooledConnection(object):
+    def __init__(self, pool):
+        self.pool = pool
+        self.http = None
+
+    def __enter__(self):
+        try:
+            self.http = self.pool.available.get(timeout=self.pool.timeout)
+        except Queue.Empty:
+            raise CallbackPoolTimeout()
+        if self.http is None:
+            self.http = self.pool.make_http()
+        return self.http
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.pool.available.put(self.http)
+        else:
+            # The connection may be in a bad state, don't reuse it
+            self.pool.available.put(None)
+
+class CallbackPoolTimeout(StandardError):
+    """Timed out waiting for a connection from a ConnectionPool."""
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_connection_pool(url, username=None, password=None):
+    """Get the ConnectionPool to use for a callback URL."""
+    url_parts = urlparse(url)
+    key = (url_parts.scheme, url_parts.netloc, username, password)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(CALLBACK_POOL_SIZE, CALLBACK_TIMEOUT,
+                                         username, password)
+        return _pools[key]
+
+def clear_connection_pools():
+    with _pools_lock:
+        _pools.clear()
+
+def _encode_params(data):
+    return urlencode(dict((key, unicode(value).encode('utf-8'))
+                          for key, value in data.items()))
+
+def _post_callback(pool, url, events):
+    """POST callback data to a URL.
+
+    Single events get sent as form data, in both the query string and the
+    body.  Multiple events get sent as JSON.
+    """
+    headers = {
+        'referer': '%s://%s' % (DEFAULT_PROTOCOL,
+                                Site.objects.get_current().domain),
+    }
+    if len(events) == 1:
+        body = _encode_params(events[0])
+        url = "%s?%s" % (url, body)
+    else:
+        body = json.dumps({'events': events})
+        headers['content-type'] = 'application/json'
+    with pool.connection() as http:
+        return http.request(url, method="POST", body=body, headers=headers)
+
+def get_batch_size(notification_setting):
+    """Get the max number of events to POST at once for a notification
+    setting.
+    """
+    owner = notification_setting.partner or notification_setting.team
+    if owner is None:
+        return 1
+    return CALLBACK_BATCH_SIZES.get(owner.slug, 1)
+
+def _batch_scheduled_key(notification_setting):
+    return 'http-callback-batch-scheduled:{0}'.format(notification_setting.pk)
+
+def queue_callback(notification_setting, notification):
+    """Queue an HTTP callback for a notification
+
+    :returns: CallbackDelivery for the callback
+    """
+    from teams.models import CallbackDelivery
+    from teams.tasks import send_http_callbacks
+
+    delivery = CallbackDelivery.objects.create(
+        notification_setting=notification_setting,
+        event_name=notification.event_name,
+        data=json.dumps(notification.get_callback_data()))
+    Meter('http-callback.queued').inc()
+    if get_batch_size(notification_setting) == 1:
+        send_http_callbacks.delay(notification_setting.pk)
+    elif cache.add(_batch_scheduled_key(notification_setting), 1,
+                   CALLBACK_BATCH_DELAY):
+        # Wait a bit so that other events can be sent in the same batch
+        send_http_callbacks.apply_async(args=(notification_setting.pk,),
+                                        countdown=CALLBACK_BATCH_DELAY)
+    return delivery
+
+def send_pending_callbacks(notification_setting):
+    """Send the pending CallbackDeliveries for a notification setting
+
+    :returns: number of deliveries that we tried to send
+    """
+    from teams.models import CallbackDelivery
+
+    deliveries = CallbackDelivery.objects.claim(notification_setting,
+                                                CALLBACK_MAX_PER_RUN)
+    if not deliveries:
+        return 0
+    if not notification_setting.request_url:
+        # The URL was removed after the callbacks were queued
+        CallbackDelivery.objects.filter(
+            id__in=[d.id for d in deliveries]
+        ).update(status=CallbackDelivery.STATUS_FAILED, claim_token='',
+                 finished=datetime.now())
+        return len(deliveries)
+    pool = get_connection_pool(notification_setting.request_url,
+                               notification_setting.basic_auth_username,
+                               notification_setting.basic_auth_password)
+    batch_size = get_batch_size(notification_setting)
+    for i in xrange(0, len(deliveries), batch_size):
+        _send_batch(notification_setting, pool,
+                    deliveries[i:i+batch_size])
+    return len(deliveries)
+
+def _send_batch(notification_setting, pool, deliveries):
+    start_time = time.time()
+    try:
+        resp, content = _post_callback(
+            pool, notification_setting.request_url,
+            [delivery.get_data() for delivery in deliveries])
+    except Exception as e:
+        logger.warn("Error sending http callback to %s (%s)",
+                    notification_setting.request_url, e)
+        status = None
+        content = repr(e)
+        success = False
+    else:
+        status = resp.status
+        success = 200 <= status < 400
+    latency = time.time() - start_time
+    Histogram('http-callback.latency').record(latency)
+    Histogram('http-callback.batch-size').record(len(deliveries))
+    if success:
+        Meter('http-callback-notification-success').inc()
+    else:
+        logger.error("Failed to notify team %s " % (
+            notification_setting.team or notification_setting.partner),
+            extra={
+                'url': notification_setting.request_url,
+                'status': status,
+                'content': content,
+                'deliveries': [d.id for d in deliveries],
+            })
+        Meter('http-callback-notification-error').inc()
+    for delivery in deliveries:
+        delivery.record_attempt(success, status, content, latency)
+
+def retry_delay(attempts):
+    """Get the number of seconds to wait before retrying a delivery."""
+    return CALLBACK_RETRY_DELAY * 2 ** (attempts - 1)
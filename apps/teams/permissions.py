@@ -92,29 +92,29 @@ def get_role_for_target(user, team, project=None, lang=None):
     `lang` should be a string (the language code).
 
     """
-    member = get_member(user, team)
-    role = get_role(member)
-    narrowings = get_narrowings(member)
+    membership = team.get_membership(user)
 
     # If the user has no narrowings, just return their overall role.
-    if not narrowings:
-        return role
+    if not membership.has_narrowings():
+        return membership.role
 
     # Otherwise the narrowings must match the target.
-    project_narrowings = [n.project for n in narrowings if n.project]
-    lang_narrowings = [n.language for n in narrowings if n.language]
 
     # The default project is the same as "no project".
-    if project and project.is_default_project:
-        project = None
+    if project and not project.is_default_project:
+        project_id = project.id
+    else:
+        project_id = None
 
-    if project_narrowings and project not in project_narrowings:
+    if (membership.project_narrowings and
+            project_id not in membership.project_narrowings):
         return ROLE_CONTRIBUTOR
 
-    if lang_narrowings and lang not in lang_narrowings:
+    if (membership.language_narrowings and
+            lang not in membership.language_narrowings):
         return ROLE_CONTRIBUTOR
 
-    return role
+    return membership.role
 
 
 def roles_user_can_assign(team, user, to_user=None):
@@ -835,6 +835,223 @@ def can_delete_task(task, user):
 
     return can_delete and can_perform_task(user, task)
 
+class TaskPermissionEvaluator(object):
+    """Check task permissions for a user for many tasks at once.
+
+    The can_*_task() functions above look up the member, narrowings,
+    workflows and latest versions for each call.  That's fine for a single
+    task, but it adds up to a lot of queries for task lists.
+    TaskPermissionEvaluator loads the member, narrowings and team
+    workflows once, then answers the permission questions in memory.
+
+    All tasks passed to the evaluator must belong to its team.  Call
+    prefetch() with the tasks that you're going to check to load the data
+    that can_perform_task() needs for review tasks with one query.
+    """
+    def __init__(self, user, team):
+        self.user = user
+        self.team = team
+        membership = team.get_membership(user)
+        self.member = membership.member
+        self.role = membership.role
+        self.project_narrowings = membership.project_narrowings
+        self.lang_narrowings = membership.language_narrowings
+        self._workflows = None
+        self._latest_version_authors = {}
+        self._admin_owner_count = None
+
+    def prefetch(self, tasks):
+        """Prefetch data for a list of tasks."""
+        from subtitles.models import SubtitleVersion
+
+        review_tasks = [t for t in tasks
+                        if t.type == Task.TYPE_IDS['Review'] and t.language]
+        if not review_tasks or self.user is None:
+            return
+        video_ids = set(t.team_video.video_id for t in review_tasks)
+        languages = set(t.language for t in review_tasks)
+        latest = {}
+        for video_id, language_code, version_number, author_id in (
+            SubtitleVersion.objects.extant()
+            .filter(video_id__in=video_ids, language_code__in=languages)
+            .values_list('video_id', 'language_code', 'version_number',
+                         'author_id')):
+            key = (video_id, language_code)
+            if key not in latest or version_number > latest[key][0]:
+                latest[key] = (version_number, author_id)
+        for video_id in video_ids:
+            for language_code in languages:
+                key = (video_id, language_code)
+                self._latest_version_authors[key] = (
+                    latest[key][1] if key in latest else None)
+
+    def role_for(self, project=None, lang=None):
+        """Calculate the same thing as get_role_for_target()."""
+        if not (self.project_narrowings or self.lang_narrowings):
+            return self.role
+        # The default project is the same as "no project".
+        if project and project.is_default_project:
+            project = None
+        project_id = project.id if project else None
+        if (self.project_narrowings and
+            project_id not in self.project_narrowings):
+            return ROLE_CONTRIBUTOR
+        if self.lang_narrowings and lang not in self.lang_narrowings:
+            return ROLE_CONTRIBUTOR
+        return self.role
+
+    def workflow_for(self, team_video):
+        """Calculate the same thing as Workflow.get_for_team_video()."""
+        if hasattr(team_video, '_cached_workflow'):
+            return team_video._cached_workflow
+        if self._workflows is None:
+            self._workflows = list(Workflow.objects
+                                   .filter(team=self.team.id)
+                                   .select_related('project'))
+        workflow = self._calc_workflow(team_video)
+        team_video._cached_workflow = workflow
+        return workflow
+
+    def _calc_workflow(self, team_video):
+        for w in self._workflows:
+            if w.team_video_id == team_video.id:
+                return w
+        for w in self._workflows:
+            if (w.project_id == team_video.project_id and
+                w.project.workflow_enabled and not w.team_video_id):
+                return w
+        if self.team.workflow_enabled:
+            for w in self._workflows:
+                if not w.project_id and not w.team_video_id:
+                    return w
+        return Workflow(team=self.team)
+
+    def can_perform_task(self, task, allow_own=False):
+        """Calculate the same thing as can_perform_task()."""
+        if task.type in (Task.TYPE_IDS['Review'], Task.TYPE_IDS['Approve']):
+            if self.user is not None and task.assignee_id == self.user.id:
+                return True
+        return self.can_perform_task_for(task.type, task.team_video,
+                                         task.language, allow_own)
+
+    def can_perform_task_for(self, type, team_video, language,
+                             allow_own=False):
+        """Calculate the same thing as can_perform_task_for()."""
+        if type:
+            type = int(type)
+
+        if type == Task.TYPE_IDS['Subtitle']:
+            return self._check_policy(self.team.subtitle_policy,
+                                      team_video.project, None)
+        elif type == Task.TYPE_IDS['Translate']:
+            return self._check_policy(self.team.translate_policy,
+                                      team_video.project, language)
+        elif type == Task.TYPE_IDS['Review']:
+            return self.can_review(team_video, language, allow_own)
+        elif type == Task.TYPE_IDS['Approve']:
+            return self.can_approve(team_video, language)
+
+    def _check_policy(self, policy, project, lang):
+        role = self.role_for(project, lang)
+        role_req = {
+            10: ROLE_OUTSIDER,
+            20: ROLE_CONTRIBUTOR,
+            30: ROLE_MANAGER,
+            40: ROLE_ADMIN,
+        }[policy]
+        return role in _perms_equal_or_greater(role_req,
+                                               include_outsiders=True)
+
+    def can_review(self, team_video, lang=None, allow_own=False):
+        """Calculate the same thing as can_review()."""
+        workflow = self.workflow_for(team_video)
+        if not workflow.review_allowed:
+            return False
+        role = self.role_for(team_video.project, lang)
+        role_req = {
+            10: ROLE_CONTRIBUTOR,
+            20: ROLE_MANAGER,
+            30: ROLE_ADMIN,
+        }[workflow.review_allowed]
+        if role not in _perms_equal_or_greater(role_req):
+            return False
+        if allow_own or not lang:
+            return True
+        # Users usually cannot review their own subtitles.
+        if self._latest_version_author(team_video, lang) == self.user.id:
+            return self._can_review_own_subtitles(role)
+        return True
+
+    def _latest_version_author(self, team_video, lang):
+        key = (team_video.video_id, lang)
+        if key not in self._latest_version_authors:
+            version = team_video.video.latest_version(language_code=lang,
+                                                      public_only=False)
+            self._latest_version_authors[key] = (
+                version.author_id if version else None)
+        return self._latest_version_authors[key]
+
+    def _can_review_own_subtitles(self, role):
+        if role == ROLE_OWNER:
+            return True
+        if role == ROLE_ADMIN:
+            if self._admin_owner_count is None:
+                self._admin_owner_count = self.team.members.filter(
+                    user__is_active=True, role__in=(ROLE_ADMIN, ROLE_OWNER)
+                ).count()
+            return self._admin_owner_count == 1
+        return False
+
+    def can_approve(self, team_video, lang=None):
+        """Calculate the same thing as can_approve()."""
+        workflow = self.workflow_for(team_video)
+        if not workflow.approve_allowed:
+            return False
+        role_req = {
+            10: ROLE_MANAGER,
+            20: ROLE_ADMIN,
+        }[workflow.approve_allowed]
+        return self.role_for(team_video.project, lang) in (
+            _perms_equal_or_greater(role_req))
+
+    def can_assign_tasks(self, project=None, lang=None):
+        """Calculate the same thing as can_assign_tasks()."""
+        role_required = {
+            10: ROLE_CONTRIBUTOR,
+            20: ROLE_MANAGER,
+            30: ROLE_ADMIN,
+        }[self.team.task_assign_policy]
+        return self.role_for(project, lang) in (
+            _perms_equal_or_greater(role_required))
+
+    def can_delete_tasks(self, project=None, lang=None):
+        """Calculate the same thing as can_delete_tasks()."""
+        if self.role_for(project, lang) == ROLE_CONTRIBUTOR:
+            return False
+        return self.can_assign_tasks(project, lang)
+
+    def can_assign_task(self, task):
+        """Calculate the same thing as can_assign_task()."""
+        return (self.can_assign_tasks(task.team_video.project, task.language)
+                and self.can_perform_task(task, allow_own=True))
+
+    def can_decline_task(self, task):
+        """Calculate the same thing as can_decline_task()."""
+        return self.user is not None and task.assignee_id == self.user.id
+
+    def can_delete_task(self, task):
+        """Calculate the same thing as can_delete_task()."""
+        can_delete = self.can_delete_tasks(task.team_video.project,
+                                           task.language)
+        # Allow stray review/approve tasks to be deleted.
+        if task.type == Task.TYPE_IDS['Review']:
+            if not self.workflow_for(task.team_video).review_allowed:
+                return can_delete
+        if task.type == Task.TYPE_IDS['Approve']:
+            if not self.workflow_for(task.team_video).approve_allowed:
+                return can_delete
+        return can_delete and self.can_perform_task(task)
+
 def _user_can_create_task_subtitle(user, team_video):
     role = get_role_for_target(user, team_video.team, team_video.project, None)
 
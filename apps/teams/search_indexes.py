@@ -17,7 +17,8 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
 from django.conf import settings
-from django.db.models import Count
+from django.db.models import Count, signals
+from django.db.models.query import QuerySet
 from haystack import site
 from haystack.backends import SQ
 from haystack.indexes import (
@@ -27,10 +28,58 @@ from haystack.indexes import (
 from haystack.query import SearchQuerySet
 from teams import models
 from subtitles.models import SubtitleLanguage
+from utils.celery_search_index import CelerySearchIndex, queue_update
+from utils.searching import get_terms
+from videos.models import Video
 
 from haystack.exceptions import AlreadyRegistered
 
 
+# How many TeamVideos to prefetch data for at once
+PREFETCH_CHUNK_SIZE = getattr(settings, 'TEAM_VIDEO_INDEX_PREFETCH_CHUNK_SIZE',
+                              500)
+
+def prefetch_index_data(team_videos):
+    """Prefetch the data that TeamVideoLanguagesIndex.prepare() needs
+
+    This uses a handful of queries for the entire list, rather than
+    several queries per team video.
+    """
+    videos = [tv.video for tv in team_videos]
+    Video.bulk_prefetch_languages(videos, with_public_tips=True,
+                                  with_private_tips=True)
+    Video.bulk_prefetch_primary_videourls(videos)
+    task_counts = dict(
+        models.Task.objects.incomplete()
+        .filter(team_video__in=[tv.id for tv in team_videos])
+        .values_list('team_video')
+        .annotate(Count('id')))
+    for team_video in team_videos:
+        team_video._index_task_count = task_counts.get(team_video.id, 0)
+        team_video._index_data_prefetched = True
+
+class TeamVideoIndexQuerySet(QuerySet):
+    """QuerySet that prefetches the data that we need to index TeamVideos
+
+    As we iterate through the results, we call prefetch_index_data() for
+    each chunk of PREFETCH_CHUNK_SIZE team videos.  This is what
+    TeamVideoLanguagesIndex.index_queryset() returns, so update_index and
+    rebuild_index use it automatically.
+    """
+    def iterator(self):
+        chunk = []
+        for team_video in super(TeamVideoIndexQuerySet, self).iterator():
+            chunk.append(team_video)
+            if len(chunk) >= PREFETCH_CHUNK_SIZE:
+                prefetch_index_data(chunk)
+                for team_video in chunk:
+                    yield team_video
+                chunk = []
+        if chunk:
+            prefetch_index_data(chunk)
+            for team_video in chunk:
+                yield team_video
+
 class TeamVideoLanguagesIndex(SearchIndex):
     text = CharField(
         document=True, use_template=True,
@@ -84,18 +133,26 @@ class TeamVideoLanguagesIndex(SearchIndex):
     num_completed_langs = IntegerField()
 
     def prepare(self, obj):
+        if not getattr(obj, '_index_data_prefetched', False):
+            prefetch_index_data([obj])
+        video = obj.video
         self.prepared_data = super(TeamVideoLanguagesIndex, self).prepare(obj)
-        self.prepared_data['team_id'] = obj.team.id
+        self.prepared_data['team_id'] = obj.team_id
         self.prepared_data['team_video_pk'] = obj.id
-        self.prepared_data['video_pk'] = obj.video.id
-        self.prepared_data['video_id'] = obj.video.video_id
-        self.prepared_data['video_title'] = obj.video.title.strip()
-        self.prepared_data['video_url'] = obj.video.get_video_url()
+        self.prepared_data['video_pk'] = video.id
+        self.prepared_data['video_id'] = video.video_id
+        self.prepared_data['video_title'] = video.title.strip()
+        self.prepared_data['video_url'] = video.get_video_url()
 
-        original_sl = obj.video.subtitle_language()
+        languages = video.all_subtitle_languages()
+        original_sl = None
+        if video.primary_audio_language_code:
+            for sl in languages:
+                if sl.language_code == video.primary_audio_language_code:
+                    original_sl = sl
 
         if original_sl:
-            self.prepared_data['original_language_display'] = original_sl.get_language_code_display
+            self.prepared_data['original_language_display'] = original_sl.get_language_code_display()
             self.prepared_data['original_language'] = original_sl.language_code
         else:
             self.prepared_data['original_language_display'] = ''
@@ -103,19 +160,23 @@ class TeamVideoLanguagesIndex(SearchIndex):
 
         self.prepared_data['absolute_url'] = obj.get_absolute_url()
         self.prepared_data['thumbnail'] = obj.get_thumbnail()
-        self.prepared_data['title'] = obj.video.title_display()
+        self.prepared_data['title'] = video.title_display()
         self.prepared_data['description'] = obj.description
-        self.prepared_data['is_complete'] = obj.video.complete_date is not None
-        self.prepared_data['video_complete_date'] = obj.video.complete_date
+        self.prepared_data['is_complete'] = video.complete_date is not None
+        self.prepared_data['video_complete_date'] = video.complete_date
         self.prepared_data['project_pk'] = obj.project.pk
         self.prepared_data['project_name'] = obj.project.name
         self.prepared_data['project_slug'] = obj.project.slug
         self.prepared_data['team_video_create_date'] = obj.created
 
-        completed_sls = list(obj.video.completed_subtitle_languages())
-        all_sls = obj.video.newsubtitlelanguage_set.having_nonempty_tip()
+        completed_sls = [sl for sl in languages
+                         if sl.is_complete_and_synced(public=True)]
+        # languages with a non-empty tip.  This matches
+        # SubtitleLanguage.objects.having_nonempty_tip()
+        nonempty_sls = [sl for sl in languages
+                        if sl.get_tip() and sl.get_tip().subtitle_count > 0]
 
-        self.prepared_data['num_total_langs'] = all_sls.count()
+        self.prepared_data['num_total_langs'] = len(nonempty_sls)
         self.prepared_data['num_completed_langs'] = len(completed_sls)
 
         self.prepared_data['video_completed_langs'] = \
@@ -123,15 +184,32 @@ class TeamVideoLanguagesIndex(SearchIndex):
         self.prepared_data['video_completed_lang_urls'] = \
             [sl.get_absolute_url() for sl in completed_sls]
 
-        self.prepared_data['task_count'] = models.Task.objects.incomplete().filter(team_video=obj).count()
+        self.prepared_data['task_count'] = obj._index_task_count
 
-        team_video = obj.video.get_team_video()
-
-        self.prepared_data['is_public'] =  team_video.team.is_visible 
-        self.prepared_data["owned_by_team_id"] = team_video.team.id if team_video else None
+        self.prepared_data['is_public'] = obj.team.is_visible
+        self.prepared_data["owned_by_team_id"] = obj.team_id
 
+        # The prefetched data is only good for a single pass.  Make sure we
+        # fetch it again if the object gets indexed again.
+        obj._index_data_prefetched = False
         return self.prepared_data
 
+    def prepare_many(self, team_videos):
+        """Prepare documents for a list of TeamVideos
+
+        This prefetches the data for all the team videos at once, which is
+        much faster than calling prepare() for each one.  For best
+        results, team_videos should be fetched with
+        select_related('video', 'team', 'project').
+        """
+        prefetch_index_data(team_videos)
+        return [self.full_prepare(team_video) for team_video in team_videos]
+
+    def index_queryset(self):
+        return (TeamVideoIndexQuerySet(models.TeamVideo)
+                .select_related('video', 'team', 'project')
+                .order_by('id'))
+
     @classmethod
     def results_for_members(self, team):
         base_qs = SearchQuerySet().models(models.TeamVideo)
@@ -145,9 +223,122 @@ class TeamVideoLanguagesIndex(SearchIndex):
         return SearchQuerySet().models(models.TeamVideo).filter(is_public=True)
 
 
+class TaskIndex(CelerySearchIndex):
+    """Index tasks for the tasks tab and the task API
+
+    The text field contains the video title and metadata, which is what the
+    task search box matches against.  The other fields are used to filter
+    and sort the results, so that we can paginate on the search results
+    rather than joining the task and video tables.
+
+    Task changes get queued by CelerySearchIndex.  We also queue the tasks
+    for a team video when the team video or its video changes, since that
+    can change the project or the text.  Code that changes tasks with
+    QuerySet.update() needs to call queue_tasks() itself.
+    """
+    # Value for task_language when the task doesn't have a language yet.
+    # Solr doesn't handle filtering on empty strings well.
+    NO_LANGUAGE = 'no-language'
+
+    text = CharField(document=True)
+    team_id = IntegerField()
+    project_pk = IntegerField()
+    task_team_video_pk = IntegerField()
+    task_language = CharField(faceted=True)
+    task_type = IntegerField()
+    # 0 for unassigned tasks
+    assignee_pk = IntegerField()
+    task_completed = BooleanField()
+    priority = IntegerField()
+    task_created = DateTimeField()
+    expiration_date = DateTimeField(null=True)
+    has_expiration = BooleanField()
+
+    def prepare(self, obj):
+        self.prepared_data = super(TaskIndex, self).prepare(obj)
+        team_video = obj.team_video
+        video = team_video.video
+        self.prepared_data['text'] = u'\n'.join(
+            text for text in [
+                video.title, video.meta_1_content, video.meta_2_content,
+                video.meta_3_content,
+            ] if text)
+        self.prepared_data['team_id'] = obj.team_id
+        self.prepared_data['project_pk'] = team_video.project_id
+        self.prepared_data['task_team_video_pk'] = obj.team_video_id
+        self.prepared_data['task_language'] = (obj.language or
+                                               self.NO_LANGUAGE)
+        self.prepared_data['task_type'] = obj.type
+        self.prepared_data['assignee_pk'] = obj.assignee_id or 0
+        self.prepared_data['task_completed'] = obj.completed is not None
+        self.prepared_data['priority'] = obj.priority
+        self.prepared_data['task_created'] = obj.created
+        self.prepared_data['expiration_date'] = obj.expiration_date
+        self.prepared_data['has_expiration'] = obj.expiration_date is not None
+        return self.prepared_data
+
+    def index_queryset(self):
+        return (models.Task.objects.not_deleted()
+                .select_related('team_video__video')
+                .order_by('id'))
+
+    def _setup_save(self, model):
+        super(TaskIndex, self)._setup_save(model)
+        signals.post_save.connect(self.team_video_update_handler,
+                                  sender=models.TeamVideo)
+        signals.post_save.connect(self.video_update_handler, sender=Video)
+
+    def _teardown_save(self, model):
+        super(TaskIndex, self)._teardown_save(model)
+        signals.post_save.disconnect(self.team_video_update_handler,
+                                     sender=models.TeamVideo)
+        signals.post_save.disconnect(self.video_update_handler, sender=Video)
+
+    def team_video_update_handler(self, instance, **kwargs):
+        self.queue_tasks(models.Task.objects.filter(team_video=instance))
+
+    def video_update_handler(self, instance, **kwargs):
+        self.queue_tasks(models.Task.objects.filter(
+            team_video__video=instance))
+
+    @classmethod
+    def queue_tasks(cls, qs):
+        """Queue tasks to be updated in the index
+
+        Call this after changing tasks with QuerySet.update(), since that
+        doesn't send the signals that CelerySearchIndex listens for.  Deleted
+        tasks get queued too, which removes them from the index.
+        """
+        cls.queue_task_ids(qs.values_list('id', flat=True))
+
+    @classmethod
+    def queue_task_ids(cls, task_ids):
+        for task_id in task_ids:
+            queue_update(models.Task, task_id)
+
+    @classmethod
+    def results_for_team(cls, team):
+        return SearchQuerySet().models(models.Task).filter(team_id=team.id)
+
+    @classmethod
+    def search_ids(cls, team, query, limit):
+        """Get the ids of a team's tasks that match a search query
+
+        Returns at most limit ids.
+        """
+        qs = cls.results_for_team(team)
+        for term in get_terms(query):
+            qs = qs.auto_query(qs.query.clean(term).decode('utf-8'))
+        return [int(result.pk) for result in qs[:limit]]
+
 try:
     site.register(models.TeamVideo, TeamVideoLanguagesIndex)
 except AlreadyRegistered:
     # i hate python imports with all my will.
     # i hope they die.
     pass
+
+try:
+    site.register(models.Task, TaskIndex)
+except AlreadyRegistered:
+    pass
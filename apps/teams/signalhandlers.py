@@ -16,11 +16,14 @@
 # along with this program.  If not, see 
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+from celery.signals import task_prerun, task_postrun
+from django.core.signals import request_started, request_finished
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 
 from auth.models import CustomUser as User
-from teams.models import TeamVideo, TeamMember, MembershipNarrowing
+from teams import cache as team_cache
+from teams.models import Team, TeamVideo, TeamMember, MembershipNarrowing
 from teams.signals import api_teamvideo_new
 from videos.signals import feed_imported
 
@@ -38,11 +41,23 @@ def on_feed_imported(signal, sender, new_videos, **kwargs):
 @receiver(post_delete, sender=TeamMember)
 def on_team_member_change(sender, instance, **kwargs):
     User.cache.invalidate_by_pk(instance.user_id)
+    Team.cache.invalidate_by_pk(instance.team_id)
+    team_cache.clear_memo(instance.team_id)
 
 @receiver(post_save, sender=MembershipNarrowing)
 @receiver(post_delete, sender=MembershipNarrowing)
 def on_membership_narrowing_change(sender, instance, **kwargs):
     try:
-        User.cache.invalidate_by_pk(instance.member.user_id)
+        member = instance.member
     except TeamMember.DoesNotExist:
-        pass
+        return
+    User.cache.invalidate_by_pk(member.user_id)
+    Team.cache.invalidate_by_pk(member.team_id)
+    team_cache.clear_memo(member.team_id)
+
+@receiver(request_started)
+@receiver(request_finished)
+@receiver(task_prerun)
+@receiver(task_postrun)
+def clear_team_cache_memo(sender, **kwargs):
+    team_cache.clear_memo()
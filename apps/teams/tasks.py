@@ -6,12 +6,13 @@ logger = logging.getLogger('teams.tasks')
 from celery.schedules import crontab, timedelta
 from celery.task import task
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.sites.models import Site
 from django.db.models import F
 from django.utils.translation import ugettext_lazy as _
 from haystack import site
 
-from utils import send_templated_email
+from utils.bulkemail import send_templated_email_bulk
 from utils.metrics import Gauge, Meter
 from widget.video_cache import (
     invalidate_cache as invalidate_video_cache,
@@ -21,7 +22,6 @@ from widget.video_cache import (
 
 from utils.metrics import Timer
 from utils.text import fmt
-from videos.tasks import video_changed_tasks
 
 @task()
 def invalidate_video_caches(team_id):
@@ -50,18 +50,86 @@ def invalidate_video_visibility_caches(team):
     for video_id in team.teamvideo_set.values_list("video__video_id", flat=True):
         invalidate_video_visibility(video_id)
 
+VISIBILITY_CHUNK_SIZE = getattr(settings, 'TEAM_VISIBILITY_CHUNK_SIZE', 500)
+# Max number of chunks to handle in one update_video_public_field run.  If
+# there are more videos left after that, we schedule another run.
+VISIBILITY_MAX_CHUNKS = getattr(settings, 'TEAM_VISIBILITY_MAX_CHUNKS', 20)
+VISIBILITY_PROGRESS_TIMEOUT = 60 * 60 * 24
+
+def _visibility_progress_key(team_id):
+    return 'team-visibility-progress:{0}'.format(team_id)
+
+def get_video_public_field_progress(team_id):
+    """Get the progress of the last update_video_public_field job for a team
+
+    :returns: dict with the done, total, last_id and finished keys, or None
+        if there hasn't been a job recently
+    """
+    return cache.get(_visibility_progress_key(team_id))
+
 @task()
-def update_video_public_field(team_id):
+def update_video_public_field(team_id, start_after=None):
+    """Set Video.is_public for a team's videos after is_visible changes
+
+    We update all the videos with a single UPDATE statement and invalidate
+    the team cache, then walk through the team videos in id order,
+    reindexing them and invalidating their caches VISIBILITY_CHUNK_SIZE
+    videos at a time.  Progress is stored in the cache after each chunk
+    (see get_video_public_field_progress()).
+
+    To resume a job that was interrupted, call this with start_after set to
+    the last_id from the progress data.
+    """
     from teams.models import Team
+    from videos.models import Video
 
-    with Timer("update-video-public-field-time"):
-        team = Team.objects.get(pk=team_id)
+    team = Team.objects.get(pk=team_id)
+    if start_after is None:
+        with Timer("update-video-public-field-time"):
+            (Video.objects.filter(teamvideo__team=team)
+             .update(is_public=team.is_visible))
+        Team.cache.invalidate_by_pk(team.pk)
+        start_after = 0
+    progress = {
+        'done': team.teamvideo_set.filter(id__lte=start_after).count(),
+        'total': team.teamvideo_set.count(),
+        'last_id': start_after,
+        'finished': False,
+    }
+    for i in xrange(VISIBILITY_MAX_CHUNKS):
+        team_videos = list(team.teamvideo_set
+                           .filter(id__gt=progress['last_id'])
+                           .select_related('video', 'team', 'project')
+                           .order_by('id')[:VISIBILITY_CHUNK_SIZE])
+        if not team_videos:
+            break
+        with Timer("update-video-public-field-chunk-time"):
+            _update_video_visibility_chunk(team_videos)
+        progress['done'] += len(team_videos)
+        progress['last_id'] = team_videos[-1].id
+        cache.set(_visibility_progress_key(team_id), progress,
+                  VISIBILITY_PROGRESS_TIMEOUT)
+        Meter('update-video-public-field.videos').inc(len(team_videos))
+    else:
+        update_video_public_field.delay(team_id, progress['last_id'])
+        return
+    progress['finished'] = True
+    cache.set(_visibility_progress_key(team_id), progress,
+              VISIBILITY_PROGRESS_TIMEOUT)
 
-        for team_video in team.teamvideo_set.all():
-            video = team_video.video
-            video.is_public = team.is_visible
-            video.save()
-            video_changed_tasks(video.id)
+def _update_video_visibility_chunk(team_videos):
+    from teams.models import TeamVideo
+    from teams.search_indexes import prefetch_index_data
+    from videos.models import Video
+
+    videos = [tv.video for tv in team_videos]
+    Video.cache.invalidate_many_by_pk([video.pk for video in videos])
+    prefetch_index_data(team_videos)
+    team_video_index = site.get_index(TeamVideo)
+    team_video_index.backend.update(team_video_index, team_videos,
+                                    commit=False)
+    video_index = site.get_index(Video)
+    video_index.backend.update(video_index, videos)
 
 @task
 def expire_tasks():
@@ -110,32 +178,32 @@ def _notify_teams_of_new_videos(team_qs):
     for team in team_qs:
         if not _team_sends_notification(team, 'block_new_video_message'):
             continue
-        team_videos = TeamVideo.objects.filter(team=team, created__gt=team.last_notification_time)
+        # Fetch the videos once, rather than once per email
+        team_videos = list(TeamVideo.objects
+                           .filter(team=team,
+                                   created__gt=team.last_notification_time)
+                           .select_related('video'))
 
         team.last_notification_time = datetime.now()
         team.save()
         members = team.users.filter( notify_by_email=True, is_active=True) \
-            .distinct()
+            .exclude(email='').distinct()
 
         subject = fmt(_(u'New %(team)s videos ready for subtitling!'),
                       team=team)
 
-        for user in members:
-            if not user.email:
-                continue
-
-            context = {
-                'domain': domain,
-                'user': user,
-                'team': team,
-                'team_videos': team_videos,
-                "STATIC_URL": settings.STATIC_URL,
-            }
+        context = {
+            'domain': domain,
+            'team': team,
+            'team_videos': team_videos,
+            "STATIC_URL": settings.STATIC_URL,
+        }
 
-            Meter('templated-emails-sent-by-type.team.new-videos-ready').inc()
-            send_templated_email(user, subject,
-                                 'teams/email_new_videos.html',
-                                 context, fail_silently=not settings.DEBUG)
+        sent_count = send_templated_email_bulk(
+            members.iterator(), subject, 'teams/email_new_videos.html',
+            context, fail_silently=not settings.DEBUG)
+        Meter('templated-emails-sent-by-type.team.new-videos-ready').inc(
+            sent_count)
 
 
 @task()
@@ -181,6 +249,53 @@ def api_notify_on_application_activity(team_pk, event_name, application_pk):
         team_pk, event_name, application_pk=application_pk)
 
 
+# Deliveries that have been claimed for longer than this were probably
+# claimed by a worker that died.
+CALLBACK_CLAIM_TIMEOUT = 60 * 10
+
+@task(ignore_result=True)
+def send_http_callbacks(notification_setting_id):
+    """Send the pending HTTP callbacks for a TeamNotificationSetting."""
+    from teams import notifications
+    from teams.models import TeamNotificationSetting
+
+    try:
+        notification_setting = TeamNotificationSetting.objects.get(
+            pk=notification_setting_id)
+    except TeamNotificationSetting.DoesNotExist:
+        return
+    count = notifications.send_pending_callbacks(notification_setting)
+    if count >= notifications.CALLBACK_MAX_PER_RUN:
+        # There may be more deliveries ready to send
+        send_http_callbacks.delay(notification_setting_id)
+
+@task(ignore_result=True)
+def retry_http_callbacks():
+    """Schedule send_http_callbacks for any deliveries that are ready to send
+
+    This handles the retries for failed deliveries, once their next_attempt
+    time comes up.  It also picks up deliveries that got lost because a
+    worker died while sending them, and deletes old finished deliveries.
+    """
+    from teams import notifications
+    from teams.models import CallbackDelivery
+
+    released = CallbackDelivery.objects.release_stale_claims(
+        CALLBACK_CLAIM_TIMEOUT)
+    if released:
+        Meter('http-callback.released-claims').inc(released)
+    for notification_setting_id in (CallbackDelivery.objects
+                                    .notification_settings_to_send()):
+        send_http_callbacks.delay(notification_setting_id)
+    Gauge('http-callback.pending').report(CallbackDelivery.objects.filter(
+        status=CallbackDelivery.STATUS_PENDING).count())
+    pruned = CallbackDelivery.objects.prune(
+        notifications.CALLBACK_LOG_RETENTION_DAYS * 24 * 60 * 60,
+        notifications.CALLBACK_PRUNE_BATCH_SIZE)
+    if pruned:
+        Meter('http-callback.pruned').inc(pruned)
+
+
 @task
 def gauge_teams():
     from teams.models import Task, Team, TeamMember
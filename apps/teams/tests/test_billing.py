@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import itertools
 
 from django.test import TestCase
+import mock
 
 from teams.models import BillingRecord, BillingReport, Task
 from subtitles.pipeline import add_subtitles
@@ -185,6 +186,51 @@ class BillingRecordTest(TestCase):
         self.assertEquals(data[video.video_id, 'en']['Minutes'], 2)
         self.assertEquals(data[video.video_id, 'fr']['Minutes'], 2)
 
+    def test_chunks(self):
+        # Test generating the report with records spread across several
+        # chunks
+        date_maker = DateMaker()
+        user = TeamMemberFactory(team=self.team).user
+        videos = [VideoFactory(primary_audio_language_code='en')
+                  for i in range(3)]
+        for video in videos:
+            TeamVideoFactory(team=self.team, video=video, added_by=user)
+            add_subtitles(video, 'en', make_subtitle_lines(4),
+                          created=date_maker.next_date(), complete=True)
+            for language_code in ('fr', 'de'):
+                self.add_subtitles(video, language_code,
+                                   make_subtitle_lines(4),
+                                   created=date_maker.next_date(),
+                                   complete=True)
+        with mock.patch('teams.models.BILLING_REPORT_CHUNK_SIZE', 2):
+            # group_report_rows() checks that there aren't duplicate rows
+            data = self.get_report_data(self.team,
+                                        date_maker.start_date(),
+                                        date_maker.end_date())
+        self.assertEquals(len(data), 9)
+        for video in videos:
+            self.assertEquals(data[video.video_id, 'en']['Language number'],
+                              0)
+            self.assertEquals(data[video.video_id, 'fr']['Language number'],
+                              1)
+            self.assertEquals(data[video.video_id, 'de']['Language number'],
+                              2)
+
+    def test_deleted_video(self):
+        date_maker = DateMaker()
+        user = TeamMemberFactory(team=self.team).user
+        video = VideoFactory(primary_audio_language_code='en')
+        TeamVideoFactory(team=self.team, video=video, added_by=user)
+        self.add_subtitles(video, 'en', make_subtitle_lines(4),
+                           created=date_maker.next_date(), complete=True)
+        BillingRecord.objects.update(video=None)
+        data = self.get_report_data(self.team,
+                                    date_maker.start_date(),
+                                    date_maker.end_date())
+        self.assertEquals(data.keys(), [('deleted', 'en')])
+        self.assertEquals(data['deleted', 'en']['Video Title'], '----')
+        self.assertEquals(data['deleted', 'en']['Language number'], '----')
+
 class ProcessReportTest(TestCase):
     def setUp(self):
         self.team = TeamFactory()
@@ -19,9 +19,12 @@
 from __future__ import absolute_import
 
 from django.test import TestCase
+from nose.tools import *
 
 from caching.tests.utils import assert_invalidates_model_cache
-from teams.models import MembershipNarrowing
+from teams import cache as team_cache
+from teams.models import MembershipNarrowing, Team, TeamMember
+from teams.permissions import get_role_for_target
 from utils.factories import *
 
 class TeamCacheInvalidationTest(TestCase):
@@ -50,3 +53,74 @@ class TeamCacheInvalidationTest(TestCase):
             narrowing.save()
         with assert_invalidates_model_cache(self.team):
             narrowing.delete()
+
+class MembershipSnapshotTest(TestCase):
+    def setUp(self):
+        self.team = TeamFactory()
+        self.admin = TeamMemberFactory(team=self.team,
+                                       role=TeamMember.ROLE_ADMIN)
+        self.member = TeamMemberFactory(team=self.team,
+                                        role=TeamMember.ROLE_MANAGER)
+        self.project = ProjectFactory(team=self.team)
+        MembershipNarrowing.objects.create(
+            member=self.member, language='en', added_by=self.admin)
+        MembershipNarrowing.objects.create(
+            member=self.member, project=self.project, added_by=self.admin)
+        self.user = self.member.user
+        team_cache.clear_memo()
+
+    def test_snapshot(self):
+        membership = self.team.get_membership(self.user)
+        assert_equal(membership.member, self.member)
+        assert_equal(membership.role, TeamMember.ROLE_MANAGER)
+        assert_equal(membership.project_narrowings, set([self.project.id]))
+        assert_equal(membership.language_narrowings, set(['en']))
+
+    def test_outsider(self):
+        membership = self.team.get_membership(UserFactory())
+        assert_equal(membership.member, None)
+        assert_equal(membership.role, TeamMember.ROLE_OUTSIDER)
+        assert_false(membership.has_narrowings())
+
+    def test_shared_between_team_instances(self):
+        self.team.get_membership(self.user)
+        other_team = Team.objects.get(id=self.team.id)
+        with self.assertNumQueries(0):
+            assert_equal(other_team.get_member(self.user), self.member)
+            assert_equal(get_role_for_target(self.user, other_team,
+                                             self.project, 'en'),
+                         TeamMember.ROLE_MANAGER)
+
+    def test_uses_cache_group(self):
+        self.team.get_membership(self.user)
+        team_cache.clear_memo()
+        with self.assertNumQueries(0):
+            self.team.get_membership(self.user)
+
+    def test_narrowing_change_invalidates(self):
+        assert_equal(get_role_for_target(self.user, self.team, None, 'fr'),
+                     TeamMember.ROLE_CONTRIBUTOR)
+        for narrowing in self.member.narrowings.all():
+            narrowing.delete()
+        MembershipNarrowing.objects.create(
+            member=self.member, language='fr', added_by=self.admin)
+        assert_equal(get_role_for_target(self.user, self.team, None, 'fr'),
+                     TeamMember.ROLE_MANAGER)
+
+    def test_member_change_invalidates(self):
+        self.team.get_membership(self.user)
+        self.member.role = TeamMember.ROLE_CONTRIBUTOR
+        self.member.save()
+        assert_equal(Team.objects.get(id=self.team.id)
+                     .get_membership(self.user).role,
+                     TeamMember.ROLE_CONTRIBUTOR)
+
+    def test_clear_memo_on_request(self):
+        self.team.get_membership(self.user)
+        # simulate a change that bypasses the signals
+        TeamMember.objects.filter(id=self.member.id).update(
+            role=TeamMember.ROLE_CONTRIBUTOR)
+        Team.cache.invalidate_by_pk(self.team.id)
+        self.client.get('/')
+        assert_equal(self.team.get_membership(self.user).role,
+                     TeamMember.ROLE_CONTRIBUTOR)
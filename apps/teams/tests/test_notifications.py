@@ -0,0 +1,257 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from datetime import datetime, timedelta
+import json
+import threading
+import urlparse
+
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from teams import notifications
+from teams import tasks
+from teams.models import CallbackDelivery, TeamNotificationSetting
+from utils import test_utils
+from utils.factories import *
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Use HTTP/1.1 so that the client can keep the connection open
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        self.server.requests.append({
+            'path': self.path,
+            'headers': self.headers,
+            'body': body,
+            'client_address': self.client_address,
+        })
+        self.send_response(self.server.response_status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """HTTP server that records the callbacks that we send.
+
+    Each connection gets its own thread, so connections that the client
+    keeps open don't block shutdown().
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.requests = []
+        self.response_status = 200
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s/callback' % self.server_port
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class CallbackTest(TestCase):
+    @test_utils.patch_for_test(
+        'teams.models.TeamNotificationSetting.get_notification_class')
+    def setUp(self, mock_get_notification_class):
+        mock_get_notification_class.return_value = \
+                notifications.BaseNotification
+        self.mock_get_notification_class = mock_get_notification_class
+        self.server = StubServer()
+        self.addCleanup(self.server.stop)
+        notifications.clear_connection_pools()
+        self.addCleanup(notifications.clear_connection_pools)
+        self.team = TeamFactory()
+        self.notification_setting = TeamNotificationSetting.objects.create(
+            team=self.team, request_url=self.server.url)
+
+    def notify(self, event_name='video-new'):
+        return TeamNotificationSetting.objects.notify_team(self.team.pk,
+                                                           event_name)
+
+    def queue_delivery(self, event_name='video-new'):
+        return CallbackDelivery.objects.create(
+            notification_setting=self.notification_setting,
+            event_name=event_name,
+            data=json.dumps({'event': event_name, 'team': self.team.slug}))
+
+    def reload(self, delivery):
+        return CallbackDelivery.objects.get(pk=delivery.pk)
+
+    def test_send(self):
+        self.notify()
+        assert_equal(len(self.server.requests), 1)
+        request = self.server.requests[0]
+        query = urlparse.parse_qs(urlparse.urlparse(request['path']).query)
+        assert_equal(query['event'], ['video-new'])
+        assert_equal(query['team'], [self.team.slug])
+        assert_equal(urlparse.parse_qs(request['body']), query)
+
+        delivery = CallbackDelivery.objects.get()
+        assert_equal(delivery.status, CallbackDelivery.STATUS_DELIVERED)
+        assert_equal(delivery.attempts, 1)
+        assert_equal(delivery.response_status, 200)
+        assert_not_equal(delivery.latency, None)
+
+    def test_connection_reuse(self):
+        self.notify()
+        self.notify()
+        assert_equal(len(self.server.requests), 2)
+        assert_equal(self.server.requests[0]['client_address'],
+                     self.server.requests[1]['client_address'])
+
+    def test_retry(self):
+        self.server.response_status = 500
+        self.notify()
+        delivery = CallbackDelivery.objects.get()
+        assert_equal(delivery.status, CallbackDelivery.STATUS_PENDING)
+        assert_equal(delivery.attempts, 1)
+        assert_equal(delivery.response_status, 500)
+        assert_true(delivery.next_attempt > datetime.now())
+        # we shouldn't retry until next_attempt
+        tasks.retry_http_callbacks.delay()
+        assert_equal(len(self.server.requests), 1)
+
+        self.server.response_status = 200
+        CallbackDelivery.objects.update(
+            next_attempt=datetime.now() - timedelta(seconds=1))
+        tasks.retry_http_callbacks.delay()
+        assert_equal(len(self.server.requests), 2)
+        delivery = self.reload(delivery)
+        assert_equal(delivery.status, CallbackDelivery.STATUS_DELIVERED)
+        assert_equal(delivery.attempts, 2)
+
+    def test_backoff(self):
+        assert_equal(notifications.retry_delay(1),
+                     notifications.CALLBACK_RETRY_DELAY)
+        assert_equal(notifications.retry_delay(3),
+                     notifications.CALLBACK_RETRY_DELAY * 4)
+
+    def test_give_up(self):
+        self.server.response_status = 500
+        delivery = self.queue_delivery()
+        for i in range(notifications.CALLBACK_MAX_ATTEMPTS):
+            CallbackDelivery.objects.update(next_attempt=datetime.now())
+            notifications.send_pending_callbacks(self.notification_setting)
+        delivery = self.reload(delivery)
+        assert_equal(delivery.status, CallbackDelivery.STATUS_FAILED)
+        assert_equal(delivery.attempts, notifications.CALLBACK_MAX_ATTEMPTS)
+
+    def test_connection_error(self):
+        self.server.stop()
+        delivery = self.queue_delivery()
+        notifications.send_pending_callbacks(self.notification_setting)
+        delivery = self.reload(delivery)
+        assert_equal(delivery.status, CallbackDelivery.STATUS_PENDING)
+        assert_equal(delivery.attempts, 1)
+        assert_equal(delivery.response_status, None)
+
+    def test_batching(self):
+        deliveries = [self.queue_delivery('event-%d' % i) for i in range(5)]
+        with mock.patch('teams.notifications.CALLBACK_BATCH_SIZES',
+                        {self.team.slug: 3}):
+            notifications.send_pending_callbacks(self.notification_setting)
+        assert_equal(len(self.server.requests), 2)
+        request = self.server.requests[0]
+        assert_equal(request['headers']['content-type'], 'application/json')
+        assert_equal([e['event'] for e in json.loads(request['body'])['events']],
+                     ['event-0', 'event-1', 'event-2'])
+        for delivery in deliveries:
+            assert_equal(self.reload(delivery).status,
+                         CallbackDelivery.STATUS_DELIVERED)
+
+    def test_claimed_deliveries_not_sent_twice(self):
+        delivery = self.queue_delivery()
+        claimed = CallbackDelivery.objects.claim(self.notification_setting, 10)
+        assert_equal([d.id for d in claimed], [delivery.id])
+        notifications.send_pending_callbacks(self.notification_setting)
+        assert_equal(len(self.server.requests), 0)
+
+    def test_release_stale_claims(self):
+        delivery = self.queue_delivery()
+        CallbackDelivery.objects.claim(self.notification_setting, 10)
+        CallbackDelivery.objects.update(
+            claimed=datetime.now() - timedelta(
+                seconds=tasks.CALLBACK_CLAIM_TIMEOUT + 1))
+        tasks.retry_http_callbacks.delay()
+        assert_equal(len(self.server.requests), 1)
+        assert_equal(self.reload(delivery).status,
+                     CallbackDelivery.STATUS_DELIVERED)
+
+    def test_prune(self):
+        retention = timedelta(
+            days=notifications.CALLBACK_LOG_RETENTION_DAYS, seconds=1)
+        old_delivered = self.queue_delivery()
+        old_failed = self.queue_delivery()
+        old_pending = self.queue_delivery()
+        recent_delivered = self.queue_delivery()
+        CallbackDelivery.objects.filter(pk=old_delivered.pk).update(
+            status=CallbackDelivery.STATUS_DELIVERED,
+            finished=datetime.now() - retention)
+        CallbackDelivery.objects.filter(pk=old_failed.pk).update(
+            status=CallbackDelivery.STATUS_FAILED,
+            finished=datetime.now() - retention)
+        CallbackDelivery.objects.filter(pk=old_pending.pk).update(
+            next_attempt=datetime.now() + timedelta(hours=1),
+            created=datetime.now() - retention)
+        CallbackDelivery.objects.filter(pk=recent_delivered.pk).update(
+            status=CallbackDelivery.STATUS_DELIVERED,
+            finished=datetime.now())
+        tasks.retry_http_callbacks.delay()
+        assert_equal(
+            sorted(CallbackDelivery.objects.values_list('id', flat=True)),
+            sorted([old_pending.id, recent_delivered.id]))
+
+    def test_prune_limit(self):
+        for i in range(3):
+            self.queue_delivery()
+        CallbackDelivery.objects.update(
+            status=CallbackDelivery.STATUS_DELIVERED,
+            finished=datetime.now() - timedelta(days=1))
+        assert_equal(CallbackDelivery.objects.prune(60, 2), 2)
+        assert_equal(CallbackDelivery.objects.count(), 1)
+
+    def test_legacy_send_http_request(self):
+        # Classes that override send_http_request() should still get it
+        # called, without going through the delivery queue
+        class LegacyNotification(notifications.BaseNotification):
+            send_http_request = mock.Mock(return_value=(True, 'ok'))
+        self.mock_get_notification_class.return_value = LegacyNotification
+        assert_true(LegacyNotification.uses_legacy_http_request())
+        assert_false(
+            notifications.BaseNotification.uses_legacy_http_request())
+
+        assert_equal(self.notification_setting.notify('video-new'),
+                     (True, 'ok'))
+        LegacyNotification.send_http_request.assert_called_with(
+            self.server.url, None, None)
+        assert_equal(CallbackDelivery.objects.count(), 0)
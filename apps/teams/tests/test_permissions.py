@@ -38,7 +38,9 @@ from teams.permissions import (
     can_create_task_translate, can_join_team, can_edit_video, can_approve,
     roles_user_can_invite, can_add_video_somewhere, can_assign_tasks,
     can_create_and_edit_translations, save_role, can_remove_video,
-    can_delete_team, can_delete_video, can_post_edit_subtitles
+    can_delete_team, can_delete_video, can_post_edit_subtitles,
+    can_perform_task, can_assign_task, can_delete_task,
+    TaskPermissionEvaluator
 )
 
 
@@ -1123,6 +1125,67 @@ class CanPostEditSubtitlesTest(RolePermissionsTest):
 
     # TODO: Review/approve task tests.
 
+class TaskPermissionEvaluatorTest(BaseTestPermission):
+    # TaskPermissionEvaluator should give the same results as the
+    # per-task permission functions
+    def setUp(self):
+        BaseTestPermission.setUp(self)
+        self.update_team(workflow_enabled=True)
+        WorkflowFactory(team=self.team, review_allowed=20, approve_allowed=10)
+        self.tasks = []
+        for team_video in (self.project_video, self.nonproject_video):
+            self.tasks.extend([
+                TaskFactory(team=self.team, team_video=team_video,
+                            type=Task.TYPE_IDS['Subtitle'], language='en'),
+                TaskFactory(team=self.team, team_video=team_video,
+                            type=Task.TYPE_IDS['Translate'], language='fr'),
+                TaskFactory(team=self.team, team_video=team_video,
+                            type=Task.TYPE_IDS['Approve'], language='fr'),
+            ])
+        # review task for subtitles that the user wrote
+        self.tasks.append(TaskFactory.create_review(self.nonproject_video,
+                                                    'de', self.user))
+
+    def check_tasks(self):
+        tasks = list(Task.objects.filter(team=self.team))
+        evaluator = TaskPermissionEvaluator(self.user, self.team)
+        evaluator.prefetch(tasks)
+        for task in tasks:
+            self.assertEqual(evaluator.can_perform_task(task),
+                             can_perform_task(self.user, task))
+            self.assertEqual(evaluator.can_assign_task(task),
+                             can_assign_task(task, self.user))
+            self.assertEqual(evaluator.can_delete_task(task),
+                             can_delete_task(task, self.user))
+
+    def test_roles(self):
+        for r in [ROLE_CONTRIBUTOR, ROLE_MANAGER, ROLE_ADMIN, ROLE_OWNER]:
+            with self.role(r):
+                self.check_tasks()
+
+    def test_narrowings(self):
+        for r in [ROLE_MANAGER, ROLE_ADMIN]:
+            with self.role(r, project=self.test_project):
+                self.check_tasks()
+            with self.role(r, lang='fr'):
+                self.check_tasks()
+
+    def test_outsider(self):
+        self.check_tasks()
+
+    def test_query_count(self):
+        tasks = list(Task.objects.filter(team=self.team)
+                     .select_related('team_video__video',
+                                     'team_video__project'))
+        with self.role(ROLE_MANAGER):
+            # 1 query for the member, 1 for the narrowings, 1 for the latest
+            # versions and 1 for the workflows
+            with self.assertNumQueries(4):
+                evaluator = TaskPermissionEvaluator(self.user, self.team)
+                evaluator.prefetch(tasks)
+                for task in tasks:
+                    evaluator.can_perform_task(task)
+
 class TestViews(BaseTestPermission):
     def test_save_role(self):
         owner = self.owner
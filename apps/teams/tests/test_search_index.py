@@ -20,8 +20,10 @@ from __future__ import absolute_import
 
 from django.test import TestCase
 from haystack import site
+from nose.tools import *
+import mock
 
-from teams.models import TeamVideo
+from teams.models import Task, TeamVideo
 from subtitles import pipeline
 from utils.factories import *
 
@@ -58,3 +60,104 @@ class SearchRecordTest(TestCase):
         self.assertEquals(
             set(self.get_prepared_data()['video_completed_langs']),
             set(['en', 'fr']))
+
+    def test_prepare_many(self):
+        # prepare_many() should return the same data as prepare()
+        team_video2 = TeamVideoFactory(team=self.team)
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               complete=True)
+        pipeline.add_subtitles(team_video2.video, 'fr', SubtitleSetFactory())
+        TaskFactory(team=self.team, team_video=self.team_video)
+        index = site.get_index(TeamVideo)
+        team_videos = list(TeamVideo.objects
+                           .filter(id__in=[self.team_video.id,
+                                           team_video2.id])
+                           .select_related('video', 'team', 'project')
+                           .order_by('id'))
+        expected = [index.full_prepare(TeamVideo.objects.get(id=tv.id))
+                    for tv in team_videos]
+        self.assertEquals(index.prepare_many(team_videos), expected)
+        self.assertEquals(expected[0]['task_count'], 1)
+        self.assertEquals(expected[0]['num_total_langs'], 1)
+        self.assertEquals(expected[0]['video_completed_langs'], ['en'])
+
+    def test_index_queryset(self):
+        team_video2 = TeamVideoFactory(team=self.team)
+        index = site.get_index(TeamVideo)
+        team_videos = list(index.index_queryset())
+        self.assertEquals(team_videos, [self.team_video, team_video2])
+        for team_video in team_videos:
+            self.assertTrue(team_video._index_data_prefetched)
+
+class TaskSearchRecordTest(TestCase):
+    def setUp(self):
+        self.team_video = TeamVideoFactory(
+            video__title='Video Title', video__meta_1_content='Speaker Name')
+        self.team = self.team_video.team
+
+    def get_prepared_data(self, task):
+        return site.get_index(Task).prepare(task)
+
+    def test_prepare(self):
+        user = UserFactory()
+        task = TaskFactory(team=self.team, team_video=self.team_video,
+                           language='fr', assignee=user, priority=5)
+        data = self.get_prepared_data(task)
+        assert_true('Video Title' in data['text'])
+        assert_true('Speaker Name' in data['text'])
+        assert_equal(data['team_id'], self.team.id)
+        assert_equal(data['project_pk'], self.team_video.project_id)
+        assert_equal(data['task_team_video_pk'], self.team_video.id)
+        assert_equal(data['task_language'], 'fr')
+        assert_equal(data['task_type'], Task.TYPE_IDS['Subtitle'])
+        assert_equal(data['assignee_pk'], user.id)
+        assert_equal(data['task_completed'], False)
+        assert_equal(data['priority'], 5)
+        assert_equal(data['has_expiration'], False)
+
+    def test_unassigned_without_language(self):
+        task = TaskFactory(team=self.team, team_video=self.team_video,
+                           language='')
+        data = self.get_prepared_data(task)
+        assert_equal(data['task_language'], 'no-language')
+        assert_equal(data['assignee_pk'], 0)
+
+    def test_index_queryset_skips_deleted_tasks(self):
+        task = TaskFactory(team=self.team, team_video=self.team_video)
+        TaskFactory(team=self.team, team_video=self.team_video, deleted=True)
+        assert_equal(list(site.get_index(Task).index_queryset()), [task])
+
+    def test_queue_on_video_change(self):
+        task = TaskFactory(team=self.team, team_video=self.team_video)
+        # Deleted tasks should be queued too, so that they get removed from
+        # the index
+        deleted_task = TaskFactory(team=self.team, team_video=self.team_video,
+                                   deleted=True)
+        with mock.patch('teams.search_indexes.queue_update') as queue_update:
+            self.team_video.video.title = 'New Title'
+            self.team_video.video.save()
+        assert_equal(sorted(queue_update.call_args_list), sorted([
+            mock.call(Task, task.id),
+            mock.call(Task, deleted_task.id),
+        ]))
+
+    def test_queue_on_team_video_change(self):
+        task = TaskFactory(team=self.team, team_video=self.team_video)
+        with mock.patch('teams.search_indexes.queue_update') as queue_update:
+            self.team_video.save()
+        assert_equal(queue_update.call_args_list,
+                     [mock.call(Task, task.id)])
+
+    def test_queue_on_move_to_other_team(self):
+        task = TaskFactory(team=self.team, team_video=self.team_video)
+        with mock.patch('teams.search_indexes.queue_update') as queue_update:
+            self.team_video.move_to(TeamFactory())
+        assert_true(mock.call(Task, task.id) in queue_update.call_args_list)
+
+    def test_queue_on_member_delete(self):
+        member = TeamMemberFactory(team=self.team)
+        task = TaskFactory(team=self.team, team_video=self.team_video,
+                           assignee=member.user)
+        with mock.patch('teams.search_indexes.queue_update') as queue_update:
+            member.delete()
+        assert_true(mock.call(Task, task.id) in queue_update.call_args_list)
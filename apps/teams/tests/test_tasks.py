@@ -6,6 +6,7 @@ import json
 from django.test import TestCase
 from django.test.client import Client
 from django.core.urlresolvers import reverse
+import mock
 
 from auth.models import CustomUser as User
 from caching.tests.utils import assert_invalidates_model_cache
@@ -654,6 +655,26 @@ class ViewsTest(TestCase):
         self.check_task_list(tv.task_set.all(), q='person')
         self.check_task_list(tv.task_set.all(), q='pers')
 
+    def test_search_skips_stale_index_results(self):
+        # The search index can return tasks that were deleted or moved to
+        # another team after they were indexed.  We shouldn't list those.
+        video = VideoFactory(primary_audio_language_code='en',
+                             title='MyTitle')
+        tv = TeamVideoFactory(team=self.team, video=video,
+                              added_by=self.admin.user)
+        task = tv.task_set.get()
+        deleted_task = TaskFactory(team=self.team, team_video=tv,
+                                   deleted=True)
+        other_team_video = TeamVideoFactory()
+        other_team_task = TaskFactory(team=other_team_video.team,
+                                      team_video=other_team_video)
+        search_results = [mock.Mock(pk=unicode(t.id))
+                          for t in (deleted_task, task, other_team_task)]
+        with mock.patch('teams.views._search_tasks') as mock_search_tasks:
+            mock_search_tasks.return_value = search_results
+            self.check_task_list([task], q='MyTitle')
+        self.assertEqual(mock_search_tasks.call_args[0][3]['q'], 'MyTitle')
+
 
 class VideoCacheTest(TestCase):
     def test_add_task_invalidates_video_cache(self):
@@ -21,12 +21,15 @@ from __future__ import absolute_import
 from datetime import datetime
 
 from django.test import TestCase
+from nose.tools import *
 import mock
 
 from caching.tests.utils import assert_invalidates_model_cache
+from teams import tasks
 from teams.models import Project, TeamVideoMigration
 from utils import test_utils
 from utils.factories import *
+from videos.models import Video
 
 class TeamVideoCacheTest(TestCase):
     def setUp(self):
@@ -83,3 +86,61 @@ class TeamMoveTest(TestCase):
         self.check_migration(migrations[2], datetime(2013, 01, 03),
                              self.team, self.team2, self.project2)
 
+
+class UpdateVideoPublicFieldTest(TestCase):
+    @test_utils.patch_for_test('teams.tasks.site')
+    def setUp(self, mock_site):
+        self.mock_site = mock_site
+        self.team = TeamFactory(is_visible=True)
+        self.team_videos = [TeamVideoFactory(team=self.team)
+                            for i in range(5)]
+        self.team.is_visible = False
+        self.team.save()
+
+    def updated_team_video_ids(self):
+        backend = self.mock_site.get_index.return_value.backend
+        return [tv.id
+                for call_args in backend.update.call_args_list
+                for tv in call_args[0][1]
+                if tv.__class__ is not Video]
+
+    def test_update(self):
+        tasks.update_video_public_field(self.team.id)
+        assert_equal(Video.objects.filter(teamvideo__team=self.team,
+                                          is_public=True).count(), 0)
+        assert_equal(self.updated_team_video_ids(),
+                     [tv.id for tv in self.team_videos])
+
+    def test_invalidates_caches(self):
+        with assert_invalidates_model_cache(self.team):
+            with assert_invalidates_model_cache(self.team_videos[0].video):
+                tasks.update_video_public_field(self.team.id)
+
+    def test_progress(self):
+        tasks.update_video_public_field(self.team.id)
+        assert_equal(tasks.get_video_public_field_progress(self.team.id), {
+            'done': 5,
+            'total': 5,
+            'last_id': self.team_videos[-1].id,
+            'finished': True,
+        })
+
+    @test_utils.patch_for_test('teams.tasks.update_video_public_field.delay')
+    def test_resume(self, mock_delay):
+        # After VISIBILITY_MAX_CHUNKS we should stop and schedule another
+        # run that starts where we left off
+        with mock.patch('teams.tasks.VISIBILITY_CHUNK_SIZE', 2):
+            with mock.patch('teams.tasks.VISIBILITY_MAX_CHUNKS', 1):
+                tasks.update_video_public_field(self.team.id)
+                last_id = self.team_videos[1].id
+                assert_equal(mock_delay.call_args, mock.call(self.team.id,
+                                                             last_id))
+                progress = tasks.get_video_public_field_progress(self.team.id)
+                assert_equal(progress['done'], 2)
+                assert_false(progress['finished'])
+
+                tasks.update_video_public_field(self.team.id, last_id)
+                progress = tasks.get_video_public_field_progress(self.team.id)
+                assert_equal(progress['done'], 4)
+        assert_equal(self.updated_team_video_ids(),
+                     [tv.id for tv in self.team_videos[:4]])
@@ -12,6 +12,7 @@ from django.core import mail
 from django.core.urlresolvers import reverse
 from django.db.models import ObjectDoesNotExist
 from django.test import TestCase
+import mock
 
 from auth.models import CustomUser as User
 from haystack.query import SearchQuerySet
@@ -65,17 +66,19 @@ class TestNotification(TestCase):
         self.assertEqual(self.team.users.count(), 1)
 
 
-        #mockup for send_templated_email to test context of email
-        import utils
+        #mockup for send_templated_email_bulk to test context of email
+        from utils import bulkemail
 
-        send_templated_email = utils.send_templated_email
+        send_templated_email_bulk = bulkemail.send_templated_email_bulk
 
         def send_templated_email_mockup(to, subject, body_template, body_dict, *args, **kwargs):
             send_templated_email_mockup.context = body_dict
-            send_templated_email(to, subject, body_template, body_dict, *args, **kwargs)
+            return send_templated_email_bulk(to, subject, body_template, body_dict, *args, **kwargs)
 
-        utils.send_templated_email = send_templated_email_mockup
-        reload(tasks)
+        patcher = mock.patch('teams.tasks.send_templated_email_bulk',
+                             send_templated_email_mockup)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         #test notification about two new videos
         TeamVideo.objects.filter(pk__in=[self.tv1.pk, self.tv2.pk]).update(created=datetime.today())
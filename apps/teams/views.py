@@ -64,16 +64,18 @@ from teams.models import (
 from teams.permissions import (
     can_add_video, can_assign_role, can_assign_tasks, can_create_task_subtitle,
     can_create_task_translate, can_view_tasks_tab, can_invite,
-    roles_user_can_assign, can_join_team, can_edit_video, can_delete_tasks,
+    roles_user_can_assign, can_join_team, can_edit_video,
     can_perform_task, can_rename_team, can_change_team_settings,
     can_perform_task_for, can_delete_team, can_delete_video, can_remove_video,
-    can_delete_language, can_move_videos, can_view_stats_tab, can_sort_by_primary_language
+    can_delete_language, can_move_videos, can_view_stats_tab, can_sort_by_primary_language,
+    TaskPermissionEvaluator
 )
+from teams.search_indexes import TaskIndex
 from teams.signals import api_teamvideo_new
 from teams.tasks import (
     invalidate_video_caches, invalidate_video_moderation_caches,
     update_video_moderation, update_one_team_video, update_video_public_field,
-    invalidate_video_visibility_caches, process_billing_report
+    process_billing_report
 )
 from videos.tasks import video_changed_tasks
 from utils import render_to, render_to_json, DEFAULT_PROTOCOL
@@ -86,7 +88,6 @@ from utils.text import fmt
 from utils.translation import (
     get_language_choices, get_language_choices_as_dicts, languages_with_labels, get_user_languages_from_request
 )
-from utils.chunkediter import chunkediter
 from videos.types import UPDATE_VERSION_ACTION
 from videos import metadata_manager
 from videos.models import Action, VideoUrl, Video, VideoFeed
@@ -258,7 +259,6 @@ def settings_basic(request, team):
 
             if is_visible != form.instance.is_visible:
                 update_video_public_field.delay(team.id)
-                invalidate_video_visibility_caches.delay(team)
 
             messages.success(request, _(u'Settings saved.'))
             return HttpResponseRedirect(request.path)
@@ -1061,6 +1061,7 @@ def approvals(request, slug):
                 tasks.update(assignee=request.user,
                              approved=Task.APPROVED_IDS['Approved'],
                              completed=datetime.now())
+                TaskIndex.queue_tasks(tasks)
                 complete_approve_tasks(tasks)
             except:
                 HttpResponseForbidden(_(u'Invalid task to approve'))
@@ -1397,15 +1398,6 @@ def _tasks_list(request, team, project, filters, user):
         languages = request.user.get_languages() + ['']
         tasks = tasks.filter(language__in=languages)
 
-    if filters.get('q'):
-        terms = get_terms(filters['q'])
-        for term in terms:
-            tasks = tasks.filter(
-                Q(team_video__video__title__icontains=term) |
-                Q(team_video__video__meta_1_content__icontains=term) |
-                Q(team_video__video__meta_2_content__icontains=term) |
-                Q(team_video__video__meta_3_content__icontains=term))
-
     if filters.get('type'):
         tasks = tasks.filter(type=Task.TYPE_IDS[filters['type']])
 
@@ -1425,6 +1417,57 @@ def _tasks_list(request, team, project, filters, user):
 
     return tasks
 
+def _search_tasks(request, team, project, filters, user):
+    """Search for tasks using the search index.
+
+    This works like _order_tasks(_tasks_list()), except that it also handles
+    the `q` filter and returns a SearchQuerySet.
+    """
+    tasks = TaskIndex.results_for_team(team)
+
+    if project:
+        tasks = tasks.filter(project_pk=project.pk)
+
+    if filters.get('team_video'):
+        tasks = tasks.filter(task_team_video_pk=filters['team_video'])
+
+    tasks = tasks.filter(task_completed=bool(filters.get('completed')))
+
+    if filters.get('language'):
+        if filters['language'] != 'all':
+            tasks = tasks.filter(task_language_exact=filters['language'])
+    elif request.user.is_authenticated() and request.user.get_languages():
+        languages = request.user.get_languages() + [TaskIndex.NO_LANGUAGE]
+        tasks = tasks.filter(task_language_exact__in=languages)
+
+    for term in get_terms(filters['q']):
+        tasks = tasks.auto_query(tasks.query.clean(term).decode('utf-8'))
+
+    if filters.get('type'):
+        tasks = tasks.filter(task_type=Task.TYPE_IDS[filters['type']])
+
+    assignee = filters.get('assignee')
+    if assignee == 'me':
+        tasks = tasks.filter(assignee_pk=user.id if user else 0)
+    elif assignee and assignee.isdigit():
+        tasks = tasks.filter(assignee_pk=int(assignee))
+    elif assignee and assignee not in ('none', 'anyone'):
+        tasks = tasks.filter(
+            assignee_pk=User.objects.get(username=assignee).id)
+    elif assignee != 'anyone':
+        tasks = tasks.filter(assignee_pk=0)
+
+    sort = request.GET.get('sort', '-created')
+    order_clause = ['-priority']
+    if sort == 'created':
+        order_clause.append('task_created')
+    elif sort == '-created':
+        order_clause.append('-task_created')
+    elif sort in ('expires', '-expires'):
+        tasks = tasks.filter(has_expiration=True)
+        order_clause.append(sort.replace('expires', 'expiration_date'))
+    return tasks.order_by(*order_clause)
+
 def _order_tasks(request, tasks):
     sort = request.GET.get('sort', '-created')
     # Most teams won't use priorities. For those who do, that should be
@@ -1501,21 +1544,30 @@ def old_dashboard(request, team):
         tasks = tasks.select_related('team_video', 'team_video__team',
                                      'team_video__project', 'team_video__video')
 
-        for task in chunkediter(tasks, 100):
-            if not can_perform_task(user, task):
-                continue
-
-            task_vid = task.team_video
+        permissions = TaskPermissionEvaluator(user, team)
+        videos_by_id = {}
+        offset = 0
+        while len(videos) < VIDEOS_ON_PAGE:
+            chunk = list(tasks[offset:offset+100])
+            if not chunk:
+                break
+            offset += len(chunk)
+            permissions.prefetch(chunk)
+            for task in chunk:
+                if not permissions.can_perform_task(task):
+                    continue
 
-            if not task_vid in videos:
-                task_vid.tasks = []
-                videos.append(task_vid)
+                task_vid = videos_by_id.get(task.team_video_id)
+                if task_vid is None:
+                    task_vid = task.team_video
+                    task_vid.tasks = []
+                    videos.append(task_vid)
+                    videos_by_id[task_vid.id] = task_vid
 
-            vid_index = videos.index(task_vid)
-            videos[vid_index].tasks.append(task)
+                task_vid.tasks.append(task)
 
-            if len(videos) >= VIDEOS_ON_PAGE:
-                break
+                if len(videos) >= VIDEOS_ON_PAGE:
+                    break
 
         for video in videos:
             Task.add_cached_video_urls(video.tasks)
@@ -1603,8 +1655,14 @@ def team_tasks(request, slug, project_slug=None):
         else:
             project = None
 
-    tasks = _order_tasks(request,
-                         _tasks_list(request, team, project, filters, user))
+    if filters.get('q'):
+        # Text searches would need a LIKE scan over the video table, so we
+        # use the search index for those.
+        tasks = _search_tasks(request, team, project, filters, user)
+    else:
+        tasks = _order_tasks(request,
+                             _tasks_list(request, team, project, filters,
+                                         user))
     tasks, pagination_info = paginate(tasks, TASKS_ON_PAGE, request.GET.get('page'))
 
     # We pull out the task IDs here for performance.  It's ugly, I know.
@@ -1614,8 +1672,14 @@ def team_tasks(request, slug, project_slug=None):
     # two queries they'll both be fast.
     #
     # Thanks, MySQL.
-    task_ids = list(tasks.values_list('id', flat=True))
-    tasks = list(Task.objects.filter(id__in=task_ids).select_related(
+    if filters.get('q'):
+        task_ids = [int(result.pk) for result in tasks]
+    else:
+        task_ids = list(tasks.values_list('id', flat=True))
+    # The search index can be a bit behind the DB, so filter out tasks that
+    # were deleted or moved to another team since they were indexed.
+    tasks = list(Task.objects.filter(id__in=task_ids, team=team,
+                                     deleted=False).select_related(
             'team_video__video',
             'team_video__team',
             'team_video__project',
@@ -1623,7 +1687,16 @@ def team_tasks(request, slug, project_slug=None):
             'team',
             'new_subtitle_version__subtitle_language',
             'new_subtitle_version__author'))
-    tasks.sort(key=lambda t: task_ids.index(t.pk))
+    task_order = dict((task_id, i) for i, task_id in enumerate(task_ids))
+    tasks.sort(key=lambda t: task_order[t.pk])
+
+    permissions = TaskPermissionEvaluator(request.user, team)
+    permissions.prefetch(tasks)
+    for task in tasks:
+        task.user_can_perform = permissions.can_perform_task(task)
+        task.user_can_assign = permissions.can_assign_task(task)
+        task.user_can_delete = permissions.can_delete_task(task)
+        task.user_can_decline = permissions.can_decline_task(task)
 
     if filters.get('team_video'):
         filters['team_video'] = TeamVideo.objects.get(pk=filters['team_video'])
@@ -1658,8 +1731,8 @@ def team_tasks(request, slug, project_slug=None):
     context = {
         'team': team,
         'project': project, # TODO: Review
-        'user_can_delete_tasks': can_delete_tasks(team, request.user),
-        'user_can_assign_tasks': can_assign_tasks(team, request.user),
+        'user_can_delete_tasks': permissions.can_delete_tasks(),
+        'user_can_assign_tasks': permissions.can_assign_tasks(),
         'assign_form': TaskAssignForm(team, member),
         'languages': languages,
         'tasks': tasks,
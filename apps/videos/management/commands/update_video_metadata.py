@@ -1,38 +1,42 @@
+from optparse import make_option
+import time
+
 from django.core.management.base import BaseCommand
-from videos.models import Video
-from videos.metadata_manager import update_metadata
-from time import sleep
-import logging 
-import sys
-from time import sleep
-import math
+from django.db import transaction
 
-logger = logging.getLogger(__name__)
+from videos.models import Video
+from videos.metadata_manager import update_metadata_bulk
 
 class Command(BaseCommand):
-    
-    def handle(self, *args, **kwargs):
-        print 'Run update_metadata command'
-        targets = Video.objects.all()
-        percent_printed = 0
-        num = targets.count()
-        count = 0
-        print "%s videos to go " % num
-        must_return = False
-        for x in targets.iterator():
-            try:
-                update_metadata(x.pk)
-                percent =  (((count * 1.0) / num) * 100)
-                count +=1          
-                if int(percent) > percent_printed:
-                    percent_printed = int(percent)
-                    print "Done %2s %%" % (percent_printed)
-            except (KeyboardInterrupt, SystemExit):
-                must_return = True
-            except:
-                print "failed for pk %s"  % x.pk
-                logger.exception("metadata import")
-            if must_return:
-                print "stopped at %s" % count
-                return
-            sleep(0.2)
+    help = 'Recalculate the metadata fields for all videos'
+    option_list = BaseCommand.option_list + (
+        make_option('--chunk-size', dest='chunk_size', type='int',
+                    default=1000, help='Videos to update per transaction'),
+        make_option('--sleep', dest='sleep', type='float', default=0.2,
+                    help='Seconds to sleep between chunks'),
+        make_option('--start-id', dest='start_id', type='int', default=0,
+                    help='Start with videos after this id'),
+    )
+
+    def handle(self, *args, **options):
+        last_id = options['start_id']
+        count = changed = 0
+        start_time = time.time()
+        while True:
+            with transaction.commit_on_success():
+                video_ids = list(Video.objects
+                                 .filter(id__gt=last_id)
+                                 .order_by('id')
+                                 .values_list('id', flat=True)
+                                 [:options['chunk_size']])
+                if not video_ids:
+                    break
+                changed += update_metadata_bulk(video_ids)
+            count += len(video_ids)
+            last_id = video_ids[-1]
+            self.stdout.write("%d videos checked, %d changed (last id: %d)\n"
+                              % (count, changed, last_id))
+            self.stdout.flush()
+            time.sleep(options['sleep'])
+        self.stdout.write("done: checked %d videos in %0.1f seconds\n" %
+                          (count, time.time() - start_time))
@@ -16,60 +16,194 @@
 # along with this program.  If not, see
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
+"""videos.metadata_manager -- Update the denormalized fields on Video
+
+Video stores a couple of fields that are calculated from its subtitles and
+team (is_public, is_subtitled, was_subtitled, languages_count, and
+complete_date).  The functions here recalculate them.
+
+We calculate the fields for a group of videos at once, using a single query
+to fetch the tip of each language.  Then we only write the fields that
+changed, using an update() rather than a full save().
+
+update_metadata() gets called after each subtitle change, so it always
+updates Video.edited, even if none of the metadata fields changed.  The
+profile video lists sort on edited and the search index stores it.
+update_metadata_bulk() is for backfills and leaves edited alone for
+unchanged videos.
+"""
+
+from collections import defaultdict
 from datetime import datetime
-from utils.metrics import Timer
+
+from utils.metrics import Meter, Timer
+
+METADATA_FIELDS = (
+    'is_public', 'is_subtitled', 'was_subtitled', 'languages_count',
+    'complete_date',
+)
+
+# Selects the tip of each language, ignoring deleted versions.  This should
+# match SubtitleLanguage.get_tip()
+_TIP_WHERE = """
+subtitles_subtitleversion.version_number = (
+    SELECT MAX(sv2.version_number)
+    FROM subtitles_subtitleversion sv2
+    WHERE sv2.subtitle_language_id =
+        subtitles_subtitleversion.subtitle_language_id
+    AND sv2.visibility_override != 'deleted'
+)
+"""
 
 def update_metadata(video_pk):
+    """Update the metadata fields for a single video.
+
+    This also updates Video.edited, since we get called after subtitle
+    changes.
+
+    Returns True if any of the metadata fields changed.
+    """
     from videos.models import Video
     with Timer('metadata-update-time'):
-        video = Video.objects.get(pk=video_pk)
-        video.edited = datetime.now()
-        video.save()
-        _update_is_public(video)
-        _update_is_was_subtitled(video)
-        _update_languages_count(video)
-        _update_complete_date(video)
-        _invalidate_cache(video)
-
-def _update_is_was_subtitled(video):
-    from subtitles.models import SubtitleLanguage
-    language_code = video.primary_audio_language_code
-    has_version = (SubtitleLanguage.objects.having_nonempty_tip()
-                                           .filter(video=video, 
-                                                   language_code=language_code)
-                                           .exists())
-
-    if not has_version:
-        if video.is_subtitled:
-            video.is_subtitled = False
-            video.save()
-    else:
-        if not video.is_subtitled or not video.was_subtitled:
-            video.is_subtitled = True
-            video.was_subtitled = True
-            video.save()
-
-def _update_languages_count(video):
-    video.languages_count = video.newsubtitlelanguage_set.having_nonempty_tip().count()
-    video.save()
-
-def _update_complete_date(video):
-    is_complete = video.is_complete
-    if is_complete and video.complete_date is None:
-        video.complete_date = datetime.now()
-        video.save()
-    elif not is_complete and video.complete_date is not None:
-        video.complete_date = None
-        video.save()
-
-def _invalidate_cache(video):
+        video_info = _fetch_video_info([video_pk])
+        if not video_info:
+            raise Video.DoesNotExist()
+        changes = calc_metadata_changes(video_info)
+        _save_changes(changes.get(video_pk, {}), [video_pk])
+        # Always invalidate the widget cache.  We get called after subtitle
+        # changes and the widget cache stores the subtitle data, which can
+        # change even if the metadata fields don't.
+        _invalidate_cache(video_info[video_pk]['video_id'])
+        return video_pk in changes
+
+def update_metadata_bulk(video_pks):
+    """Update the metadata fields for a group of videos.
+
+    This is meant for backfills.  The work is done with a few queries for the
+    entire group, and videos that have the same changes are saved with the
+    same UPDATE statement.  Videos where nothing changed aren't written to and
+    don't get their caches invalidated.
+
+    Returns the number of videos that changed.
+    """
+    with Timer('metadata-update-bulk-time'):
+        video_info = _fetch_video_info(video_pks)
+        changes = calc_metadata_changes(video_info)
+        grouped_changes = defaultdict(list)
+        for video_pk, video_changes in changes.items():
+            key = tuple(sorted(video_changes.items()))
+            grouped_changes[key].append(video_pk)
+        for key, pks in grouped_changes.items():
+            _save_changes(dict(key), pks)
+        for video_pk in changes:
+            _invalidate_cache(video_info[video_pk]['video_id'])
+        Meter('metadata-update-bulk.changed').inc(len(changes))
+        return len(changes)
+
+def calc_metadata_changes(video_info):
+    """Calculate the changes to the metadata fields
+
+    Args:
+        video_info: dict returned by _fetch_video_info()
+
+    Returns:
+        dict mapping video ids to a dict of changed fields.  Videos where
+        nothing changed will not be included.
+    """
+    new_values = _calc_metadata(video_info)
+    changes = {}
+    for video_pk, values in new_values.items():
+        current = video_info[video_pk]
+        video_changes = dict((name, value)
+                             for name, value in values.items()
+                             if current[name] != value)
+        if video_changes:
+            changes[video_pk] = video_changes
+    return changes
+
+def _fetch_video_info(video_pks):
+    """Fetch the data we need to calculate the metadata fields.
+
+    Returns a dict mapping video ids to dicts of field values.
+    """
+    from videos.models import Video
+    from teams.models import TeamVideo
+
+    video_info = dict(
+        (info['id'], info) for info in
+        Video.objects.filter(pk__in=video_pks)
+        .values('id', 'video_id', 'primary_audio_language_code',
+                *METADATA_FIELDS))
+    for info in video_info.values():
+        info['team_is_visible'] = None
+    for video_pk, is_visible in (TeamVideo.objects
+                                 .filter(video__in=video_info.keys())
+                                 .values_list('video_id', 'team__is_visible')):
+        video_info[video_pk]['team_is_visible'] = is_visible
+    return video_info
+
+def _calc_metadata(video_info):
+    """Calculate the new values of the metadata fields
+
+    Returns a dict mapping video ids to dicts of field values.
+    """
+    from subtitles.models import SubtitleVersion
+
+    languages_count = defaultdict(int)
+    subtitled = set()
+    # tips of languages marked complete.  These need to be synced for the
+    # video to be complete.
+    complete_tips = defaultdict(list)
+    tips = (SubtitleVersion.objects
+            .filter(video__in=video_info.keys())
+            .extra(where=[_TIP_WHERE])
+            .values_list('id', 'video_id', 'language_code', 'subtitle_count',
+                         'subtitle_language__subtitles_complete'))
+    for (version_id, video_pk, language_code, subtitle_count,
+         subtitles_complete) in tips:
+        if subtitle_count > 0:
+            languages_count[video_pk] += 1
+            primary_language = video_info[video_pk]['primary_audio_language_code']
+            if language_code == primary_language:
+                subtitled.add(video_pk)
+        if subtitles_complete:
+            complete_tips[video_pk].append(version_id)
+
+    complete = set()
+    version_ids = [version_id for ids in complete_tips.values()
+                   for version_id in ids]
+    if version_ids:
+        for version in SubtitleVersion.objects.filter(id__in=version_ids):
+            if version.video_id not in complete and version.is_synced():
+                complete.add(version.video_id)
+
+    now = datetime.now()
+    new_values = {}
+    for video_pk, info in video_info.items():
+        if info['team_is_visible'] is not None:
+            is_public = info['team_is_visible']
+        else:
+            is_public = True
+        if video_pk in complete:
+            complete_date = info['complete_date'] or now
+        else:
+            complete_date = None
+        new_values[video_pk] = {
+            'is_public': is_public,
+            'is_subtitled': video_pk in subtitled,
+            'was_subtitled': info['was_subtitled'] or video_pk in subtitled,
+            'languages_count': languages_count[video_pk],
+            'complete_date': complete_date,
+        }
+    return new_values
+
+def _save_changes(changes, video_pks):
+    from videos.models import Video
+    # update() doesn't run the pre_save handler that sets edited, so we need
+    # to set it ourselves.
+    Video.objects.filter(pk__in=video_pks).update(edited=datetime.now(),
+                                                  **changes)
+
+def _invalidate_cache(video_id):
     from widget import video_cache
-    video_cache.invalidate_cache(video.video_id)
-
-def _update_is_public(video):
-    team_video = video.get_team_video()
-    if team_video:
-        video.is_public = team_video.team.is_visible
-    else:
-        video.is_public = True
-    video.save()
+    video_cache.invalidate_cache(video_id)
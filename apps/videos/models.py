@@ -188,6 +188,14 @@ class SubtitleLanguageFetcher(object):
         if languages is None:
             self.all_languages_fetched = True
 
+    def set_all_languages(self, languages):
+        """Cache languages that were fetched elsewhere.
+
+        languages must contain all the languages for the video.
+        """
+        self.cache = dict((lang.language_code, lang) for lang in languages)
+        self.all_languages_fetched = True
+
     def clear_cache(self):
         self.cache = {}
         self.all_languages_fetched = False
@@ -221,6 +229,10 @@ class VideoCacheManager(ModelCacheManager):
         return self.get_instance(self._pk_for_video_id(video_id),
                                  cache_pattern)
 
+    def get_cache_group_by_video_id(self, video_id, cache_pattern=None):
+        return self.get_cache_group(self._pk_for_video_id(video_id),
+                                    cache_pattern)
+
     def _pk_for_video_id(self, video_id):
         # find the video PK using the video ID.  This should never take a long
         # time so we cache it in several ways
@@ -489,11 +501,30 @@ class Video(models.Model):
         This will return a VideoUrl object.
 
         """
+        if hasattr(self, '_cached_primary_videourl'):
+            return self._cached_primary_videourl
         try:
             return self.videourl_set.filter(primary=True).all()[:1].get()
         except models.ObjectDoesNotExist:
             return None
 
+    @staticmethod
+    def bulk_prefetch_primary_videourls(videos):
+        """Fetch the primary VideoUrl for a list of videos.
+
+        This does a single query for all the videos.  Afterwards,
+        get_primary_videourl_obj() won't require any DB work.
+        """
+        video_map = dict((v.id, v) for v in videos)
+        urls = dict((vurl.video_id, vurl) for vurl in
+                    VideoUrl.objects.filter(video__in=video_map.keys(),
+                                            primary=True))
+        for video_id, video in video_map.items():
+            vurl = urls.get(video_id)
+            if vurl is not None:
+                vurl.video = video
+            video._cached_primary_videourl = vurl
+
     def get_video_url(self):
         """Return the primary video URL for this video if one exists, otherwise None.
 
@@ -726,6 +757,29 @@ class Video(models.Model):
                                                   with_public_tips,
                                                   with_private_tips)
 
+    @staticmethod
+    def bulk_prefetch_languages(videos, with_public_tips=False,
+                                with_private_tips=False):
+        """Prefetch and cache languages/versions for a list of videos
+
+        This works like prefetch_languages(), but it fetches the data for all
+        the videos at once.  The number of queries doesn't depend on the
+        number of videos.
+        """
+        from subtitles.models import SubtitleLanguage
+        video_map = dict((v.id, v) for v in videos)
+        languages = (SubtitleLanguage.objects
+                     .filter(video__in=video_map.keys())
+                     .fetch_and_join(public_tips=with_public_tips,
+                                     private_tips=with_private_tips))
+        languages_by_video = dict((video_id, []) for video_id in video_map)
+        for lang in languages:
+            lang.video = video_map[lang.video_id]
+            languages_by_video[lang.video_id].append(lang)
+        for video_id, video_languages in languages_by_video.items():
+            video_map[video_id]._language_fetcher.set_all_languages(
+                video_languages)
+
     def clear_language_cache(self):
         self._language_fetcher.clear_cache()
 
@@ -17,12 +17,14 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 from datetime import datetime, timedelta
 import logging
+import time
 
 from celery.schedules import crontab, timedelta
 from celery.signals import task_failure
-from celery.task import task
+from celery.task import task, Task
 from django.conf import settings
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db.models import ObjectDoesNotExist
 from haystack import site
@@ -33,7 +35,7 @@ from babelsubs.storage import diff as diff_subtitles
 from messages.models import Message
 from messages import tasks
 from utils import send_templated_email, DEFAULT_PROTOCOL
-from utils.metrics import Gauge, Meter
+from utils.metrics import Gauge, Histogram, Meter
 from videos.models import VideoFeed, Video, VIDEO_TYPE_YOUTUBE, VideoUrl
 from subtitles.models import (
     SubtitleLanguage, SubtitleVersion
@@ -137,22 +139,124 @@ def raise_exception(msg, **kwargs):
     logger.error('Test error logging to Sentry from Celery')
     raise TypeError(msg)
 
-@task()
+# The queue depth is tracked with a counter for each minute, which counts
+# the runs that were scheduled in that minute and haven't started yet.  The
+# counters expire along with the pending keys for that minute, so runs that
+# never happen (the pending key expired or the task got lost) drop out of the
+# depth, rather than making it drift upwards.
+VIDEO_CHANGED_DEPTH_BUCKET_SIZE = 60
+
+def _video_changed_pending_key(video_pk):
+    return 'video-changed-tasks-pending:{}'.format(video_pk)
+
+def _video_changed_bucket_key(video_pk):
+    # Stores the depth bucket that the pending run was counted in
+    return 'video-changed-tasks-pending-bucket:{}'.format(video_pk)
+
+def _video_changed_depth_key(bucket):
+    return 'video-changed-tasks-queue-depth:{}'.format(bucket)
+
+def _video_changed_pending_timeout():
+    return (getattr(settings, 'VIDEO_CHANGED_TASKS_DELAY', 10) +
+            getattr(settings, 'VIDEO_CHANGED_TASKS_PENDING_TIMEOUT', 300))
+
+def _current_depth_bucket():
+    return int(time.time()) // VIDEO_CHANGED_DEPTH_BUCKET_SIZE
+
+def _report_video_changed_queue_depth():
+    """Report the number of pending video_changed_tasks runs."""
+    current = _current_depth_bucket()
+    bucket_count = (_video_changed_pending_timeout() //
+                    VIDEO_CHANGED_DEPTH_BUCKET_SIZE + 2)
+    counts = cache.get_many([_video_changed_depth_key(bucket)
+                             for bucket in xrange(current - bucket_count + 1,
+                                                  current + 1)])
+    Gauge('video-changed-tasks.queue-depth').report(
+        max(sum(counts.values()), 0))
+
+class VideoChangedTask(Task):
+    """Task class for video_changed_tasks that debounces calls to delay()
+
+    Calling delay() schedules the task to run after
+    VIDEO_CHANGED_TASKS_DELAY seconds.  If the task is already scheduled for
+    the video, then we merge the call into the pending run rather than
+    queueing up another one.  This way a burst of edits to a video only
+    results in a single run.
+
+    The work for new versions (notifications and billing records) needs to
+    happen for each version, so that gets queued up separately with
+    video_changed_new_version and is never merged.
+
+    The pending runs are tracked in the cache.  The pending key expires
+    after VIDEO_CHANGED_TASKS_PENDING_TIMEOUT seconds, so if the task gets
+    lost or the queue is backed up, the next call will schedule another run.
+    """
+    abstract = True
+
+    def delay(self, video_pk, new_version_id=None):
+        if new_version_id is not None:
+            video_changed_new_version.delay(new_version_id)
+        countdown = getattr(settings, 'VIDEO_CHANGED_TASKS_DELAY', 10)
+        timeout = _video_changed_pending_timeout()
+        pending_key = _video_changed_pending_key(video_pk)
+        Meter('video-changed-tasks.requested').inc()
+        if cache.add(pending_key, 1, timeout):
+            Meter('video-changed-tasks.scheduled').inc()
+            self._count_scheduled_run(video_pk, timeout)
+            return self.apply_async((video_pk,), countdown=countdown)
+        try:
+            cache.incr(pending_key)
+        except ValueError:
+            # The key expired after our add() call, try again.
+            return self.delay(video_pk)
+        Meter('video-changed-tasks.merged').inc()
+
+    def _count_scheduled_run(self, video_pk, timeout):
+        bucket = _current_depth_bucket()
+        depth_key = _video_changed_depth_key(bucket)
+        cache.set(_video_changed_bucket_key(video_pk), bucket, timeout)
+        # The counter needs to outlive every pending key counted in it
+        cache.add(depth_key, 0, timeout + VIDEO_CHANGED_DEPTH_BUCKET_SIZE)
+        try:
+            cache.incr(depth_key)
+        except ValueError:
+            pass
+        _report_video_changed_queue_depth()
+
+def _clear_video_changed_pending(video_pk):
+    """Clear the pending run for a video and report our metrics
+
+    This gets called at the start of video_changed_tasks, so any changes that
+    happen while the task is running will schedule another run.
+    """
+    pending_key = _video_changed_pending_key(video_pk)
+    bucket_key = _video_changed_bucket_key(video_pk)
+    values = cache.get_many([pending_key, bucket_key])
+    requests = values.get(pending_key)
+    if requests is None:
+        # Either the task was called directly, or the pending key expired.
+        return
+    cache.delete_many([pending_key, bucket_key])
+    if bucket_key in values:
+        try:
+            cache.decr(_video_changed_depth_key(values[bucket_key]))
+        except ValueError:
+            # The counter expired
+            pass
+    _report_video_changed_queue_depth()
+    Histogram('video-changed-tasks.merge-ratio').record(
+        float(requests - 1) / requests)
+
+@task(base=VideoChangedTask)
 def video_changed_tasks(video_pk, new_version_id=None):
     from videos import metadata_manager
     from videos.models import Video
+    from teams.models import TeamVideo
 
-    from teams.models import TeamVideo, BillingRecord
+    _clear_video_changed_pending(video_pk)
     metadata_manager.update_metadata(video_pk)
     if new_version_id is not None:
-        send_new_version_notification(new_version_id)
-        try:
-            BillingRecord.objects.insert_record(
-                SubtitleVersion.objects.get(pk=new_version_id))
-        except Exception, e:
-            celery_logger.error("Could not add billing record", extra={
-                "version_pk": new_version_id,
-                "exception": str(e)})
+        _handle_new_version(new_version_id)
 
     video = Video.objects.get(pk=video_pk)
 
@@ -164,6 +268,22 @@ def video_changed_tasks(video_pk, new_version_id=None):
 
     video.update_search_index()
 
+@task()
+def video_changed_new_version(new_version_id):
+    _handle_new_version(new_version_id)
+
+def _handle_new_version(new_version_id):
+    from teams.models import BillingRecord
+
+    send_new_version_notification(new_version_id)
+    try:
+        BillingRecord.objects.insert_record(
+            SubtitleVersion.objects.get(pk=new_version_id))
+    except Exception, e:
+        celery_logger.error("Could not add billing record", extra={
+            "version_pk": new_version_id,
+            "exception": str(e)})
+
 @task
 def subtitles_complete_changed(language_pk):
     """
@@ -210,18 +210,19 @@ def multi_video_create_subtitles_data_attrs(video):
 
 @register.simple_tag(name='language-list')
 def language_list(video):
-    cached = video.cache.get('language-list')
-    if cached is not None:
-        return cached
+    # This is rendered on every video page, so use get_or_calc_stale() to
+    # avoid a stampede when the cache is invalidated for a popular video.
+    return video.cache.get_or_calc_stale(
+        'language-list', lambda: _render_language_list(video))
+
+def _render_language_list(video):
     video.prefetch_languages(with_public_tips=True,
                              with_private_tips=True)
-    content = render_to_string('videos/_language-list.html', {
+    return render_to_string('videos/_language-list.html', {
         'video': video,
         'language_list': LanguageList(video),
         'STATIC_URL': utils.static_url(),
     })
-    video.cache.set('language-list', content)
-    return content
 
 @register.simple_tag(name='embedder-code')
 def embedder_code(video):
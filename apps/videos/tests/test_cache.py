@@ -17,12 +17,15 @@
 # http://www.gnu.org/licenses/agpl-3.0.html.
 
 from django.test import TestCase
+from nose.tools import *
 
 from caching.tests.utils import assert_invalidates_model_cache
 from subtitles import pipeline
 from subtitles.models import SubtitleLanguage
+from utils import test_utils
 from utils.factories import *
 from videos.models import Action
+from widget import video_cache
 
 class VideoCacheInvalidationTest(TestCase):
     # test a bunch of actions that should invalidate the video cache
@@ -89,3 +92,31 @@ class VideoCacheInvalidationTest(TestCase):
         user = UserFactory()
         with assert_invalidates_model_cache(self.video):
             Action.change_title_handler(self.video, user)
+
+class WidgetVideoCacheTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory()
+
+    def test_values_stored_in_video_cache_group(self):
+        video_urls = video_cache.get_video_urls(self.video.video_id)
+        cache_group = video_cache.get_cache_group(self.video.video_id)
+        assert_equal(cache_group.get('widget-video-urls'), video_urls)
+
+    def test_invalidate_cache(self):
+        test_utils.invalidate_widget_video_cache.run_original_for_test()
+        video_cache.get_video_urls(self.video.video_id)
+        video_cache.invalidate_cache(self.video.video_id)
+        cache_group = video_cache.get_cache_group(self.video.video_id)
+        assert_equal(cache_group.get('widget-video-urls'), None)
+
+    def test_video_changes_invalidate(self):
+        # The Video.cache signal handlers should also invalidate the widget
+        # values
+        video_cache.get_video_urls(self.video.video_id)
+        VideoURLFactory(video=self.video)
+        assert_equal(len(video_cache.get_video_urls(self.video.video_id)), 2)
+
+    def test_invalidate_missing_video(self):
+        test_utils.invalidate_widget_video_cache.run_original_for_test()
+        # this should be a no-op rather than raising an exception
+        video_cache.invalidate_cache('not-a-video-id')
@@ -23,7 +23,9 @@ from BeautifulSoup import BeautifulSoup
 from babelsubs.storage import SubtitleSet
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
+from django.core.cache import cache
 from django.test import TestCase
+import mock
 
 from auth.models import CustomUser as User
 from comments.forms import CommentForm
@@ -34,8 +36,12 @@ from subtitles.models import (
     SubtitleLanguage, SubtitleVersion
 )
 from subtitles import pipeline
+from utils import test_utils
+import videos.tasks
 from utils.factories import *
-from videos.tasks import video_changed_tasks, send_change_title_email, send_new_version_notification
+from videos.tasks import (video_changed_tasks, send_change_title_email,
+                          send_new_version_notification,
+                          _video_changed_pending_key)
 
 class SendChangeTitleTaskTest(TestCase):
     def setUp(self):
@@ -70,6 +76,76 @@ class SendChangeTitleTaskTest(TestCase):
         self.run_send_change_title_email(None)
         self.check_emails([self.follower])
 
+class VideoChangedTasksDebounceTest(TestCase):
+    def setUp(self):
+        # video_changed_tasks is replaced with a mock for the tests, use the
+        # real task so that we test the debounce code in delay()
+        self.task = test_utils.video_changed_tasks.original_func
+        self.video = VideoFactory()
+        self.video2 = VideoFactory()
+        for video in (self.video, self.video2):
+            cache.delete(_video_changed_pending_key(video.pk))
+        patcher = mock.patch.object(self.task, 'apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        time_patcher = mock.patch('videos.tasks.time')
+        self.mock_time = time_patcher.start()
+        self.mock_time.time.return_value = 1000000.0
+        self.addCleanup(time_patcher.stop)
+        gauge_patcher = mock.patch('videos.tasks.Gauge')
+        self.mock_gauge = gauge_patcher.start()
+        self.addCleanup(gauge_patcher.stop)
+
+    def last_queue_depth(self):
+        return self.mock_gauge.return_value.report.call_args[0][0]
+
+    def test_merge_calls(self):
+        self.task.delay(self.video.pk)
+        self.task.delay(self.video.pk)
+        self.task.delay(self.video2.pk)
+        self.assertEqual(sorted(self.apply_async.call_args_list), sorted([
+            mock.call((self.video.pk,), countdown=mock.ANY),
+            mock.call((self.video2.pk,), countdown=mock.ANY),
+        ]))
+        self.assertEqual(
+            cache.get(_video_changed_pending_key(self.video.pk)), 2)
+
+    def test_run_clears_pending(self):
+        # once the task runs, the next call should schedule another run
+        self.task.delay(self.video.pk)
+        self.task(self.video.pk)
+        self.assertEqual(
+            cache.get(_video_changed_pending_key(self.video.pk)), None)
+        self.task.delay(self.video.pk)
+        self.assertEqual(self.apply_async.call_count, 2)
+
+    def test_queue_depth(self):
+        self.task.delay(self.video.pk)
+        self.task.delay(self.video.pk)
+        self.task.delay(self.video2.pk)
+        self.assertEqual(self.last_queue_depth(), 2)
+        self.task(self.video.pk)
+        self.assertEqual(self.last_queue_depth(), 1)
+
+    def test_queue_depth_with_expired_pending_key(self):
+        # If a pending run never happens, it should drop out of the queue
+        # depth once its pending key expires.
+        self.task.delay(self.video.pk)
+        self.assertEqual(self.last_queue_depth(), 1)
+        self.mock_time.time.return_value += (
+            videos.tasks._video_changed_pending_timeout() +
+            videos.tasks.VIDEO_CHANGED_DEPTH_BUCKET_SIZE * 2)
+        self.task.delay(self.video2.pk)
+        self.assertEqual(self.last_queue_depth(), 1)
+
+    @mock.patch('videos.tasks.video_changed_new_version')
+    def test_new_versions_not_merged(self, video_changed_new_version):
+        self.task.delay(self.video.pk, 1)
+        self.task.delay(self.video.pk, 2)
+        self.assertEqual(self.apply_async.call_count, 1)
+        self.assertEqual(video_changed_new_version.delay.call_args_list,
+                         [mock.call(1), mock.call(2)])
+
 class TestVideoChangedEmailNotification(TestCase):
     def setUp(self):
         self.user_1 = User.objects.create(username='user_1')
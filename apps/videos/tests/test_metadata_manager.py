@@ -0,0 +1,100 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from __future__ import absolute_import
+
+from datetime import timedelta
+
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from subtitles import pipeline
+from utils import test_utils
+from utils.factories import *
+from videos import metadata_manager
+from videos.models import Video
+
+class UpdateMetadataTest(TestCase):
+    def setUp(self):
+        self.video = VideoFactory(primary_audio_language_code='en')
+
+    def reload_video(self):
+        return Video.objects.get(pk=self.video.pk)
+
+    def test_update(self):
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory(),
+                               complete=True)
+        pipeline.add_subtitles(self.video, 'fr', SubtitleSetFactory())
+        assert_true(metadata_manager.update_metadata(self.video.pk))
+        video = self.reload_video()
+        assert_equal(video.languages_count, 2)
+        assert_true(video.is_subtitled)
+        assert_true(video.was_subtitled)
+        assert_not_equal(video.complete_date, None)
+        assert_true(video.is_public)
+
+    def test_no_changes(self):
+        metadata_manager.update_metadata(self.video.pk)
+        assert_false(metadata_manager.update_metadata(self.video.pk))
+
+    def test_subtitle_only_change_updates_edited(self):
+        # Adding a version that doesn't change any of the metadata fields
+        # should still update edited
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory())
+        metadata_manager.update_metadata(self.video.pk)
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory())
+        later = (self.reload_video().edited +
+                 timedelta(hours=1)).replace(microsecond=0)
+        with mock.patch('videos.metadata_manager.datetime') as mock_datetime:
+            mock_datetime.now.return_value = later
+            assert_false(metadata_manager.update_metadata(self.video.pk))
+        assert_equal(self.reload_video().edited, later)
+
+    def test_deleted_tip(self):
+        pipeline.add_subtitles(self.video, 'en', SubtitleSetFactory())
+        v2 = pipeline.add_subtitles(self.video, 'en', [])
+        metadata_manager.update_metadata(self.video.pk)
+        assert_equal(self.reload_video().languages_count, 0)
+        v2.visibility_override = 'deleted'
+        v2.save()
+        metadata_manager.update_metadata(self.video.pk)
+        video = self.reload_video()
+        assert_equal(video.languages_count, 1)
+        assert_true(video.is_subtitled)
+
+    def test_team_visibility(self):
+        TeamVideoFactory(video=self.video, team=TeamFactory(is_visible=False))
+        metadata_manager.update_metadata(self.video.pk)
+        assert_false(self.reload_video().is_public)
+
+    def test_bulk(self):
+        video2 = VideoFactory(primary_audio_language_code='en')
+        video3 = VideoFactory(primary_audio_language_code='en')
+        for video in (self.video, video2):
+            pipeline.add_subtitles(video, 'en', SubtitleSetFactory())
+        assert_equal(metadata_manager.update_metadata_bulk(
+            [self.video.pk, video2.pk, video3.pk]), 2)
+        for video in (self.video, video2):
+            video = test_utils.reload_obj(video)
+            assert_equal(video.languages_count, 1)
+            assert_true(video.is_subtitled)
+        assert_equal(test_utils.reload_obj(video3).languages_count, 0)
+        # running it again shouldn't change anything
+        assert_equal(metadata_manager.update_metadata_bulk(
+            [self.video.pk, video2.pk, video3.pk]), 0)
@@ -100,10 +100,12 @@ class Rpc(BaseRpc):
 
 
     # Widget
-    def _check_visibility_policy_for_widget(self, request, video_id):
+    def _check_visibility_policy_for_widget(self, request, video_id,
+                                            cache_group=None):
         """Return an error if the user cannot see the widget, None otherwise."""
 
-        visibility_policy = video_cache.get_visibility_policies(video_id)
+        visibility_policy = video_cache.get_visibility_policies(video_id,
+                                                                cache_group)
 
         if not visibility_policy.get("is_public", True):
             team = Team.objects.get(id=visibility_policy['team_id'])
@@ -111,11 +113,12 @@ class Rpc(BaseRpc):
             if not team.is_member(request.user):
                 return {"error_msg": _("Video embedding disabled by owner")}
 
-    def _get_video_urls_for_widget(self, video_url, video_id):
+    def _get_video_urls_for_widget(self, video_url, video_id,
+                                   cache_group=None):
         """Return the video URLs, 'cleaned' video id, and error."""
 
         try:
-            video_urls = video_cache.get_video_urls(video_id)
+            video_urls = video_cache.get_video_urls(video_id, cache_group)
         except models.Video.DoesNotExist:
             video_cache.invalidate_video_id(video_url)
 
@@ -136,7 +139,8 @@ class Rpc(BaseRpc):
             language = request.user.preferred_language
         return language if language != '' else None
 
-    def _get_subtitles_for_widget(self, request, base_state, video_id, is_remote):
+    def _get_subtitles_for_widget(self, request, base_state, video_id,
+                                  is_remote, cache_group=None):
         # keeping both forms valid as backwards compatibility layer
         lang_code = base_state and base_state.get("language_code", base_state.get("language", None))
 
@@ -144,18 +148,22 @@ class Rpc(BaseRpc):
             lang_pk = base_state.get('language_pk', None)
 
             if lang_pk is  None:
-                lang_pk = video_cache.pk_for_default_language(video_id, lang_code)
+                lang_pk = video_cache.pk_for_default_language(
+                    video_id, lang_code, cache_group)
 
             return self._autoplay_subtitles(request.user, video_id, lang_pk,
-                                            base_state.get('revision', None))
+                                            base_state.get('revision', None),
+                                            cache_group)
         else:
             if is_remote:
                 autoplay_language = self._find_remote_autoplay_language(request)
-                language_pk = video_cache.pk_for_default_language(video_id, autoplay_language)
+                language_pk = video_cache.pk_for_default_language(
+                    video_id, autoplay_language, cache_group)
 
                 if autoplay_language is not None:
                     return self._autoplay_subtitles(request.user, video_id,
-                                                    language_pk, None)
+                                                    language_pk, None,
+                                                    cache_group)
 
     def show_widget(self, request, video_url, is_remote, base_state=None, additional_video_urls=None):
         try:
@@ -167,22 +175,37 @@ class Rpc(BaseRpc):
         if video_id is None:
             return None
 
-        error = self._check_visibility_policy_for_widget(request, video_id)
+        # Use a single cache group for all the video data.  This lets us
+        # fetch everything with 1 cache request.
+        try:
+            cache_group = video_cache.get_cache_group(video_id)
+        except models.Video.DoesNotExist:
+            cache_group = None
+
+        error = self._check_visibility_policy_for_widget(request, video_id,
+                                                         cache_group)
 
         if error:
             return error
 
-        video_urls, video_id, error = self._get_video_urls_for_widget(video_url, video_id)
+        original_video_id = video_id
+        video_urls, video_id, error = self._get_video_urls_for_widget(
+            video_url, video_id, cache_group)
 
         if error:
             return error
 
+        if cache_group is None or video_id != original_video_id:
+            cache_group = video_cache.get_cache_group(video_id)
+
         resp = {
             'video_id' : video_id,
             'subtitles': None,
             'video_urls': video_urls,
-            'is_moderated': video_cache.get_is_moderated(video_id),
-            'filename': video_cache.get_download_filename(video_id),
+            'is_moderated': video_cache.get_is_moderated(video_id,
+                                                         cache_group),
+            'filename': video_cache.get_download_filename(video_id,
+                                                          cache_group),
         }
 
         if additional_video_urls is not None:
@@ -194,10 +217,12 @@ class Rpc(BaseRpc):
         if request.user.is_authenticated():
             resp['username'] = request.user.username
 
-        resp['drop_down_contents'] = video_cache.get_video_languages(video_id)
+        resp['drop_down_contents'] = video_cache.get_video_languages(
+            video_id, cache_group)
         resp['my_languages'] = get_user_languages_from_request(request)
         resp['subtitles'] = self._get_subtitles_for_widget(request, base_state,
-                                                           video_id, is_remote)
+                                                           video_id, is_remote,
+                                                           cache_group)
         return resp
 
     def track_subtitle_play(self, request, video_id):
@@ -1137,10 +1162,12 @@ class Rpc(BaseRpc):
             video.save()
 
 
-    def _autoplay_subtitles(self, user, video_id, language_pk, version_number):
+    def _autoplay_subtitles(self, user, video_id, language_pk, version_number,
+                            cache_group=None):
         cache =  video_cache.get_subtitles_dict(video_id, language_pk,
                                                 version_number,
-                                                lambda version: self._subtitles_dict(version=version))
+                                                lambda version: self._subtitles_dict(version=version),
+                                                cache_group=cache_group)
 
         if cache and cache.get("language", None) is not None:
             cache['language_code'] = cache['language'].language
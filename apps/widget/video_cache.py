@@ -18,7 +18,6 @@
 import datetime
 import hashlib
 
-from django.conf import settings
 from django.core.cache import cache
 from django.utils.translation import (
     ugettext_lazy as _
@@ -70,40 +69,34 @@ def associate_extra_url(video_url, video_id):
         cache.set(cache_key, video_url.videoid, TIMEOUT)
 
 
-# Invalidation
-def invalidate_cache(video_id):
-    cache.delete(_video_urls_key(video_id))
+# Per-video values are stored in the Video's CacheGroup, so invalidating
+# them is just a version bump.  The widget functions accept an optional
+# cache_group argument.  show_widget() creates one group and passes it to all
+# of them.  The "widget" cache pattern means that the first get() fetches
+# all the values we usually need with a single get_many().
 
-    try:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        for l in video.newsubtitlelanguage_set.all():
-            cache.delete(_subtitles_dict_key(video_id, l.pk))
-    except Video.DoesNotExist:
-        pass
+def get_cache_group(video_id):
+    """Get the CacheGroup to use for a video's widget data
 
-    for language in settings.ALL_LANGUAGES:
-        cache.delete(_subtitle_language_pk_key(video_id, language[0]))
+    Raises Video.DoesNotExist if there's no video for video_id.
+    """
+    from videos.models import Video
+    return Video.cache.get_cache_group_by_video_id(video_id, 'widget')
 
-    cache.delete(_subtitle_language_pk_key(video_id, None))
-    cache.delete(_subtitles_dict_key(video_id, None))
-    cache.delete(_subtitles_count_key(video_id))
-    cache.delete(_video_languages_key(video_id))
-    cache.delete(_video_languages_verbose_key(video_id))
-    cache.delete(_video_is_moderated_key(video_id))
-    cache.delete(_video_visibility_policy_key(video_id))
-    cache.delete(_video_filename_key(video_id))
+def _get_or_calc(video_id, cache_group, key, work_func, *args):
+    if cache_group is None:
+        cache_group = get_cache_group(video_id)
+    value = cache_group.get(key)
+    if value is None:
+        value = work_func(*args)
+        cache_group.set(key, value, TIMEOUT)
+    return value
 
+# Invalidation
+def invalidate_cache(video_id):
     from videos.models import Video
     try:
-        video = Video.objects.get(video_id=video_id)
-        for url in video.videourl_set.all():
-            cache.delete(_video_id_key(url.url))
-
-        team_video = video.get_team_video()
-
-        if team_video:
-            cache.delete(_video_completed_languages(team_video.id))
+        Video.cache.get_cache_group_by_video_id(video_id).invalidate()
     except Video.DoesNotExist:
         pass
 
@@ -111,145 +104,118 @@ def invalidate_video_id(video_url):
     cache.delete(_video_id_key(video_url))
 
 def invalidate_video_moderation(video_id):
-    cache.delete(_video_is_moderated_key(video_id))
+    invalidate_cache(video_id)
 
 def invalidate_video_visibility(video_id):
-    cache.delete(_video_visibility_policy_key(video_id))
+    invalidate_cache(video_id)
 
 def on_video_url_save(sender, instance, **kwargs):
+    invalidate_video_id(instance.url)
     if instance.video_id:
         invalidate_cache(instance.video.video_id)
 
 def on_video_url_delete(sender, instance, **kwargs):
+    invalidate_video_id(instance.url)
     if instance.video and instance.video.video_id:
         invalidate_cache(instance.video.video_id)
 
 def _video_id_key(video_url):
     return 'video_id_{0}'.format(hashlib.sha1(video_url).hexdigest())
 
-def _video_urls_key(video_id):
-    return 'widget_video_urls_{0}'.format(video_id)
-
-def _subtitles_dict_key(video_id, language_pk, version_no=None):
-    return 'widget_subtitles_{0}{1}{2}'.format(video_id, language_pk, version_no)
-
-def _subtitles_count_key(video_id):
-    return "subtitle_count_{0}".format(video_id)
-
-def _video_languages_key(video_id):
-    return "widget_video_languages_{0}".format(video_id)
-
-def _video_languages_verbose_key(video_id):
-    return "widget_video_languages_verbose_{0}".format(video_id)
-
-def _video_completed_languages(video_id):
-    return "video_completed_verbose_{0}".format(video_id)
-
 def _video_writelocked_langs_key(video_id):
     return "writelocked_langs_{0}".format(video_id)
 
-def _subtitle_language_pk_key(video_id, language_code):
-    return "sl_pk_{0}{1}".format(video_id, language_code)
-
-def _video_is_moderated_key(video_id):
-    return 'widget_video_is_moderated_{0}'.format(video_id)
+def _team_video_video_pk_key(team_video_id):
+    return "team_video_video_pk_{0}".format(team_video_id)
 
-def _video_filename_key(video_id):
-    return 'widget_video_filename_{0}'.format(video_id)
 
-def _video_visibility_policy_key(video_id):
-    return 'widget_video_vis_key_{0}'.format(video_id)
-
-
-def pk_for_default_language(video_id, language_code):
+def pk_for_default_language(video_id, language_code, cache_group=None):
     # the widget sends langauge code as an empty dict
     # don't ask me why
     language_code = language_code or None
-    cache_key = _subtitle_language_pk_key(video_id, language_code)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-        sl = Video.objects.get(video_id=video_id).subtitle_language(
-            language_code)
-        value = None if sl is None else sl.pk
-        cache.set(cache_key, value, TIMEOUT)
-
-    return value
-
-def get_video_urls(video_id):
-    cache_key = _video_urls_key(video_id)
-    video_urls = cache.get(cache_key)
-
-    if video_urls is None:
-        from videos.models import Video
-        video_urls = [vu.effective_url for vu
-                 in Video.objects.get(video_id=video_id).videourl_set.all()]
-        cache.set(cache_key, video_urls, TIMEOUT)
+    return _get_or_calc(video_id, cache_group,
+                        'widget-sl-pk:{0}'.format(language_code),
+                        _calc_pk_for_default_language, video_id,
+                        language_code)
 
-    return video_urls
-
-def get_subtitles_dict(video_id, language_pk, version_number, 
-                       subtitles_dict_fn, is_remote=False):
+def _calc_pk_for_default_language(video_id, language_code):
+    from videos.models import Video
+    sl = Video.objects.get(video_id=video_id).subtitle_language(language_code)
+    return None if sl is None else sl.pk
 
-    cache_key = _subtitles_dict_key(video_id, language_pk, version_number)
-    cached_value = cache.get(cache_key)
+def get_video_urls(video_id, cache_group=None):
+    return _get_or_calc(video_id, cache_group, 'widget-video-urls',
+                        _calc_video_urls, video_id)
 
-    if cached_value is None:
-        from videos.models import Video
-        from subtitles.models import SubtitleLanguage
-        video = Video.objects.get(video_id=video_id)
+def _calc_video_urls(video_id):
+    from videos.models import Video
+    return [vu.effective_url for vu
+            in Video.objects.get(video_id=video_id).videourl_set.all()]
+
+def get_subtitles_dict(video_id, language_pk, version_number,
+                       subtitles_dict_fn, is_remote=False, cache_group=None):
+    key = 'widget-subtitles:{0}:{1}:{2}'.format(language_pk, version_number,
+                                                is_remote)
+    return _get_or_calc(video_id, cache_group, key, _calc_subtitles_dict,
+                        video_id, language_pk, version_number,
+                        subtitles_dict_fn, is_remote)
+
+def _calc_subtitles_dict(video_id, language_pk, version_number,
+                         subtitles_dict_fn, is_remote):
+    from videos.models import Video
+    from subtitles.models import SubtitleLanguage
+    video = Video.objects.get(video_id=video_id)
 
-        if language_pk is None:
+    if language_pk is None:
+        language = video.subtitle_language()
+    else:
+        try:
+            language = video.newsubtitlelanguage_set.get(pk=language_pk)
+        except SubtitleLanguage.DoesNotExist:
             language = video.subtitle_language()
-        else:
-            try:
-                language = video.newsubtitlelanguage_set.get(pk=language_pk)
-            except SubtitleLanguage.DoesNotExist:
-                language = video.subtitle_language()
-
-        if language:
-            version = language.version(version_number=version_number, public_only=not is_remote)
-
-            if version:
-                cached_value = subtitles_dict_fn(version)
-            else:
-                cached_value = None
 
-            cache.set(cache_key, cached_value, TIMEOUT)
+    if language:
+        version = language.version(version_number=version_number,
+                                   public_only=not is_remote)
+        if version:
+            return subtitles_dict_fn(version)
+    return None
 
-    return cached_value
+def get_video_languages(video_id, cache_group=None):
+    return _get_or_calc(video_id, cache_group, 'widget-languages',
+                        _calc_video_languages, video_id)
 
-def get_video_languages(video_id):
+def _calc_video_languages(video_id):
     from widget.rpc import language_summary
+    from videos.models import Video
+    video = Video.objects.get(video_id=video_id)
+    languages = video.newsubtitlelanguage_set.having_nonempty_versions()
 
-    cache_key = _video_languages_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        languages = video.newsubtitlelanguage_set.having_nonempty_versions()
-
-        team_video = video.get_team_video()
-
-        if team_video:
-            languages = languages.filter(language_code__in=team_video.team.get_readable_langs())
+    team_video = video.get_team_video()
 
-        value = [language_summary(l) for l in languages]
-        cache.set(cache_key, value, TIMEOUT)
+    if team_video:
+        languages = languages.filter(language_code__in=team_video.team.get_readable_langs())
 
-    return value
+    return [language_summary(l) for l in languages]
 
 def get_video_completed_languages(team_video_id):
-    cache_key = _video_completed_languages(team_video_id)
-    languages = cache.get(cache_key)
+    # This is called with the team video id, so we need to look up the video
+    # id to find the cache group.  TeamVideos never change videos, so it's
+    # safe to cache that forever.
+    cache_key = _team_video_video_pk_key(team_video_id)
+    video_pk = cache.get(cache_key)
+    if video_pk is None:
+        from teams.models import TeamVideo
+        video_pk = TeamVideo.objects.get(id=team_video_id).video_id
+        cache.set(cache_key, video_pk, TIMEOUT)
 
+    from videos.models import Video
+    cache_group = Video.cache.get_cache_group(video_pk)
+    languages = cache_group.get('widget-completed-languages')
     if languages is None:
         from videos.models import SubtitleLanguage
         languages = [sl.language for sl in list(SubtitleLanguage.objects.filter(video__teamvideo__id=team_video_id).all())]
-
-        cache.set(cache_key, languages, TIMEOUT)
+        cache_group.set('widget-completed-languages', languages, TIMEOUT)
 
     # i18n is a pain in the ass
     return [(lang, _(unilangs.INTERNAL_NAMES[lang][0])) for lang in languages]
@@ -257,93 +223,79 @@ def get_video_completed_languages(team_video_id):
 def get_video_languages_verbose(video_id, max_items=6):
     # FIXME: we should probably merge a better method with get_video_languages
     # maybe accepting a 'verbose' param?
-    cache_key = _video_languages_verbose_key(video_id)
-    data = cache.get(cache_key)
-
-    if data is None:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        languages_with_version_total = video.subtitlelanguage_set.filter(has_version=True).order_by('-percent_done')
-        total_number = languages_with_version_total.count()
-        languages_with_version = languages_with_version_total[:max_items]
-        data = { "items":[]}
-        if total_number > max_items:
-            data["total"] = total_number - max_items
-        for lang in languages_with_version:
-            # show only with some translation
-            if lang.is_dependent():
-                data["items"].append({
-                    'language': lang.language,
-                    'percent_done': lang.percent_done ,
-                    'language_url': lang.get_absolute_url(),
-                    'is_dependent': True,
-                })
-            else:
-                # append to the beggininig of the list as
-                # the UI will show this first
-                data["items"].insert(0, {
-                    'language': lang.language,
-                    'is_complete': lang.is_complete,
-                    'language_url': lang.get_absolute_url(),
-                })
-        cache.set(cache_key, data, TIMEOUT)
+    return _get_or_calc(video_id, None,
+                        'widget-languages-verbose:{0}'.format(max_items),
+                        _calc_video_languages_verbose, video_id, max_items)
 
+def _calc_video_languages_verbose(video_id, max_items):
+    from videos.models import Video
+    video = Video.objects.get(video_id=video_id)
+    languages_with_version_total = video.subtitlelanguage_set.filter(has_version=True).order_by('-percent_done')
+    total_number = languages_with_version_total.count()
+    languages_with_version = languages_with_version_total[:max_items]
+    data = { "items":[]}
+    if total_number > max_items:
+        data["total"] = total_number - max_items
+    for lang in languages_with_version:
+        # show only with some translation
+        if lang.is_dependent():
+            data["items"].append({
+                'language': lang.language,
+                'percent_done': lang.percent_done ,
+                'language_url': lang.get_absolute_url(),
+                'is_dependent': True,
+            })
+        else:
+            # append to the beggininig of the list as
+            # the UI will show this first
+            data["items"].insert(0, {
+                'language': lang.language,
+                'is_complete': lang.is_complete,
+                'language_url': lang.get_absolute_url(),
+            })
     return data
 
-def get_is_moderated(video_id):
-    cache_key = _video_is_moderated_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        value = video.is_moderated
-        cache.set(cache_key, value, TIMEOUT)
-
-    return value
+def get_is_moderated(video_id, cache_group=None):
+    return _get_or_calc(video_id, cache_group, 'widget-is-moderated',
+                        _calc_is_moderated, video_id)
 
-def get_download_filename(video_id):
-    cache_key = _video_filename_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
-        video = Video.objects.get(video_id=video_id)
-        value = video.get_download_filename()
-        cache.set(cache_key, value, TIMEOUT)
-
-    return value
-
-def get_visibility_policies(video_id):
-    cache_key = _video_visibility_policy_key(video_id)
-    value = cache.get(cache_key)
-
-    if value is None:
-        from videos.models import Video
+def _calc_is_moderated(video_id):
+    from videos.models import Video
+    return Video.objects.get(video_id=video_id).is_moderated
 
-        try:
-            video = Video.objects.get(video_id=video_id)
-        except Video.DoesNotExist:
-            return {}
+def get_download_filename(video_id, cache_group=None):
+    return _get_or_calc(video_id, cache_group, 'widget-filename',
+                        _calc_download_filename, video_id)
 
-        team_video = video.get_team_video()
+def _calc_download_filename(video_id):
+    from videos.models import Video
+    return Video.objects.get(video_id=video_id).get_download_filename()
 
-        if team_video:
-            team = team_video.team
-            is_public = team.is_visible
-            team_id = team.id
-        else:
-            is_public = True
-            team_id = None
+def get_visibility_policies(video_id, cache_group=None):
+    from videos.models import Video
+    try:
+        return _get_or_calc(video_id, cache_group, 'widget-visibility',
+                            _calc_visibility_policies, video_id)
+    except Video.DoesNotExist:
+        return {}
 
-        value = {
-            "is_public": is_public,
-            "team_id": team_id
-        }
+def _calc_visibility_policies(video_id):
+    from videos.models import Video
+    video = Video.objects.get(video_id=video_id)
+    team_video = video.get_team_video()
 
-        cache.set(cache_key, value, TIMEOUT)
+    if team_video:
+        team = team_video.team
+        is_public = team.is_visible
+        team_id = team.id
+    else:
+        is_public = True
+        team_id = None
 
-    return value
+    return {
+        "is_public": is_public,
+        "team_id": team_id
+    }
 
 # Writelocking
 def _writelocked_store_langs(video_id, langs):
@@ -85,6 +85,14 @@ CELERYBEAT_SCHEDULE = {
         'task': 'externalsites.tasks.retry_failed_sync',
         'schedule': timedelta(seconds=10),
     },
+    'retry_http_callbacks': {
+        'task': 'teams.tasks.retry_http_callbacks',
+        'schedule': timedelta(seconds=60),
+    },
+    'flush_search_index_queue': {
+        'task': 'utils.celery_search_index.flush_search_index_queue',
+        'schedule': timedelta(seconds=10),
+    },
 }
 
 __all__ = ['CELERYBEAT_SCHEDULE', 'CELERY_QUEUES', ]
@@ -73,6 +73,28 @@ def render_to_json(func):
         return HttpResponse(content, mimetype="application/json")
     return update_wrapper(wrapper, func)
 
+def email_for_recipient(recipient, check_user_preference=True):
+    """Get the email address to send to for an email recipient
+
+    recipient can be a User or an email address.  If passed a User, check
+    that they have opted in for email notification unless
+    check_user_preference is False (useful for example for password
+    retrivals, else users that have opted out of email notifications can
+    never recover their passowrd).
+
+    Returns None if we shouldn't send the email to the recipient.
+    """
+    from auth.models import CustomUser
+    from django.contrib.auth.models import User
+    if isinstance(recipient, User) or isinstance(recipient, CustomUser):
+        if not bool(recipient.email):
+            return None
+        if check_user_preference is False or recipient.notify_by_email:
+            return recipient.email
+        return None
+    else:
+        return recipient
+
 def send_templated_email(to, subject, body_template, body_dict,
                          from_email=None, ct="html", fail_silently=False,
                          check_user_preference=True):
@@ -85,24 +107,14 @@ def send_templated_email(to, subject, body_template, body_dict,
              situations where you must send the email, for example on
              password retrivals.
     """
-    from auth.models import CustomUser
-    from django.contrib.auth.models import User
     to_unchecked = to
     if not isinstance(to_unchecked, list):
         to_unchecked = [to]
     to = []
-    # if passed a User, check that he has opted in for email notification
-    # unless check_user_preference is False (useful for example for password)
-    # retrivals, else users that have opted out of email notifications
-    # can never recover their passowrd
     for recipient in to_unchecked:
-        if isinstance(recipient, User) or isinstance(recipient, CustomUser):
-            if not bool(recipient.email):
-                continue
-            if check_user_preference is False or  recipient.notify_by_email:
-                to.append(recipient.email)
-        else:
-            to.append(recipient)
+        email = email_for_recipient(recipient, check_user_preference)
+        if email is not None:
+            to.append(email)
     if not from_email: from_email = settings.DEFAULT_FROM_EMAIL
 
     body_dict['domain'] = Site.objects.get_current().domain
@@ -0,0 +1,236 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""utils.bulkemail -- Send a templated email to lots of recipients
+
+send_templated_email_bulk() works like send_templated_email(), but it's
+optimized for sending the same email to many users:
+
+- The template is only rendered once.  While rendering, the recipient
+  variable (usually "user") is a placeholder object.  Outputting the
+  placeholder, or any attribute of it, outputs a marker string.  For each
+  recipient, we replace the markers with the real values.
+- If the template uses the recipient in a way that markers can't handle
+  (if tags, for loops, filters that change the marker, etc.) we fall back to
+  rendering the template for each recipient.
+- The emails get sent in batches of BULK_EMAIL_BATCH_SIZE, using a single
+  connection to the mail server.
+"""
+
+from itertools import islice
+import random
+import re
+import time
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.mail import EmailMessage, get_connection
+from django.template import Context, Variable, VariableDoesNotExist
+from django.template.loader import get_template
+from django.utils.encoding import force_unicode
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+
+from utils import DEFAULT_PROTOCOL, email_for_recipient
+from utils.metrics import Histogram, Meter
+
+BATCH_SIZE = getattr(settings, 'BULK_EMAIL_BATCH_SIZE', 100)
+
+class RecipientPlaceholder(object):
+    """Stands in for the recipient while we render a BulkEmailTemplate."""
+    def __init__(self, template, path=()):
+        self._template = template
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return RecipientPlaceholder(self._template, self._path + (name,))
+
+    def __unicode__(self):
+        return self._template.marker_for(self._path)
+
+    def __str__(self):
+        return unicode(self).encode('utf-8')
+
+    # The template is checking the value, not just outputting it.  We
+    # can't handle that with markers.
+    def __nonzero__(self):
+        self._template.needs_fallback = True
+        return True
+
+    def __eq__(self, other):
+        self._template.needs_fallback = True
+        return False
+
+    def __ne__(self, other):
+        self._template.needs_fallback = True
+        return True
+
+    def __len__(self):
+        self._template.needs_fallback = True
+        return 0
+
+    def __iter__(self):
+        self._template.needs_fallback = True
+        return iter([])
+
+class BulkEmailTemplate(object):
+    """Email template that gets rendered once for many recipients
+
+    Markers look like "xX<code><<index>>xX", where code is a random string
+    of digits.  The "xX" parts make sure that case-changing filters like
+    upper, lower, title or capfirst break the marker, which makes us fall
+    back to rendering for each recipient.  The "<" and ">" let us tell
+    whether the marker was escaped, and therefore whether to escape the
+    value.
+    """
+    def __init__(self, template_name, context, recipient_var='user'):
+        self.template = get_template(template_name)
+        self.context = context
+        self.recipient_var = recipient_var
+        self.code = str(random.getrandbits(64))
+        self.marker_re = re.compile(r'xX%s(<|&lt;)(\d+)(>|&gt;)xX' %
+                                    self.code)
+        self.paths = []
+        self.needs_fallback = False
+        self.text = self._render_with_placeholder()
+        if not self.needs_fallback and not self._markers_intact():
+            self.needs_fallback = True
+        if self.needs_fallback:
+            Meter('bulk-email.fallback').inc()
+
+    def _render_with_placeholder(self):
+        context = dict(self.context)
+        context[self.recipient_var] = RecipientPlaceholder(self)
+        try:
+            return self.template.render(Context(context))
+        except Exception:
+            # Probably a tag like url that can't handle the placeholder
+            self.needs_fallback = True
+            return None
+
+    def _markers_intact(self):
+        # Check that every marker we handed out made it into the text
+        # unchanged.  If not, then a filter or tag used the marker as a
+        # value, for example to format it or calculate its length.
+        found = set(int(match.group(2))
+                    for match in self.marker_re.finditer(self.text))
+        if found != set(xrange(len(self.paths))):
+            return False
+        return self.code not in self.marker_re.sub('', self.text)
+
+    def marker_for(self, path):
+        try:
+            index = self.paths.index(path)
+        except ValueError:
+            index = len(self.paths)
+            self.paths.append(path)
+        return u'xX%s<%d>xX' % (self.code, index)
+
+    def render(self, recipient):
+        """Render the email body for a recipient."""
+        if self.needs_fallback:
+            context = dict(self.context)
+            context[self.recipient_var] = recipient
+            return self.template.render(Context(context))
+        if not self.paths:
+            return self.text
+        values = [self._lookup_value(recipient, path) for path in self.paths]
+        def replace(match):
+            value = values[int(match.group(2))]
+            if match.group(1) == '&lt;':
+                return conditional_escape(value)
+            else:
+                return value
+        return self.marker_re.sub(replace, self.text)
+
+    def _lookup_value(self, recipient, path):
+        # Use Variable so that we follow the same rules as the template
+        # (calling methods, TEMPLATE_STRING_IF_INVALID, etc.)
+        variable = Variable('.'.join(('recipient',) + path))
+        context = Context({'recipient': recipient})
+        try:
+            value = variable.resolve(context)
+        except VariableDoesNotExist:
+            value = settings.TEMPLATE_STRING_IF_INVALID
+        return force_unicode(localize(value))
+
+def send_templated_email_bulk(recipients, subject, body_template, body_dict,
+                              recipient_var='user', from_email=None,
+                              ct="html", fail_silently=False,
+                              check_user_preference=True, connection=None):
+    """Send a templated email to a list of recipients.
+
+    Each recipient gets a separate email, with the recipient set to
+    recipient_var in the template context.
+
+    Args:
+        recipients: iterable of Users or email addresses.  Users that have
+            opted out of email notifications are skipped, unless
+            check_user_preference is False.
+        connection: email backend to send with.  By default we use the
+            default backend.
+
+    Returns:
+        number of emails sent
+    """
+    if not from_email:
+        from_email = settings.DEFAULT_FROM_EMAIL
+    if connection is None:
+        connection = get_connection(fail_silently=fail_silently)
+    body_dict = dict(body_dict)
+    domain = Site.objects.get_current().domain
+    body_dict['domain'] = domain
+    body_dict['url_base'] = "%s://%s" % (DEFAULT_PROTOCOL, domain)
+    template = BulkEmailTemplate(body_template, body_dict, recipient_var)
+
+    start_time = time.time()
+    sent_count = 0
+    opened = connection.open()
+    try:
+        recipients = iter(recipients)
+        while True:
+            batch = list(islice(recipients, BATCH_SIZE))
+            if not batch:
+                break
+            messages = []
+            for recipient in batch:
+                email = email_for_recipient(recipient, check_user_preference)
+                if email is None:
+                    continue
+                message = EmailMessage(subject, template.render(recipient),
+                                       from_email, [email],
+                                       bcc=settings.EMAIL_BCC_LIST,
+                                       connection=connection)
+                message.content_subtype = ct
+                messages.append(message)
+            if messages:
+                batch_start = time.time()
+                sent_count += connection.send_messages(messages) or 0
+                Histogram('bulk-email.batch-time').record(
+                    time.time() - batch_start)
+    finally:
+        if opened:
+            connection.close()
+    duration = time.time() - start_time
+    Meter('templated-emails-sent').inc(sent_count)
+    if duration > 0:
+        Histogram('bulk-email.emails-per-second').record(
+            sent_count / duration)
+    return sent_count
@@ -1,10 +1,44 @@
-import time
+"""utils.celery_search_index -- Update the search index in the background
+
+CelerySearchIndex doesn't talk to the search backend when objects are saved
+or deleted.  Instead, it adds a SearchIndexUpdate row for the object.  Those
+rows act as a de-duplicated queue: saving an object 10 times before the
+next flush only results in 1 update.
+
+flush_search_index_queue runs periodically and sends the queued objects to
+the backend in batches of SEARCH_INDEX_BATCH_SIZE, with one commit per
+batch.  If more than SEARCH_INDEX_FLUSH_THRESHOLD objects get queued up
+between runs, we schedule a flush right away rather than waiting for the
+next periodic run.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+import logging
+import operator
 
 from celery.task import task
-from django.db.models import signals
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, signals
 from haystack import indexes, site
 from haystack.exceptions import NotRegistered
-from haystack.utils import get_identifier
+
+from search.models import SearchIndexUpdate
+from utils.metrics import Gauge, Histogram, Meter
+
+BATCH_SIZE = getattr(settings, 'SEARCH_INDEX_BATCH_SIZE', 200)
+FLUSH_THRESHOLD = getattr(settings, 'SEARCH_INDEX_FLUSH_THRESHOLD', 1000)
+# Max number of batches to send in one flush_search_index_queue run.  If
+# there are still objects queued after that, we schedule another run.
+MAX_BATCHES = getattr(settings, 'SEARCH_INDEX_MAX_BATCHES', 25)
+
+QUEUED_COUNT_KEY = 'search-index-queue-count'
+FLUSH_SCHEDULED_KEY = 'search-index-flush-scheduled'
+FLUSH_LOCK_KEY = 'search-index-flush-lock'
+FLUSH_LOCK_TIMEOUT = 60 * 10
 
 class CelerySearchIndex(indexes.SearchIndex):
     def _setup_save(self, model):
@@ -20,17 +54,134 @@ class CelerySearchIndex(indexes.SearchIndex):
         signals.post_delete.disconnect(self.remove_handler, sender=model)
 
     def update_handler(self, instance, **kwargs):
-        update_search_index.deplay(instance.__class__, instance.pk)
+        queue_update(instance.__class__, instance.pk)
 
     def remove_handler(self, instance, **kwargs):
-        remove_search_index.delay(instance.__class__, get_identifier(instance))
+        queue_update(instance.__class__, instance.pk)
 
 
 def log(*args, **kwargs):
-    import logging
     logger = logging.getLogger('search.index.updater')
     logger.warning(*args, **kwargs)
 
+def queue_update(model_class, pk):
+    """Queue an object to be updated in the search index.
+
+    If the object has been deleted by the time we flush the queue, then it
+    will be removed from the index instead.
+    """
+    content_type = ContentType.objects.get_for_model(model_class)
+    if _touch_queued_update(content_type, pk):
+        Meter('search-index-queue.merged').inc()
+        return
+    sid = transaction.savepoint()
+    try:
+        SearchIndexUpdate.objects.create(content_type=content_type,
+                                         object_id=pk)
+    except IntegrityError:
+        # Another process queued the object at the same time as us
+        transaction.savepoint_rollback(sid)
+        _touch_queued_update(content_type, pk)
+        Meter('search-index-queue.merged').inc()
+        return
+    transaction.savepoint_commit(sid)
+    Meter('search-index-queue.queued').inc()
+    _check_queue_size()
+
+def _touch_queued_update(content_type, pk):
+    # Bump requeue_count for an existing row.  flush_queue() uses this to
+    # avoid deleting rows for objects that changed after it read them.
+    return (SearchIndexUpdate.objects
+            .filter(content_type=content_type, object_id=pk)
+            .update(requeue_count=F('requeue_count') + 1))
+
+def _check_queue_size():
+    cache.add(QUEUED_COUNT_KEY, 0, 60 * 60)
+    try:
+        count = cache.incr(QUEUED_COUNT_KEY)
+    except ValueError:
+        return
+    if count >= FLUSH_THRESHOLD and cache.add(FLUSH_SCHEDULED_KEY, 1, 60):
+        Meter('search-index-queue.early-flush').inc()
+        flush_search_index_queue.delay()
+
+def flush_queue(max_batches=None):
+    """Send the queued updates to the search backend.
+
+    :returns: number of objects updated/removed
+    """
+    if max_batches is None:
+        max_batches = MAX_BATCHES
+    cache.set(QUEUED_COUNT_KEY, 0, 60 * 60)
+    count = 0
+    for i in xrange(max_batches):
+        now = datetime.now()
+        updates = list(SearchIndexUpdate.objects.order_by('id')[:BATCH_SIZE])
+        if not updates:
+            break
+        _send_batch(updates)
+        # Skip rows that were requeued after we read them.  Those objects
+        # changed again, so we need to update them on the next run.
+        ids_by_count = defaultdict(list)
+        for update in updates:
+            ids_by_count[update.requeue_count].append(update.id)
+        SearchIndexUpdate.objects.filter(reduce(operator.or_, [
+            Q(id__in=ids, requeue_count=requeue_count)
+            for requeue_count, ids in ids_by_count.items()
+        ])).delete()
+        count += len(updates)
+        oldest = min(u.queued for u in updates)
+        Histogram('search-index-queue.lag').record(
+            (now - oldest).total_seconds())
+        Histogram('search-index-queue.batch-size').record(len(updates))
+    return count
+
+def _send_batch(updates):
+    object_ids = defaultdict(list)
+    for update in updates:
+        object_ids[update.content_type_id].append(update.object_id)
+    # list of (backend method, args) tuples
+    operations = []
+    for content_type_id, ids in object_ids.items():
+        content_type = ContentType.objects.get_for_id(content_type_id)
+        model_class = content_type.model_class()
+        try:
+            search_index = site.get_index(model_class)
+        except NotRegistered:
+            log(u'Search index is not registered for %s' % model_class)
+            continue
+        objects = list(search_index.index_queryset().filter(pk__in=ids))
+        if objects:
+            operations.append((search_index.backend.update,
+                               (search_index, objects)))
+        found = set(obj.pk for obj in objects)
+        for pk in ids:
+            if pk not in found:
+                identifier = u'%s.%s.%s' % (content_type.app_label,
+                                            content_type.model, pk)
+                operations.append((search_index.backend.remove,
+                                   (identifier,)))
+    # Only commit after the last operation
+    for i, (method, args) in enumerate(operations):
+        method(*args, commit=(i == len(operations) - 1))
+
+@task(ignore_result=True)
+def flush_search_index_queue():
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        # Another worker is already flushing the queue
+        return
+    try:
+        flush_queue()
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+        cache.delete(FLUSH_SCHEDULED_KEY)
+    depth = SearchIndexUpdate.objects.count()
+    Gauge('search-index-queue.depth').report(depth)
+    if depth >= BATCH_SIZE and cache.add(FLUSH_SCHEDULED_KEY, 1, 60):
+        # We couldn't keep up with the updates.  Keep going rather than
+        # waiting for the next periodic run.
+        Meter('search-index-queue.backlogged').inc()
+        flush_search_index_queue.delay()
 
 @task()
 def remove_search_index(model_class, obj_identifier):
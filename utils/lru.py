@@ -0,0 +1,101 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+"""utils.lru -- Process-local LRU caches bounded by size."""
+
+from __future__ import absolute_import
+
+import collections
+import threading
+
+class LRUCache(object):
+    """LRU cache that's bounded by the total size of its values.
+
+    Callers pass in the size of each value when they set it.  It doesn't
+    need to be exact, but it should be proportional to the memory used.  When
+    the total size goes over max_size we drop the least-recently used values.
+    Values bigger than max_item_size are never stored.
+
+    LRUCache is thread-safe.
+    """
+    def __init__(self, max_size, max_item_size=None):
+        self.max_size = max_size
+        if max_item_size is None:
+            max_item_size = max_size // 8
+        self.max_item_size = max_item_size
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            # re-insert to move the key to the most-recently used end
+            self._data[key] = (value, size)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size):
+        """Store a value
+
+        Returns True if the value was stored, False if it was too big.
+        """
+        with self._lock:
+            self._remove(key)
+            if size > self.max_item_size:
+                return False
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                old_key, (old_value, old_size) = self._data.popitem(last=False)
+                self.size -= old_size
+                self.evictions += 1
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def delete_matching(self, predicate):
+        """Delete all keys where predicate(key) returns True."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        try:
+            value, size = self._data.pop(key)
+        except KeyError:
+            return
+        self.size -= size
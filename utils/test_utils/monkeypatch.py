@@ -71,6 +71,7 @@ delete_subtitles = mock.Mock()
 update_all_subtitles = mock.Mock()
 fetch_subs_task = mock.Mock()
 import_videos_from_feed = mock.Mock()
+warm_rendition_cache = mock.Mock()
 get_language_facet_counts = mock.Mock(return_value=([], []))
 
 class MonkeyPatcher(object):
@@ -105,6 +106,7 @@ class MonkeyPatcher(object):
             ('externalsites.tasks.update_all_subtitles', update_all_subtitles),
             ('externalsites.tasks.fetch_subs', fetch_subs_task),
             ('videos.tasks.import_videos_from_feed', import_videos_from_feed),
+            ('subtitles.tasks.warm_rendition_cache', warm_rendition_cache),
             ('search.forms._get_language_facet_counts',
              get_language_facet_counts)
         ]
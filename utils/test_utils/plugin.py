@@ -25,6 +25,9 @@ from django.conf import settings
 from django.core.cache import cache
 from nose.plugins import Plugin
 
+from caching import cachegroup
+from subtitles.cache import parsed_subtitle_cache, rendition_cache
+from teams import cache as team_cache
 from utils.test_utils import monkeypatch
 from utils.test_utils import xvfb
 import optionalapps
@@ -67,6 +70,11 @@ class UnisubsTestPlugin(Plugin):
     def afterTest(self, test):
         self.patcher.reset_mocks()
         cache.clear()
+        parsed_subtitle_cache.clear()
+        rendition_cache.clear()
+        cachegroup.local_cache.clear()
+        cachegroup.cache_pattern_memory.clear()
+        team_cache.clear_memo()
         test_case_complete.send(self)
 
     def wantDirectory(self, dirname):
@@ -0,0 +1,134 @@
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.template import Context, Template
+from django.test import TestCase
+from nose.tools import *
+import mock
+
+from utils.bulkemail import BulkEmailTemplate, send_templated_email_bulk
+from utils.factories import *
+
+class BulkEmailTemplateTest(TestCase):
+    def setUp(self):
+        self.users = [
+            UserFactory(first_name='Ben', last_name='& Jerry'),
+            UserFactory(first_name='<b>Bold</b>', last_name=''),
+            UserFactory(),
+        ]
+        self.team = TeamFactory()
+
+    def make_template(self, source):
+        with mock.patch('utils.bulkemail.get_template') as mock_get_template:
+            mock_get_template.return_value = Template(source)
+            return BulkEmailTemplate('test.html', {'team': self.team})
+
+    def check_render(self, source):
+        # BulkEmailTemplate should render the same thing as rendering the
+        # template normally
+        bulk_template = self.make_template(source)
+        for user in self.users:
+            correct_output = Template(source).render(Context({
+                'team': self.team,
+                'user': user,
+            }))
+            assert_equal(bulk_template.render(user), correct_output)
+        return bulk_template
+
+    def test_render(self):
+        bulk_template = self.check_render(
+            'Hi {{ user }} ({{ user.email }}, {{ user.id }}), '
+            'welcome to {{ team }}.  {{ user }}')
+        assert_false(bulk_template.needs_fallback)
+
+    def test_render_once(self):
+        bulk_template = self.make_template('Hi {{ user }}')
+        with mock.patch.object(bulk_template.template, 'render') as \
+                mock_render:
+            bulk_template.render(self.users[0])
+        assert_equal(mock_render.call_count, 0)
+
+    def test_autoescape_off(self):
+        bulk_template = self.check_render(
+            '{% autoescape off %}{{ user }}{% endautoescape %} {{ user }}')
+        assert_false(bulk_template.needs_fallback)
+
+    def test_safe_filter(self):
+        self.check_render('{{ user.first_name|safe }}')
+
+    def test_if_tag(self):
+        bulk_template = self.check_render(
+            '{% if user.first_name == "Ben" %}Ben{% endif %}')
+        assert_true(bulk_template.needs_fallback)
+
+    def test_case_filters(self):
+        for filter_name in ('upper', 'lower', 'title', 'capfirst'):
+            bulk_template = self.check_render('{{ user|%s }}' % filter_name)
+            assert_true(bulk_template.needs_fallback)
+
+    def test_length_filter(self):
+        bulk_template = self.check_render('{{ user.first_name|length }}')
+        assert_true(bulk_template.needs_fallback)
+
+    def test_for_tag(self):
+        bulk_template = self.check_render(
+            '{% for c in user.first_name %}{{ c }}-{% endfor %}')
+        assert_true(bulk_template.needs_fallback)
+
+class SendTemplatedEmailBulkTest(TestCase):
+    def setUp(self):
+        self.users = [UserFactory() for i in range(5)]
+        self.connection = get_connection(
+            'django.core.mail.backends.locmem.EmailBackend')
+        mail.outbox = []
+
+    def send(self, recipients, **kwargs):
+        return send_templated_email_bulk(
+            recipients, 'Subject', 'messages/email/team-new-member.html', {
+                'team': TeamFactory(),
+                'new_member': UserFactory(),
+            }, connection=self.connection, **kwargs)
+
+    def test_send(self):
+        assert_equal(self.send(self.users), 5)
+        assert_equal([m.to for m in mail.outbox],
+                     [[u.email] for u in self.users])
+        for user, message in zip(self.users, mail.outbox):
+            assert_true(('Hi %s' % user) in message.body)
+
+    def test_batches(self):
+        with mock.patch('utils.bulkemail.BATCH_SIZE', 2):
+            with mock.patch.object(self.connection, 'send_messages',
+                                   wraps=self.connection.send_messages) as \
+                    mock_send_messages:
+                self.send(self.users)
+        assert_equal(mock_send_messages.call_count, 3)
+        assert_equal(len(mail.outbox), 5)
+
+    def test_check_user_preference(self):
+        self.users[0].notify_by_email = False
+        self.users[1].email = ''
+        assert_equal(self.send(self.users), 3)
+        assert_equal(self.send(self.users, check_user_preference=False), 4)
+
+    def test_email_addresses(self):
+        self.send(['a@example.com', 'b@example.com'])
+        assert_equal([m.to for m in mail.outbox],
+                     [['a@example.com'], ['b@example.com']])
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Amara, universalsubtitles.org
+#
+# Copyright (C) 2015 Participatory Culture Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see
+# http://www.gnu.org/licenses/agpl-3.0.html.
+
+from django.test import TestCase
+from nose.tools import *
+
+from utils.lru import LRUCache
+
+class LRUCacheTest(TestCase):
+    def test_eviction(self):
+        lru = LRUCache(max_size=10, max_item_size=5)
+        lru.set('a', 'A', 4)
+        lru.set('b', 'B', 4)
+        # access a to make b the least-recently used
+        assert_equal(lru.get('a'), 'A')
+        lru.set('c', 'C', 4)
+        assert_equal(lru.get('b'), None)
+        assert_equal(lru.get('a'), 'A')
+        assert_equal(lru.get('c'), 'C')
+        assert_equal(lru.size, 8)
+        assert_equal(lru.evictions, 1)
+
+    def test_item_too_big(self):
+        lru = LRUCache(max_size=10, max_item_size=5)
+        assert_false(lru.set('a', 'A', 6))
+        assert_equal(lru.get('a'), None)
+        assert_equal(lru.size, 0)
+
+    def test_replace_value(self):
+        lru = LRUCache(max_size=10)
+        lru.set('a', 'A', 1)
+        lru.set('a', 'AA', 1)
+        assert_equal(lru.get('a'), 'AA')
+        assert_equal(lru.size, 1)